@@ -0,0 +1,61 @@
+"""
+Benchmark: evaluate_async against the blocking evaluate.  A long evaluation
+runs next to a task that wakes up every millisecond; the longest time the
+event loop was kept from it is reported for each yield_every setting,
+together with the evaluation's total time, to show what yielding costs.
+
+Run with:  python benchmarks/async_yield.py
+"""
+
+import os
+import sys
+import time
+import asyncio
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import lab
+
+SETUP = "(define (loop n acc) (if (equal? n 0) acc (loop (- n 1) (+ acc n))))"
+PROGRAM = ["loop", 100_000, 0]
+
+
+async def heartbeat(stalls):
+    # records how late each 1ms wake-up is
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(0.001)
+        stalls.append(time.perf_counter() - start - 0.001)
+
+
+async def timed(evaluation):
+    stalls = []
+    task = asyncio.create_task(heartbeat(stalls))
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    await evaluation()
+    elapsed = time.perf_counter() - start
+    task.cancel()
+    return elapsed, max(stalls, default=elapsed)
+
+
+def main():
+    frame = lab.Frame()
+    lab.evaluate(lab.parse(lab.tokenize(SETUP)), frame, "vm")
+
+    async def blocking():
+        lab.evaluate(PROGRAM, frame, "vm")
+
+    print(f"{'mode':<22} {'total':>9} {'longest stall':>14}")
+    elapsed, stall = asyncio.run(timed(blocking))
+    print(f"{'evaluate (blocking)':<22} {elapsed * 1e3:>7.1f}ms {stall * 1e3:>12.2f}ms")
+    for yield_every in (10, 100, 1000, 10_000):
+        async def cooperative():
+            await lab.evaluate_async(PROGRAM, frame, yield_every)
+        elapsed, stall = asyncio.run(timed(cooperative))
+        label = f"yield_every={yield_every}"
+        print(f"{label:<22} {elapsed * 1e3:>7.1f}ms {stall * 1e3:>12.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
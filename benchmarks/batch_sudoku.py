@@ -0,0 +1,57 @@
+"""
+Benchmark: evaluate_batch on a batch of sudoku boards with 1, 2, 4, ...
+worker processes, up to the number of CPUs.  sudoku.scm is the shared
+prelude; each program solves one board made by blanking cells of a valid
+grid.
+
+Run with:  python benchmarks/batch_sudoku.py [num_boards] [blanks]
+"""
+
+import os
+import sys
+import time
+import random
+import pathlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import lab
+
+SUDOKU = pathlib.Path(__file__).resolve().parent.parent / "test_files" / "sudoku.scm"
+
+
+def make_board(rng, blanks):
+    # a valid grid (shifted rows), with `blanks` cells set to 0
+    grid = [[(3 * r + r // 3 + c) % 9 + 1 for c in range(9)] for r in range(9)]
+    for cell in rng.sample(range(81), blanks):
+        grid[cell // 9][cell % 9] = 0
+    rows = " ".join("(list " + " ".join(map(str, row)) + ")" for row in grid)
+    return f"(solve-sudoku (list {rows}))"
+
+
+def worker_counts():
+    counts = [1]
+    while counts[-1] * 2 <= (os.cpu_count() or 1):
+        counts.append(counts[-1] * 2)
+    if counts[-1] != os.cpu_count():
+        counts.append(os.cpu_count() or 1)
+    return counts
+
+
+def main(num_boards=16, blanks=30):
+    rng = random.Random(6101)
+    boards = [make_board(rng, blanks) for _ in range(num_boards)]
+    print(f"{num_boards} boards with {blanks} blanks, {os.cpu_count()} CPUs")
+    print(f"{'workers':>7} {'time':>9} {'speedup':>8}")
+    baseline = None
+    for workers in worker_counts():
+        start = time.perf_counter()
+        results = lab.evaluate_batch(boards, prelude=SUDOKU, max_workers=workers)
+        elapsed = time.perf_counter() - start
+        assert not any(isinstance(result, lab.SchemeError) for result in results)
+        baseline = baseline or elapsed
+        print(f"{workers:>7} {elapsed:>8.2f}s {baseline / elapsed:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
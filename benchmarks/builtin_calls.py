@@ -0,0 +1,80 @@
+"""
+Micro-benchmark: per-call overhead of builtin arithmetic and comparisons.
+
+"before" reproduces the previous setup: builtins taking one argument list
+(`-` slicing it, `*` and `/` looping over it) called from a generic call
+site that builds that list.  "after" is lab's arity-specialized call site
+calling the fixed-arity builtins.
+
+Run with:  python benchmarks/builtin_calls.py
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import lab
+
+
+def legacy_mul(args):
+    if len(args) == 1:
+        return args[0]
+    running_total = 1
+    for arg in args:
+        running_total *= arg
+    return running_total
+
+
+def legacy_div(args):
+    if len(args) == 1:
+        return args[0]
+    to_divide = args[0]
+    for arg in args[1:]:
+        to_divide /= arg
+    return to_divide
+
+
+LEGACY_BUILTINS = {
+    "+": sum,
+    "-": lambda args: -args[0] if len(args) == 1 else (args[0] - sum(args[1:])),
+    "*": legacy_mul,
+    "/": legacy_div,
+    "<": lambda args: all(x < y for x, y in zip(args, args[1:])),
+}
+
+
+def legacy_call(tree):
+    # the call site of the old evaluator: evaluate every argument into a
+    # fresh list and hand the list to the builtin
+    func = lab.compile_expression(tree[0])
+    args = [lab.compile_expression(sub_exp) for sub_exp in tree[1:]]
+
+    def call(frame):
+        return func(frame)([arg(frame) for arg in args])
+
+    return call
+
+
+EXPRESSIONS = ["(+ x y)", "(- x y)", "(* x y)", "(/ x y)", "(< x y)", "(- x)", "(+ x y x y)"]
+
+
+def per_call_ns(compiled, frame, number):
+    return min(timeit.repeat(lambda: compiled(frame), number=number, repeat=5)) / number * 1e9
+
+
+def main(number=200_000):
+    before = lab.Frame(None, dict(LEGACY_BUILTINS, x=7, y=3))
+    after = lab.Frame()
+    after["x"], after["y"] = 7, 3
+    print(f"{'expression':<14} {'before':>9} {'after':>9}")
+    for source in EXPRESSIONS:
+        tree = lab.parse(lab.tokenize(source))
+        old = per_call_ns(legacy_call(tree), before, number)
+        new = per_call_ns(lab.compile_expression(tree), after, number)
+        print(f"{source:<14} {old:>7.0f}ns {new:>7.0f}ns")
+
+
+if __name__ == "__main__":
+    main()
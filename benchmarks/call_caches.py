@@ -0,0 +1,64 @@
+"""
+Benchmark: calls to globally defined functions with per-call-site caches
+(CACHE_CALLS, the default) against looking the function up by name on every
+call.  A program defined at top level calls its helpers by name, and each
+such lookup walks from the frame the program runs in towards the builtins;
+a cached call site only checks that the binding has not changed since.
+
+Run with:  python benchmarks/call_caches.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import lab
+
+SETUP = """
+(define (square x) (* x x))
+(define (add a b) (+ a b))
+(define (sum-squares n acc) (if (equal? n 0) acc (sum-squares (- n 1) (add acc (square n)))))
+(define (fib n) (if (< n 2) n (add (fib (- n 1)) (fib (- n 2)))))
+"""
+
+WORKLOADS = {
+    "sum-squares": "(sum-squares 20000 0)",
+    "fib": "(fib 20)",
+}
+
+
+def run(engine, expression, cache_calls, repeat):
+    lab.CACHE_CALLS = cache_calls
+    try:
+        frame = lab.Frame()
+        for tree in lab.read_forms(lab.tokenize(SETUP)):
+            lab.evaluate(tree, frame, engine)
+        tree = lab.parse(lab.tokenize(expression))
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            lab.evaluate(tree, frame, engine)
+            best = min(best, time.perf_counter() - start)
+        return best
+    finally:
+        lab.CACHE_CALLS = True
+
+
+def main(repeat=5):
+    print(f"{'workload':<12} {'engine':<9} {'lookup':>10} {'cached':>10} {'speedup':>8}")
+    for name, expression in WORKLOADS.items():
+        for engine in sorted(lab.ENGINES):
+            uncached = run(engine, expression, False, repeat)
+            cached = run(engine, expression, True, repeat)
+            print(
+                f"{name:<12} {engine:<9} {uncached * 1e3:>8.1f}ms {cached * 1e3:>8.1f}ms"
+                f" {uncached / cached:>7.2f}x"
+            )
+    stats = lab.call_cache_stats()
+    print(f"\ncall caches: {stats['hits']:,} hits, {stats['misses']:,} misses ({stats['hit_rate']:.2%})")
+
+
+if __name__ == "__main__":
+    main()
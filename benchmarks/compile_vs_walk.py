@@ -0,0 +1,168 @@
+"""
+Benchmark: compiled closures (lab.evaluate) against the previous
+tree-walking evaluator, which re-dispatched on every node on every call.
+
+The synthetic workloads -- small user functions called over and over,
+closures and deeply nested lambdas -- only use define, lambda and
+arithmetic, which is all the tree-walker had.  The sudoku and ndmines
+workloads run test_files/sudoku.scm and test_files/ndmines.scm; for those
+the tree-walker is extended with the special forms the files use (if,
+begin, let, and, or, set!), dispatched on every node in the same way.
+
+Run with:  python benchmarks/compile_vs_walk.py [repeat]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import lab
+
+
+class WalkedFunction(lab.User_Function):
+    # function object of the old evaluator: re-walks the raw tree on each call
+    def __init__(self, parameters, exp, frame):
+        scope = lab.Scope(parameters, [], None)
+        super().__init__(parameters, lambda frame: walk(exp, frame), frame, scope)
+
+
+def walk(tree, frame):
+    # the tree-walking evaluate() this repo used before compilation
+    if isinstance(tree, (int, float)):
+        return tree
+    elif isinstance(tree, str):
+        return frame[tree]
+    func = tree[0]
+    rest = tree[1:]
+    if func == "define":
+        if isinstance(rest[0], list):
+            rest = [rest[0][0], ["lambda", rest[0][1:], rest[1]]]
+        frame[rest[0]] = walk(rest[1], frame)
+        return frame[rest[0]]
+    elif func == "lambda":
+        return WalkedFunction(rest[0], rest[1], frame)
+    elif isinstance(func, str) and func in WALKED_FORMS:
+        return WALKED_FORMS[func](rest, frame)
+    elif isinstance(func, str) and func in frame:
+        return frame[func](*[walk(sub_exp, frame) for sub_exp in rest])
+    return walk(func, frame)(*[walk(sub_exp, frame) for sub_exp in rest])
+
+
+def walk_begin(rest, frame):
+    for sub_exp in rest:
+        result = walk(sub_exp, frame)
+    return result
+
+
+def walk_and(rest, frame):
+    return all(walk(sub_exp, frame) is not False for sub_exp in rest)
+
+
+def walk_or(rest, frame):
+    return any(walk(sub_exp, frame) is not False for sub_exp in rest)
+
+
+def walk_set(rest, frame):
+    value = walk(rest[1], frame)
+    frame.assign(rest[0], value)
+    return value
+
+
+# special forms the files use, added to the tree-walker for their workloads
+WALKED_FORMS = {
+    "if": lambda rest, frame: walk(rest[1] if walk(rest[0], frame) is not False else rest[2], frame),
+    "begin": walk_begin,
+    "let": lambda rest, frame: walk(lab.let_call(["let", *rest]), frame),
+    "and": walk_and,
+    "or": walk_or,
+    "set!": walk_set,
+}
+
+
+def nested_lambdas(depth):
+    # same shape as test_inputs/23.scm
+    body = "ham"
+    for i in range(depth):
+        body = f"((lambda (var{i}) {body}) {i})"
+    return f"(define bacon (lambda (var{depth}) {body}))"
+
+
+SETUP = [
+    "(define ham 42)",
+    "(define square (lambda (x) (* x x)))",
+    "(define poly (lambda (x y) (+ (* 3 (square x)) (* -2 x y) (/ (square y) 4) 7)))",
+    "(define addN (lambda (n) (lambda (i) (+ i n))))",
+    "(define add7 (addN 7))",
+    nested_lambdas(60),
+]
+
+WORKLOADS = {
+    "poly": "(poly (add7 3) (square 5))",
+    "closures": "(add7 ((addN 3) ((addN 19) 8)))",
+    "big-scoping": "(bacon 7)",
+}
+
+TEST_FILES = os.path.join(os.path.dirname(__file__), "..", "test_files")
+
+# a sudoku board with 8 blanks, and a 4x4x3 game of minesweeper dug open
+FILE_WORKLOADS = {
+    "sudoku": ("sudoku.scm", """(solve-sudoku (list
+        (list 1 2 3 4 0 6 7 8 9) (list 4 5 6 7 8 9 1 2 3) (list 7 8 0 1 2 3 4 5 6)
+        (list 2 3 4 5 6 7 8 9 1) (list 5 6 7 8 9 0 2 3 4) (list 8 9 1 2 3 4 5 6 7)
+        (list 0 4 5 6 7 8 0 1 2) (list 6 7 8 9 1 2 3 0 5) (list 9 1 2 3 4 0 6 7 8)))"""),
+    "ndmines": ("ndmines.scm", """(begin
+        (define game (new-game-nd (list 4 4 3) (list (list 0 0 0) (list 3 3 2))))
+        (dig-nd game (list 2 1 1))
+        (game-get-mask game))"""),
+}
+
+
+def file_forms(file_name):
+    with open(os.path.join(TEST_FILES, file_name)) as f:
+        return list(lab.read_forms(lab.tokenize(f.read())))
+
+
+def parsed(source):
+    return lab.parse(lab.tokenize(source))
+
+
+def run(evaluator, setup, expression, repeat):
+    frame = lab.Frame()
+    for tree in setup:
+        evaluator(tree, frame)
+    # compiled expressions are analyzed once, the way a User_Function body is
+    if evaluator is lab.evaluate:
+        compiled = lab.compile_expression(expression)
+        evaluator = lambda _, frame: compiled(frame)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        evaluator(expression, frame)
+    return time.perf_counter() - start
+
+
+def main(repeat=2000):
+    setup = [parsed(line) for line in SETUP]
+    results = {}
+    for name, source in WORKLOADS.items():
+        expression = parsed(source)
+        results[name] = (
+            run(walk, setup, expression, repeat),
+            run(lab.evaluate, setup, expression, repeat),
+        )
+    for name, (file_name, source) in FILE_WORKLOADS.items():
+        forms = file_forms(file_name)
+        expression = parsed(source)
+        file_repeat = max(1, repeat // 200)
+        results[name] = (
+            run(walk, forms, expression, file_repeat),
+            run(lab.evaluate, forms, expression, file_repeat),
+        )
+    print(f"{'workload':<12} {'tree-walk':>10} {'compiled':>10} {'speedup':>8}")
+    for name, (walked, compiled) in results.items():
+        print(f"{name:<12} {walked:>9.3f}s {compiled:>9.3f}s {walked / compiled:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,42 @@
+"""
+Memory benchmark: bytes per cons cell for lab.Pair (__slots__) against a
+plain Python class holding car and cdr in an instance dict.
+
+Run with:  python benchmarks/cons_memory.py [cells]
+"""
+
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import lab
+
+
+class DictPair:
+    # a cons cell as an ordinary class, with an instance __dict__
+    def __init__(self, car, cdr):
+        self.car = car
+        self.cdr = cdr
+
+
+def bytes_per_cell(make_pair, cells):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    lst = lab.NIL
+    for i in range(cells):
+        # small ints are cached, so only the cells themselves are counted
+        lst = make_pair(i % 256, lst)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / cells
+
+
+def main(cells=200_000):
+    for label, make_pair in (("dict Pair", DictPair), ("slots Pair", lab.Pair)):
+        print(f"{label:<11} {bytes_per_cell(make_pair, cells):>6.1f} bytes/cell")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,75 @@
+"""
+Benchmark: functions whose bodies contain constant subexpressions, called
+repeatedly (through evaluate_source, so the calling code is compiled only
+once), with lab.OPTIMIZE off and on, plus the time optimize itself adds to
+evaluating a large program once.
+
+Run with:  python benchmarks/constant_folding.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import lab
+
+SETUP = [
+    "(define (area r) (* r (* r (/ 314159 100000))))",
+    "(define (scaled x) (+ x (* 3 (+ 2 4)) (- 100 (* 7 7))))",
+    "(define (pick x) (if (> 2 1) (* x 2) (* x 3)))",
+]
+
+WORKLOADS = {
+    "area": "(reduce + (map area (list 1 2 3 4 5 6 7 8 9 10)) 0)",
+    "scaled": "(reduce + (map scaled (list 1 2 3 4 5 6 7 8 9 10)) 0)",
+    "pick": "(reduce + (map pick (list 1 2 3 4 5 6 7 8 9 10)) 0)",
+}
+
+
+def run(optimize, engine, repeat):
+    lab.OPTIMIZE = optimize
+    frame = lab.Frame()
+    for source in SETUP:
+        lab.evaluate(lab.parse(lab.tokenize(source)), frame, engine)
+    # the workloads are compiled (and optimized) once, through the parse cache
+    lab.PARSE_CACHE.clear()
+    results = {}
+    for name, source in WORKLOADS.items():
+        start = time.perf_counter()
+        for _ in range(repeat):
+            lab.evaluate_source(source, frame, engine)
+        results[name] = time.perf_counter() - start
+    return results
+
+
+def best_of(rounds, optimize, engine, repeat):
+    # the fastest of several runs of each workload, as a single run's time
+    # varies more than folding changes it in the smaller workloads
+    times = [run(optimize, engine, repeat) for _ in range(rounds)]
+    return {name: min(results[name] for results in times) for name in WORKLOADS}
+
+
+def main(repeat=3000, rounds=5):
+    print(f"{'engine':<9} {'workload':<8} {'plain':>9} {'folded':>9} {'speedup':>8}")
+    for engine in lab.ENGINES:
+        plain = best_of(rounds, False, engine, repeat)
+        folded = best_of(rounds, True, engine, repeat)
+        for name in WORKLOADS:
+            print(
+                f"{engine:<9} {name:<8} {plain[name]:>8.3f}s {folded[name]:>8.3f}s"
+                f" {plain[name] / folded[name]:>7.2f}x"
+            )
+    lab.OPTIMIZE = True
+    with open(os.path.join(os.path.dirname(__file__), "..", "test_files", "ndmines.scm")) as f:
+        forms = list(lab.read_forms(lab.tokenize(f.read())))
+    start = time.perf_counter()
+    for _ in range(100):
+        for tree in forms:
+            lab.optimize(tree)
+    print(f"optimize on ndmines.scm: {(time.perf_counter() - start) * 10:.3f}ms per pass")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Benchmark: loading .scm files cold (tokenize + parse, then write the
+__scmcache__ entry) against warm (one read of the cache file and a
+marshal.loads).  Works on copies in a temporary directory, so nothing is
+written next to the repository's own files.
+
+Run with:  python benchmarks/file_cache.py
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import lab
+
+TEST_FILES = os.path.join(os.path.dirname(__file__), "..", "test_files")
+
+
+def synthetic_library(num_functions=5000):
+    # a large library of small definitions, like a generated rule set
+    return "\n".join(
+        f"(define (rule-{i} x y) (if (< x {i}) (+ x (* y {i}.5)) (rule-{i} (- x 1) y)))"
+        for i in range(num_functions)
+    )
+
+
+def best_of(function, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(repeat=20):
+    directory = tempfile.mkdtemp()
+    try:
+        files = []
+        for name in ("sudoku.scm", "ndmines.scm"):
+            shutil.copy(os.path.join(TEST_FILES, name), directory)
+            files.append(os.path.join(directory, name))
+        files.append(os.path.join(directory, "synthetic.scm"))
+        with open(files[-1], "w") as f:
+            f.write(synthetic_library())
+
+        cache_directory = os.path.join(directory, lab.CACHE_DIRECTORY)
+
+        def cold(file_name):
+            shutil.rmtree(cache_directory, ignore_errors=True)
+            lab.cached_forms(file_name)
+
+        print(f"{'file':<14} {'bytes':>9} {'cold':>10} {'warm':>10} {'speedup':>8}")
+        for file_name in files:
+            cold_time = best_of(lambda: cold(file_name), repeat)
+            lab.cached_forms(file_name)
+            warm_time = best_of(lambda: lab.cached_forms(file_name), repeat)
+            print(
+                f"{os.path.basename(file_name):<14} {os.path.getsize(file_name):>9,}"
+                f" {cold_time * 1e3:>8.2f}ms {warm_time * 1e3:>8.2f}ms"
+                f" {cold_time / warm_time:>7.1f}x"
+            )
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Benchmark: peak memory (and time) of the same pipeline run eagerly over a
+list and lazily over a lazy sequence:
+    (reduce + (map square (filter positive? xs)) 0)
+where xs is (append (range n)), a list of n Pairs, against
+    (reduce + (stream-map square (stream-filter positive? (range n))) 0)
+The eager pipeline builds a list at every stage; the lazy one passes each
+element through all the stages before producing the next, so its peak
+memory does not grow with n.
+
+Run with:  python benchmarks/lazy_pipelines.py [max n, default 1000000]
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import lab
+
+SETUP = """
+(define (square x) (* x x))
+(define (positive? x) (> x 0))
+"""
+
+PIPELINES = {
+    "eager": "(reduce + (map square (filter positive? (append (range {n})))) 0)",
+    "lazy": "(reduce + (stream-map square (stream-filter positive? (range {n}))) 0)",
+}
+
+
+def measure(frame, source):
+    tree = lab.parse(lab.tokenize(source))
+    start = time.perf_counter()
+    result = lab.evaluate(tree, frame)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    try:
+        lab.evaluate(tree, frame)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main(max_n=1_000_000):
+    frame = lab.Frame()
+    for tree in lab.read_forms(lab.tokenize(SETUP)):
+        lab.evaluate(tree, frame)
+    print(f"{'n':>9} {'pipeline':<9} {'time':>10} {'peak memory':>12}")
+    n = 1000
+    while n <= max_n:
+        results = set()
+        for name, pipeline in PIPELINES.items():
+            result, elapsed, peak = measure(frame, pipeline.format(n=n))
+            results.add(result)
+            print(f"{n:>9,} {name:<9} {elapsed * 1e3:>8.1f}ms {peak / 1024:>10,.0f}KB")
+        assert len(results) == 1, results
+        n *= 10
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,63 @@
+"""
+Benchmark: cost of evaluation budgets.  Times the same call-heavy
+workload with no limit, with a step limit and with a deadline (both too
+large to be reached), on each engine.  With no limit the closure engine
+runs exactly the code it ran before budgets existed; the VM tests one
+global per call.
+
+Run with:  python benchmarks/limits_overhead.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import lab
+
+SETUP = [
+    "(define (fib n) (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2)))))",
+    "(define (loop n acc) (if (equal? n 0) acc (loop (- n 1) (+ acc n))))",
+]
+
+WORKLOADS = {
+    "fib": ["fib", 20],
+    "tail-loop": ["loop", 50000, 0],
+}
+
+LIMITS = {
+    "no limit": {},
+    "steps": {"steps": 10**12},
+    "seconds": {"seconds": 3600},
+}
+
+
+def best_of(function, repeat=10):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    print(f"{'engine':<9} {'workload':<10}" + "".join(f"{name:>18}" for name in LIMITS))
+    for engine in lab.ENGINES:
+        frame = lab.Frame()
+        for source in SETUP:
+            lab.evaluate(lab.parse(lab.tokenize(source)), frame, engine)
+        for name, tree in WORKLOADS.items():
+            times = [
+                best_of(lambda: lab.evaluate(tree, frame, engine, **limits))
+                for limits in LIMITS.values()
+            ]
+            cells = [f"{times[0]:>8.3f}s"] + [
+                f"{t:>8.3f}s ({t / times[0] - 1:+.1%})" for t in times[1:]
+            ]
+            print(f"{engine:<9} {name:<10}" + "".join(f"{cell:>18}" for cell in cells))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Benchmark: re-submitting the same small programs through evaluate_source
+(parse cache on) against tokenize -> parse -> evaluate from scratch.
+
+Run with:  python benchmarks/parse_cache.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import lab
+
+RULES = [
+    "(define (clamp x lo hi) (if (< x lo) lo (if (> x hi) hi x))) (clamp 42 0 10)",
+    "(reduce + (map (lambda (x) (* x x)) (list 1 2 3 4 5 6 7 8)) 0)",
+    "(begin (define rate 7) (define (cost n) (+ 3 (* n rate))) (cost 12))",
+]
+
+
+def from_scratch(source, frame, engine):
+    result = None
+    for tree in lab.read_forms(lab.tokenize(source)):
+        result = lab.evaluate(tree, frame, engine)
+    return result
+
+
+def run(evaluate, engine, repeat):
+    frame = lab.Frame()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for source in RULES:
+            evaluate(source, frame, engine)
+    return time.perf_counter() - start
+
+
+def main(repeat=5000):
+    print(f"{'engine':<10} {'uncached':>10} {'cached':>10} {'speedup':>8}")
+    for engine in lab.ENGINES:
+        lab.PARSE_CACHE.clear()
+        uncached = run(from_scratch, engine, repeat)
+        cached = run(lab.evaluate_source, engine, repeat)
+        print(f"{engine:<10} {uncached:>9.3f}s {cached:>9.3f}s {uncached / cached:>7.2f}x")
+    print("cache stats:", lab.parse_cache_stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Benchmark: the cost of compiling and running calls as more special forms
+are registered.  Every form is a key of SPECIAL_FORMS, so telling a form
+from a call is one dict lookup; with 0 to 1000 extra forms registered (each
+an expand-only host form) the timings should stay flat, where an if/elif
+chain over the form names would grow with each one.
+
+Run with:  python benchmarks/special_forms.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import lab
+
+SETUP = "(define (fib n) (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2)))))"
+CALLS = "(list " + " ".join(f"(+ {i} (* {i} 2))" for i in range(2000)) + ")"
+EXTRA_FORMS = (0, 10, 100, 1000)
+
+
+def best_of(function, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def measure(engine, repeat):
+    compile_tree, run = lab.get_engine(engine)
+    calls = lab.parse(lab.tokenize(CALLS))
+    frame = lab.Frame()
+    lab.evaluate(lab.parse(lab.tokenize(SETUP)), frame, engine)
+    fib = compile_tree(lab.parse(lab.tokenize("(fib 15)")))
+    return best_of(lambda: compile_tree(calls), repeat), best_of(lambda: run(fib, frame), repeat)
+
+
+def main(repeat=5):
+    print(f"{'forms':>6} {'engine':<9} {'compile 2000 calls':>19} {'run (fib 15)':>13}")
+    saved = dict(lab.SPECIAL_FORMS)
+    try:
+        for extra in EXTRA_FORMS:
+            for i in range(extra):
+                lab.register_special_form(f"form-{i}", expand=lambda tree: tree[1])
+            for engine in sorted(lab.ENGINES):
+                compiling, running = measure(engine, repeat)
+                print(
+                    f"{len(lab.SPECIAL_FORMS):>6} {engine:<9}"
+                    f" {compiling * 1e3:>17.2f}ms {running * 1e3:>11.2f}ms"
+                )
+            lab.SPECIAL_FORMS.clear()
+            lab.SPECIAL_FORMS.update(saved)
+    finally:
+        lab.SPECIAL_FORMS.clear()
+        lab.SPECIAL_FORMS.update(saved)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark: updating every cell of an n-by-n board stored the way
+test_files/sudoku.scm stores it (a list of row lists, changed with its
+list-replace) against the same board stored as a vector of row vectors
+(changed in place with vector-set!).
+
+sudoku.scm's list-replace rebuilds a list with list-ref for every index, so
+replacing one cell costs O(n^2), and a pass over the whole board O(n^4); the
+vector board reads and writes a cell in O(1), so a pass costs O(n^2).  The
+gap between the two widens with every doubling of n.
+
+Run with:  python benchmarks/sudoku_vectors.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import lab
+
+# slice/list-replace as in sudoku.scm (with the eager builtin map)
+LIST_BOARD = """
+(define (range-list start stop)
+    (if (>= start stop) (list) (cons start (range-list (+ start 1) stop))))
+(define (list-replace list_ replace-ix elt)
+    (map
+        (lambda (i) (if (equal? i replace-ix) elt (list-ref list_ i)))
+        (range-list 0 (length list_))))
+(define (make-list-board n)
+    (map (lambda (r) (map (lambda (c) (+ r c)) (range-list 0 n))) (range-list 0 n)))
+(define (list-get board r c) (list-ref (list-ref board r) c))
+(define (list-set board r c value)
+    (list-replace board r (list-replace (list-ref board r) c value)))
+(define (list-bump board n r c)
+    (if (equal? r n)
+        board
+        (if (equal? c n)
+            (list-bump board n (+ r 1) 0)
+            (list-bump (list-set board r c (+ 1 (list-get board r c))) n r (+ c 1)))))
+"""
+
+VECTOR_BOARD = """
+(define (fill-rows board n r)
+    (if (equal? r n)
+        board
+        (begin
+            (vector-set! board r (list->vector (map (lambda (c) (+ r c)) (range n))))
+            (fill-rows board n (+ r 1)))))
+(define (make-vector-board n) (fill-rows (make-vector n) n 0))
+(define (vector-get board r c) (vector-ref (vector-ref board r) c))
+(define (vector-put board r c value) (vector-set! (vector-ref board r) c value))
+(define (vector-bump board n r c)
+    (if (equal? r n)
+        board
+        (if (equal? c n)
+            (vector-bump board n (+ r 1) 0)
+            (begin
+                (vector-put board r c (+ 1 (vector-get board r c)))
+                (vector-bump board n r (+ c 1))))))
+"""
+
+
+def timed(frame, source):
+    tree = lab.parse(lab.tokenize(source))
+    start = time.perf_counter()
+    result = lab.evaluate(tree, frame)
+    return result, time.perf_counter() - start
+
+
+def main(sizes=(9, 18, 36, 72)):
+    frame = lab.Frame()
+    for tree in lab.read_forms(lab.tokenize(LIST_BOARD + VECTOR_BOARD)):
+        lab.evaluate(tree, frame)
+    print(f"{'n':>4} {'lists':>11} {'vectors':>10} {'ratio':>8}")
+    for n in sizes:
+        lists, list_time = timed(frame, f"(list-bump (make-list-board {n}) {n} 0 0)")
+        vectors, vector_time = timed(frame, f"(vector-bump (make-vector-board {n}) {n} 0 0)")
+        same = lab.equal(lists, lab.scheme_map(lab.vector_to_list, lab.vector_to_list(vectors)))
+        assert same, "the boards differ"
+        print(f"{n:>4} {list_time * 1e3:>9.1f}ms {vector_time * 1e3:>8.2f}ms {list_time / vector_time:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+Benchmark suite: times tokenize, parse and evaluate separately over the
+programs in test_files/ and over synthetic inputs scaled up to stress one
+thing each (deep nesting, long lists, deep recursion, many closures), and
+measures their memory use with tracemalloc.  Results are saved as JSON so
+that runs on different commits can be compared.
+
+For each workload and phase it records:
+    seconds          best wall-clock time over --repeat runs
+    peak_bytes       peak traced memory during the phase
+    retained_bytes   memory still allocated by the phase's result
+(measured in a separate run, as tracemalloc slows everything down).  A
+workload that fails records the error instead, so workloads needing
+features the interpreter lacks show up as such rather than stopping the run.
+
+Run with:
+    python benchmarks/suite.py [--output results.json] [--compare old.json]
+                               [--engine vm] [--scale 0.1] [--repeat 5]
+Comparing marks each timing more than --threshold (default 10%) slower
+than in the old results as a REGRESSION, and exits with status 1 if any
+are found.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import datetime
+import platform
+import subprocess
+import tracemalloc
+
+REPO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, REPO)
+
+import lab
+
+TEST_FILES = os.path.join(REPO, "test_files")
+
+EASY_BOARD = "(list " + " ".join(
+    "(list " + " ".join(str((3 * r + r // 3 + c) % 9 + 1) if (r + c) % 4 else "0" for c in range(9)) + ")"
+    for r in range(9)
+) + ")"
+
+FILE_WORKLOADS = {
+    # file name: expression evaluated after the file (or None)
+    "definitions.scm": "(list (fib 30) (square 12))",
+    "small_test1.scm": None,
+    "small_test2.scm": None,
+    "small_test3.scm": None,
+    "sudoku.scm": f"(solve-sudoku {EASY_BOARD})",
+    "ndmines.scm": (
+        "(begin (define game (new-game-nd (list 2 4) (list (list 0 0) (list 1 0) (list 1 1))))"
+        " (dig-nd game (list 0 3)) (game-get-mask game))"
+    ),
+}
+
+
+def deep_nesting(size):
+    return "(+ 1 " * size + "0" + ")" * size
+
+
+def long_list(size):
+    return "(length (list " + " ".join(map(str, range(size))) + "))"
+
+
+def deep_recursion(size):
+    return (
+        "(define (sum-to n) (if (equal? n 0) 0 (+ n (sum-to (- n 1)))))\n"
+        f"(sum-to {size})"
+    )
+
+
+def many_closures(size):
+    adders = " ".join(f"(make-adder {i})" for i in range(size))
+    return (
+        "(define (make-adder n) (lambda (x) (+ x n)))\n"
+        f"(define adders (list {adders}))\n"
+        "(reduce + (map (lambda (add) (add 1)) adders) 0)"
+    )
+
+
+SYNTHETIC_WORKLOADS = {
+    # name: (source generator, size at scale 1)
+    "deep-nesting": (deep_nesting, 2000),
+    "long-list": (long_list, 100_000),
+    "deep-recursion": (deep_recursion, 3000),
+    "many-closures": (many_closures, 20_000),
+}
+
+
+def workloads(scale):
+    # name -> Scheme source text
+    sources = {}
+    for name, expression in FILE_WORKLOADS.items():
+        with open(os.path.join(TEST_FILES, name)) as f:
+            sources[name] = f.read() + ("\n" + expression if expression else "")
+    for name, (generate, size) in SYNTHETIC_WORKLOADS.items():
+        sources[name] = generate(max(1, int(size * scale)))
+    return sources
+
+
+def phases(source, engine):
+    # (phase name, function of the previous phase's result) for one workload
+    def evaluate(forms):
+        frame = lab.Frame()
+        result = None
+        for tree in forms:
+            result = lab.evaluate(tree, frame, engine)
+        return result
+
+    return [
+        ("tokenize", lambda _: lab.tokenize(source)),
+        ("parse", lambda tokens: list(lab.read_forms(tokens))),
+        ("evaluate", evaluate),
+    ]
+
+
+def measure(source, engine, repeat):
+    results = {}
+    value = None
+    for phase, run in phases(source, engine):
+        argument = value
+        try:
+            best = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                value = run(argument)
+                best = min(best, time.perf_counter() - start)
+            tracemalloc.start()
+            try:
+                before = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                value = run(argument)
+                current, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+        except (lab.SchemeError, RecursionError) as error:
+            results[phase] = {"error": f"{type(error).__name__}: {error}"}
+            break
+        results[phase] = {
+            "seconds": best,
+            "peak_bytes": peak - before,
+            "retained_bytes": current - before,
+        }
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    # prints each timing against the baseline's; returns the regressions
+    regressions = []
+    print(f"\n{'workload':<16} {'phase':<9} {'old':>10} {'new':>10} {'change':>8}")
+    for name, phases_ in results.items():
+        for phase, new in phases_.items():
+            old = baseline.get(name, {}).get(phase, {})
+            if "seconds" not in new or "seconds" not in old:
+                continue
+            change = new["seconds"] / old["seconds"] - 1
+            flag = ""
+            if change > threshold:
+                flag = "  REGRESSION"
+                regressions.append((name, phase, change))
+            print(
+                f"{name:<16} {phase:<9} {old['seconds'] * 1e3:>8.2f}ms"
+                f" {new['seconds'] * 1e3:>8.2f}ms {change:>+7.1%}{flag}"
+            )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--output", help="file to save the results to, as JSON")
+    parser.add_argument("--compare", help="results of an earlier run to compare against")
+    parser.add_argument("--engine", default=lab.DEFAULT_ENGINE, choices=sorted(lab.ENGINES))
+    parser.add_argument("--scale", type=float, default=1.0, help="size factor for synthetic inputs")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--threshold", type=float, default=0.10)
+    args = parser.parse_args(argv)
+
+    results = {}
+    print(f"{'workload':<16} {'phase':<9} {'time':>10} {'peak':>10} {'retained':>10}")
+    for name, source in workloads(args.scale).items():
+        results[name] = measure(source, args.engine, args.repeat)
+        for phase, result in results[name].items():
+            if "error" in result:
+                print(f"{name:<16} {phase:<9} {result['error']}")
+            else:
+                print(
+                    f"{name:<16} {phase:<9} {result['seconds'] * 1e3:>8.2f}ms"
+                    f" {result['peak_bytes'] / 1024:>8.0f}KB {result['retained_bytes'] / 1024:>8.0f}KB"
+                )
+
+    run = {
+        "meta": {
+            "commit": git_commit(),
+            "date": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "engine": args.engine,
+            "scale": args.scale,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(run, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        for setting in ("scale", "engine"):
+            if baseline["meta"].get(setting) != run["meta"][setting]:
+                print(f"warning: the runs use different --{setting} values")
+        if compare(results, baseline["results"], args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""
+Benchmark: interned Symbols against plain strings on the big-scoping tests
+(test_inputs/23.scm to 26.scm), whose 100 nested lambdas stress both the
+dispatch on special forms while compiling and name lookup while running.
+
+Each program is parsed once; the plain-string version is a copy of the same
+trees with every Symbol replaced by a fresh str, as the reader produced
+before symbols were interned.  Compiling is timed on its own ("dispatch"),
+and so is running the compiled forms in a frame that already holds the
+definitions ("lookup").  The last rows time name lookups in a Frame directly
+and measure the memory the parsed trees of all four programs hold on to.
+
+Run with:  python benchmarks/symbols.py
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+REPO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, REPO)
+
+import lab
+
+PROGRAMS = [os.path.join(REPO, "test_inputs", f"{n}.scm") for n in range(23, 27)]
+
+
+def plain(value):
+    # a str equal to value but not the same object as any other
+    return (" " + value)[1:] if isinstance(value, str) else value
+
+
+def best_of(function, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def time_program(forms, engine, repeat):
+    compile_tree, run = lab.get_engine(engine)
+
+    def compile_all():
+        return [compile_tree(tree) for tree in forms]
+
+    compiled = compile_all()
+    frame = lab.Frame()
+    for code in compiled:
+        try:
+            run(code, frame)
+        except lab.SchemeError:
+            pass # some of the test programs end in an expected error
+
+    def run_all():
+        for code in compiled:
+            try:
+                run(code, frame)
+            except lab.SchemeError:
+                pass
+
+    return best_of(compile_all, repeat), best_of(run_all, repeat)
+
+
+def time_lookups(defined, looked_up, repeat):
+    frame = lab.Frame()
+    for name in defined:
+        frame[name] = 0
+    inner = lab.Frame(frame)
+
+    def look_up():
+        for _ in range(100):
+            for name in looked_up:
+                inner[name]
+
+    return best_of(look_up, repeat)
+
+
+def retained_bytes(make):
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        kept = make()
+        return tracemalloc.get_traced_memory()[0] - before
+    finally:
+        del kept
+        tracemalloc.stop()
+
+
+def main(repeat=20):
+    print(f"{'program':<8} {'engine':<9} {'phase':<9} {'str':>9} {'Symbol':>9} {'speedup':>8}")
+    for file_name in PROGRAMS:
+        with open(file_name) as f:
+            forms = list(lab.read_forms(lab.tokenize(f.read())))
+        plain_forms = [lab.copy_tree(tree, plain) for tree in forms]
+        for engine in sorted(lab.ENGINES):
+            timings = zip(time_program(plain_forms, engine, repeat), time_program(forms, engine, repeat))
+            for phase, (old, new) in zip(("dispatch", "lookup"), timings):
+                print(
+                    f"{os.path.basename(file_name):<8} {engine:<9} {phase:<9}"
+                    f" {old * 1e3:>7.2f}ms {new * 1e3:>7.2f}ms {old / new:>7.2f}x"
+                )
+    names = [lab.symbol(f"var{i}") for i in range(100)]
+    # each occurrence of a plain name is a string object of its own
+    old = time_lookups([plain(name) for name in names], [plain(name) for name in names], repeat)
+    new = time_lookups(names, names, repeat)
+    print(f"{'frame':<8} {'-':<9} {'lookup':<9} {old * 1e3:>7.2f}ms {new * 1e3:>7.2f}ms {old / new:>7.2f}x")
+    sources = []
+    for file_name in PROGRAMS:
+        with open(file_name) as f:
+            sources.append(f.read())
+    for source in sources: # so that the symbols already exist
+        list(lab.read_forms(lab.tokenize(source)))
+    old = retained_bytes(lambda: [
+        lab.copy_tree(tree, plain) for source in sources for tree in lab.read_forms(lab.tokenize(source))
+    ])
+    new = retained_bytes(lambda: [tree for source in sources for tree in lab.read_forms(lab.tokenize(source))])
+    print(f"{'trees':<8} {'-':<9} {'memory':<9} {old / 1024:>7.0f}KB {new / 1024:>7.0f}KB {old / new:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmark: the single-pass tokenizer (lab.iter_tokens / lab.tokenize)
+against the previous replace/splitlines/partition tokenizer, on a
+generated multi-megabyte Scheme file.
+
+Reports wall time and peak traced memory for:
+    legacy         old tokenize() on the whole string
+    tokenize       lab.tokenize() on the whole string (builds a list)
+    stream-string  consuming lab.iter_tokens() over the string
+    stream-file    consuming lab.iter_tokens() over an open file
+    load-file      consuming lab.iter_file_tokens() over an open file (the
+                   evaluate_file path, positions on lambda keywords only)
+
+Run with:  python benchmarks/tokenize_large.py [megabytes]
+"""
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import lab
+
+TEST_FILES = os.path.join(os.path.dirname(__file__), "..", "test_files")
+
+
+def legacy_tokenize(source):
+    # the tokenize() this repo used before the single-pass scanner
+    seperated = source.replace("(", " ( ").replace(")", " ) ")
+    lines = seperated.splitlines()
+    tokens = []
+    for line in lines:
+        partitioned = line.partition(";")
+        tokens += partitioned[0].split()
+    return tokens
+
+
+def generated_source(megabytes):
+    with open(os.path.join(TEST_FILES, "sudoku.scm")) as f:
+        unit = f.read()
+    return unit * max(1, int(megabytes * 2**20 / len(unit)))
+
+
+def consume(tokens):
+    count = 0
+    for _ in tokens:
+        count += 1
+    return count
+
+
+def measure(label, func):
+    # time and memory are measured in separate runs, since tracing every
+    # allocation slows down the allocation-heavy tokenizers the most
+    start = time.perf_counter()
+    count = func()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{label:<14} {elapsed:>8.3f}s {peak / 2**20:>10.1f} MiB {count:>10} tokens")
+
+
+def main(megabytes=4):
+    source = generated_source(megabytes)
+    print(f"input: {len(source) / 2**20:.1f} MiB")
+    with tempfile.NamedTemporaryFile("w", suffix=".scm", delete=False) as f:
+        f.write(source)
+    try:
+        measure("legacy", lambda: len(legacy_tokenize(source)))
+        measure("tokenize", lambda: len(lab.tokenize(source)))
+        measure("stream-string", lambda: consume(lab.iter_tokens(source)))
+        def stream_file():
+            with open(f.name) as lines:
+                return consume(lab.iter_tokens(lines))
+        measure("stream-file", stream_file)
+        def load_file():
+            with open(f.name) as lines:
+                return consume(lab.iter_file_tokens(lines))
+        measure("load-file", load_file)
+    finally:
+        os.remove(f.name)
+
+
+if __name__ == "__main__":
+    main(*(float(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,79 @@
+"""
+Benchmark: the bytecode VM (engine="vm") against the closure compiler
+(engine="closures", which replaced the original tree walker).
+
+Throughput is reported in VM instructions per second: each workload is run
+once on the VM to count the instructions it takes, and both engines are
+timed doing that same work, so the two rates are directly comparable.
+
+Run with:  python benchmarks/vm_vs_closures.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import lab
+
+SETUP = [
+    "(define (fib n) (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2)))))",
+    "(define (loop n acc) (if (equal? n 0) acc (loop (- n 1) (+ acc n))))",
+    "(define (compose f g) (lambda (x) (f (g x))))",
+    "(define (square x) (* x x))",
+    "(define (add-one x) (+ x 1))",
+    "(define (sum-list xs) (if (equal? xs nil) 0 (+ (car xs) (sum-list (cdr xs)))))",
+]
+
+WORKLOADS = {
+    "fib": "(fib 18)",
+    "tail-loop": "(loop 20000 0)",
+    "closures": "(reduce + (map (compose square add-one) (list 1 2 3 4 5 6 7 8)) 0)",
+    "list-walk": "(sum-list (list 1 2 3 4 5 6 7 8 9 10 11 12 13 14 15 16))",
+}
+
+
+def parsed(source):
+    return lab.parse(lab.tokenize(source))
+
+
+def run(engine, setup, expression, repeat):
+    frame = lab.Frame()
+    for tree in setup:
+        lab.evaluate(tree, frame, engine)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        lab.evaluate(expression, frame, engine)
+    return time.perf_counter() - start
+
+
+def count_instructions(setup, expression, repeat):
+    frame = lab.Frame()
+    for tree in setup:
+        lab.evaluate(tree, frame, "vm")
+    before = lab.VM_STATS["instructions"]
+    for _ in range(repeat):
+        lab.evaluate(expression, frame, "vm")
+    return lab.VM_STATS["instructions"] - before
+
+
+def main(target_instructions=2_000_000):
+    setup = [parsed(line) for line in SETUP]
+    print(f"{'workload':<10} {'instructions':>12} {'closures':>14} {'vm':>14} {'vm/closures':>11}")
+    for name, source in WORKLOADS.items():
+        expression = parsed(source)
+        repeat = max(1, target_instructions // count_instructions(setup, expression, 1))
+        instructions = count_instructions(setup, expression, repeat)
+        rates = [
+            instructions / run(engine, setup, expression, repeat)
+            for engine in ("closures", "vm")
+        ]
+        print(
+            f"{name:<10} {instructions:>12,} {rates[0]:>10,.0f} i/s {rates[1]:>10,.0f} i/s"
+            f" {rates[1] / rates[0]:>10.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -5,14 +5,27 @@ LISP Interpreter Part 1
 
 #!/usr/bin/env python3
 
+import re
 import sys
+import os
 import doctest
+import struct
+import time
+import pickle
+import marshal
+import hashlib
+import concurrent.futures
+import multiprocessing
+import queue
+import signal
+import weakref
+import asyncio
+from types import CoroutineType
+from array import array
 from typing import Any     
 
 sys.setrecursionlimit(20_000)
 
-# NO ADDITIONAL IMPORTS!
-
 #############################
 # Scheme-related Exceptions #
 #############################
@@ -52,15 +65,61 @@ class SchemeEvaluationError(SchemeError):
     pass
 
 
+class SchemeLimitError(SchemeError):
+    """
+    Exception to be raised when an evaluation runs out of its budget of
+    steps.
+    """
+
+    pass
+
+
+class SchemeTimeoutError(SchemeLimitError):
+    """
+    Exception to be raised when a program runs past its time limit.
+    """
+
+    pass
+
+
 ############################
 # Tokenization and Parsing #
 ############################
 
 
+class Symbol(str):
+    """
+    A name read from Scheme source.  Symbols are interned (see symbol): the
+    same name always reads as the same Symbol object, so symbols can be told
+    apart with `is`, and dict lookups of them (frame bindings, slot layouts)
+    succeed on identity without comparing characters.  A Symbol is still
+    equal to the plain string of its name.
+
+    >>> symbol('spam') is symbol('spam'), symbol('spam') == 'spam'
+    (True, True)
+    """
+    __slots__ = ()
+
+    def __reduce__(self):
+        # unpickled symbols are interned again
+        return symbol, (str(self),)
+
+# every Symbol made so far, by name; like Python's interned strings, symbols
+# live as long as the process
+SYMBOLS = {}
+
+def symbol(name):
+    # the interned Symbol for a name
+    try:
+        return SYMBOLS[name]
+    except KeyError:
+        name = str(name)
+        return SYMBOLS.setdefault(name, Symbol(name))
+
 def number_or_symbol(value):
     """
     Helper function: given a string, convert it to an integer or a float if
-    possible; otherwise, return the string itself
+    possible; otherwise, return the interned Symbol for it
 
     >>> number_or_symbol('8')
     8
@@ -77,194 +136,1278 @@ def number_or_symbol(value):
         try:
             return float(value)
         except ValueError:
-            return value
+            return symbol(value)
+
+
+class Token(str):
+    """
+    A token string that also remembers where it starts in the source: line
+    and column are both counted from 1.
+
+    >>> token = Token('spam', 3, 7)
+    >>> token == 'spam', token.line, token.column
+    (True, 3, 7)
+    """
+
+    def __new__(cls, text, line, column):
+        token = super().__new__(cls, text)
+        token.line = line
+        token.column = column
+        return token
+
+    def __reduce__(self):
+        # pickle and copy build tokens through __new__, position included
+        return (Token, (str(self), self.line, self.column))
+
 
+# a line (without its line break) is everything up to one of the characters
+# str.splitlines breaks on; a token is a paren or a run of other characters
+# that are not whitespace and do not start a ; comment
+LINE_BREAKS = "\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029"
+LINE_PATTERN = re.compile(rf"([^{LINE_BREAKS}]*)(?:\r\n|[{LINE_BREAKS}])")
+TOKEN_PATTERN = re.compile(r"[()]|[^\s();]+")
+
+def iter_lines(source):
+    """
+    Lazily yields the lines of source, which is either a string or an
+    iterable of lines such as an open file.  Only one line is copied out of
+    a string at a time.
+    """
+    if not isinstance(source, str):
+        yield from source
+        return
+    end = 0
+    for match in LINE_PATTERN.finditer(source):
+        yield match.group(1)
+        end = match.end()
+    if end < len(source):
+        yield source[end:]
+
+def iter_tokens(source, first_line = 1):
+    """
+    Lazily yields the Tokens of source (a string or an open file) in a single
+    pass, each carrying the line and column it starts at, counting lines
+    from first_line.
+
+    >>> [(t, t.line, t.column) for t in iter_tokens("(+ 1\\n  x) ; done")]
+    [('(', 1, 1), ('+', 1, 2), ('1', 1, 4), ('x', 2, 3), (')', 2, 4)]
+    """
+    for line_number, line in enumerate(iter_lines(source), first_line):
+        code = line.partition(";")[0]
+        for match in TOKEN_PATTERN.finditer(code):
+            yield Token(match.group(), line_number, match.start() + 1)
+
+BLOCK_SIZE = 1 << 16
+
+def iter_blocks(source):
+    """
+    Lazily yields source (a string or an open file) in blocks of about
+    BLOCK_SIZE characters, each ending at a line break, so that no line is
+    split between two blocks.
+    """
+    if isinstance(source, str):
+        start = 0
+        while start < len(source):
+            end = source.find("\n", start + BLOCK_SIZE)
+            end = len(source) if end == -1 else end + 1
+            yield source[start:end]
+            start = end
+        return
+    while True:
+        block = source.read(BLOCK_SIZE)
+        if not block:
+            return
+        yield block + source.readline()
 
 def tokenize(source):
     """
     Splits an input string into meaningful tokens (left parens, right parens,
     other whitespace-separated values).  Returns a list of strings.
 
+    The source is split a block at a time (see iter_blocks), so the copies
+    made while tokenizing stay small however large the input is.  Use
+    iter_tokens instead when the tokens' positions are needed or the tokens
+    should be produced lazily (or iter_file_tokens when only the positions
+    of lambda keywords are).
+
     Arguments:
         source (str): a string containing the source code of a Scheme
-                      expression
+                      expression (or an open file)
     """
-    seperated = source.replace("(", " ( ").replace(")", " ) ")
-    lines = seperated.splitlines() #splits string into a list of lines
     tokens = []
-    for line in lines:
-        partitioned = line.partition(";") #partitions line in code and comments
-        tokens += partitioned[0].split() # adds only the code to the tokens
+    for block in iter_blocks(source):
+        seperated = block.replace("(", " ( ").replace(")", " ) ")
+        for line in seperated.splitlines():
+            code = line.partition(";")[0] # only the code, not the comment
+            tokens += code.split()
     return tokens
 
-def formated_correctly(tokens):
+def iter_file_tokens(source):
     """
-    Checks that tokens have:
-      an equal number of closing and opening parenthesis
-      starts and end with a parenthesis
+    Lazily yields the tokens of source (a string or an open file) a block at
+    a time (see iter_blocks), at about the speed of tokenize.  Only lambda
+    keywords are yielded as Tokens with their positions, which is all that
+    lambda_name needs; every other token is a plain string.
+
+    >>> [(t, t.line, t.column) for t in iter_file_tokens("(f 1)\\n((lambda (x) x) 2)") if t == "lambda"]
+    [('lambda', 2, 3)]
     """
-    if isinstance(tokens, list):
-        if len(tokens) == 1:
-            return tokens[0] not in ("(", ")")
-        else:
-            equal_num_of_parenthesis =  tokens.count("(") == tokens.count(")")
-            starts_ends_with_parthesis = tokens[0] == "(" and tokens[-1] == ")"
-            return equal_num_of_parenthesis and starts_ends_with_parthesis
-    return True
+    line_number = 0
+    for block in iter_blocks(source):
+        if "lambda" not in block:
+            tokens = []
+            seperated = block.replace("(", " ( ").replace(")", " ) ")
+            for line in seperated.splitlines():
+                line_number += 1
+                tokens += line.partition(";")[0].split()
+            yield from tokens
+            continue
+        for line in block.splitlines():
+            line_number += 1
+            code = line.partition(";")[0]
+            if "lambda" not in code:
+                yield from code.replace("(", " ( ").replace(")", " ) ").split()
+                continue
+            for match in TOKEN_PATTERN.finditer(code):
+                text = match.group()
+                if text == "lambda":
+                    yield Token(text, line_number, match.start() + 1)
+                else:
+                    yield text
+
+def read_atom(token):
+    # the number or Symbol a token stands for.  A lambda keyword read with
+    # its position (see iter_tokens) stays a Token, so that functions can be
+    # named after where they are written (see lambda_name).
+    if type(token) is Token and token == "lambda":
+        return token
+    return number_or_symbol(token)
+
+def token_position(token, index):
+    # describes where a token is, for syntax error messages
+    if isinstance(token, Token):
+        return f"line {token.line}, column {token.column}"
+    return f"token {index}"
+
+class Reader:
+    """
+    Incremental parser: tokens are fed in any number of pieces, and each
+    top-level expression is produced as soon as its last token arrives.
+    Lists that are still open are kept on an explicit stack between feeds,
+    so reading takes one linear pass and any depth of nesting.
+
+    >>> reader = Reader()
+    >>> list(reader.feed(tokenize("(define x 2) (+ x")))
+    [['define', 'x', 2]]
+    >>> reader.incomplete
+    True
+    >>> list(reader.feed(tokenize("3) x")))
+    [['+', 'x', 3], 'x']
+
+    Errors give the line and column of the token at fault when it is a
+    Token.  When it is a plain string, rescan (if given) is called to
+    produce the Tokens of the same source again (see iter_tokens), and the
+    position is looked up among those instead.
+    """
+
+    def __init__(self, rescan = None):
+        self.open_lists = [] # (opening token, its index, the list being filled)
+        self.num_tokens = 0
+        self.rescan = rescan
+
+    def position(self, token, index):
+        # where the index-th token fed is, for syntax error messages
+        if not isinstance(token, Token) and self.rescan is not None:
+            tokens = self.rescan()
+            try:
+                for i, found in enumerate(tokens):
+                    if i == index:
+                        token = found
+                        break
+            finally:
+                tokens.close()
+        return token_position(token, index)
+
+    @property
+    def incomplete(self):
+        # True while an expression has been started but not finished
+        return bool(self.open_lists)
+
+    def feed(self, tokens):
+        """
+        Reads tokens (any iterable of them), yielding each top-level
+        expression they complete.
+        """
+        open_lists = self.open_lists
+        index = self.num_tokens - 1
+        for index, token in enumerate(tokens, self.num_tokens):
+            if token == "(":
+                open_lists.append((token, index, []))
+            elif token == ")":
+                if not open_lists:
+                    self.num_tokens = index + 1
+                    raise SchemeSyntaxError(
+                        f"unmatched ')' at {self.position(token, index)}"
+                    )
+                finished = open_lists.pop()[2]
+                if open_lists:
+                    open_lists[-1][2].append(finished)
+                else:
+                    self.num_tokens = index + 1
+                    yield finished
+            elif open_lists:
+                open_lists[-1][2].append(read_atom(token))
+            else:
+                self.num_tokens = index + 1
+                yield read_atom(token)
+        self.num_tokens = index + 1
+
+    def close(self):
+        # the input has ended, so any expression still open is an error
+        if self.open_lists:
+            token, index, _ = self.open_lists[-1]
+            raise SchemeSyntaxError(f"unclosed '(' at {self.position(token, index)}")
+
+def read_forms(tokens):
+    """
+    Lazily yields the top-level expressions in an iterable of tokens (such as
+    iter_tokens over an open file), each as soon as it is complete.
+    """
+    reader = Reader()
+    yield from reader.feed(tokens)
+    reader.close()
 
 def parse(tokens):
     """
     Parses a list of tokens, constructing a representation where:
-        * symbols are represented as Python strings
+        * symbols are represented as (interned) Symbol strings
         * numbers are represented as Python ints or floats
         * S-expressions are represented as Python lists
 
+    The tokens must make up exactly one expression; see Reader for how they
+    are read.
+
     Arguments:
-        tokens (list): a list of strings representing tokens
-    """
-    if not formated_correctly(tokens):
-        raise SchemeSyntaxError
-    def nested_parser(rest):
-        parsed = []
-        i = 0
-        while i < len(rest):
-            token = rest[i]
-            if token == ')':
-                return parsed, i
-            if token == '(' :
-                i += 1 # add one to skip '('
-                nests, added_index = nested_parser(rest[i:])
-                parsed.append(nests)
-                i += added_index
-            else: 
-                parsed.append(number_or_symbol(token))
-            i += 1
-        return parsed, i
-    return nested_parser(tokens)[0][0]
+        tokens (list): a list of strings representing tokens (or any iterable
+                       of them, such as iter_tokens)
+
+    >>> parse(tokenize("(define (f x) (* x 2.5))"))
+    ['define', ['f', 'x'], ['*', 'x', 2.5]]
+    """
+    tokens = iter(tokens)
+    reader = Reader()
+    for parsed in reader.feed(tokens):
+        extra = next(tokens, None)
+        if extra is not None:
+            raise SchemeSyntaxError(
+                f"unexpected {extra!r} after the expression at {token_position(extra, reader.num_tokens)}"
+            )
+        return parsed
+    reader.close()
+    raise SchemeSyntaxError("no expression to parse")
 
 ######################
 # Built-in Functions #
 ######################
-def mul(args):
+# Each arithmetic builtin names its first two arguments, so the common one-
+# and two-argument calls run without building (or looping over) an argument
+# tuple; only longer calls fall back to handling the rest as a sequence.
+MISSING = object()
+
+def add(a=0, b=0, *rest):
+    # sums all args together
+    if rest:
+        return sum(rest, a + b)
+    return a + b
+
+def sub(a, b=MISSING, *rest):
+    # negates a single argument, otherwise subtracts the rest from the first
+    if b is MISSING:
+        return -a
+    if rest:
+        return a - sum(rest, b)
+    return a - b
+
+def mul(a=1, b=1, *rest):
     #multiplies all args together
-    if len(args) == 1:
-        return args[0]
-    else: 
-        running_total = 1
-        for arg in args:
+    if rest:
+        running_total = a * b
+        for arg in rest:
             running_total *= arg
         return running_total
+    return a * b
     
-def div(args):
+def div(a, b=MISSING, *rest):
     # successively divides the first argument by the remaining arguments
-    if len(args) == 1:
-        return args[0]
-    else: 
-        to_divide = args[0]
-        for arg in args[1:]:
-            to_divide /= arg
-        return to_divide
+    if b is MISSING:
+        return a
+    to_divide = a / b
+    for arg in rest:
+        to_divide /= arg
+    return to_divide
+
+def in_order(compare, args):
+    # True if compare holds between every pair of neighbouring args
+    for i in range(len(args) - 1):
+        if not compare(args[i], args[i + 1]):
+            return False
+    return True
+
+def less(a, b, *rest):
+    if rest:
+        return a < b and in_order(less, (b, *rest))
+    return a < b
+
+def less_or_equal(a, b, *rest):
+    if rest:
+        return a <= b and in_order(less_or_equal, (b, *rest))
+    return a <= b
+
+def greater(a, b, *rest):
+    if rest:
+        return a > b and in_order(greater, (b, *rest))
+    return a > b
+
+def greater_or_equal(a, b, *rest):
+    if rest:
+        return a >= b and in_order(greater_or_equal, (b, *rest))
+    return a >= b
+
+def values_equal(a, b):
+    # equality of two Scheme values: lists are equal when their elements are
+    pending = [(a, b)]
+    while pending:
+        a, b = pending.pop()
+        # a lazy sequence is only realized as far as the comparison needs:
+        # against anything but a list, only whether it is empty matters
+        if type(a) is Lazy_Sequence:
+            a = list_from_iterable(a) if type(b) in EQUAL_TYPES else a.first_cell()
+        if type(b) is Lazy_Sequence:
+            b = list_from_iterable(b) if type(a) in EQUAL_TYPES else b.first_cell()
+        if type(a) is Pair and type(b) is Pair:
+            pending.append((a.cdr, b.cdr))
+            pending.append((a.car, b.car))
+        elif type(a) is Vector and type(b) is Vector:
+            if len(a.items) != len(b.items):
+                return False
+            pending.extend(zip(a.items, b.items))
+        elif type(a) in EQUAL_TYPES or type(b) in EQUAL_TYPES or a != b:
+            return False
+    return True
+
+def equal(a, b, *rest):
+    # True if all of the arguments are equal
+    if rest:
+        return values_equal(a, b) and in_order(values_equal, (b, *rest))
+    if type(a) in EQUAL_TYPES or type(b) in EQUAL_TYPES:
+        return values_equal(a, b)
+    return a == b
+
+def negate(value):
+    # (not x) is #t only when x is #f
+    return value is False
+
+#########
+# Lists #
+#########
+# A list is a chain of Pair cells ending in NIL.  Pairs are two-slot objects
+# with no instance dict, and the list builtins walk and build chains with
+# loops, so they use constant stack space however long the list is.
+#
+# The builtins that read lists also accept two lazy kinds of list (see
+# Streams below): a chain may continue with a Promise, which is forced to
+# get the rest of it, or with a Lazy_Sequence.
+
+class Pair:
+    __slots__ = ("car", "cdr")
+
+    def __init__(self, car, cdr):
+        self.car = car
+        self.cdr = cdr
+
+    def __iter__(self):
+        # the elements of the list starting at this pair
+        return iter_list(self)
+
+    def __repr__(self):
+        elements = []
+        pair = self
+        while type(pair) is Pair:
+            elements.append(repr(pair.car))
+            pair = pair.cdr
+        if pair is not NIL:
+            elements += [".", repr(pair)]
+        return "(" + " ".join(elements) + ")"
+
+    def __reduce__(self):
+        # pickled front to back, so long lists do not hit the recursion limit
+        elements = []
+        pair = self
+        while type(pair) is Pair:
+            elements.append(pair.car)
+            pair = pair.cdr
+        return list_from_iterable, (elements, pair)
+
+class Nil:
+    # type of NIL, the empty list; there is only ever one instance
+    __slots__ = ()
+
+    def __iter__(self):
+        return iter(())
+
+    def __repr__(self):
+        return "()"
+
+    def __reduce__(self):
+        # unpickles as the NIL singleton
+        return "NIL"
+
+NIL = Nil()
+
+def iter_list(lst):
+    # an iterator over the elements of a list, raising if it is not a
+    # proper list.  A builtin walking a long list makes no calls, so while
+    # a budget is installed (see Limits) the walk is charged instead.
+    if BUDGET is not None:
+        return charged(walk_list(lst))
+    return walk_list(lst)
+
+def walk_list(lst):
+    while True:
+        if type(lst) is Pair:
+            yield lst.car
+            lst = lst.cdr
+        elif type(lst) is Promise:
+            lst = lst.force()
+        elif type(lst) is Lazy_Sequence:
+            yield from lst.values()
+            return
+        else:
+            break
+    if lst is not NIL:
+        raise SchemeEvaluationError("not a list:", lst)
+
+def list_from_iterable(values, tail = NIL):
+    # builds a list holding the values in order, front to back, ending in
+    # tail (NIL for a proper list)
+    head = Pair(None, tail)
+    last = head
+    for value in values:
+        last.cdr = last = Pair(value, tail)
+    return head.cdr
+
+def cons(car, cdr):
+    return Pair(car, cdr)
+
+def car(pair):
+    if type(pair) is not Pair:
+        if type(pair) is Lazy_Sequence:
+            pair = pair.first_cell()
+            if type(pair) is Pair:
+                return pair.car
+        raise SchemeEvaluationError("car of a non-pair:", pair)
+    return pair.car
+
+def cdr(pair):
+    if type(pair) is not Pair:
+        if type(pair) is Lazy_Sequence:
+            return pair.rest()
+        raise SchemeEvaluationError("cdr of a non-pair:", pair)
+    return pair.cdr
+
+def scheme_list(*values):
+    result = NIL
+    for value in reversed(values):
+        result = Pair(value, result)
+    return result
+
+def length(lst):
+    count = 0
+    while type(lst) is Pair:
+        count += 1
+        lst = lst.cdr
+    if type(lst) in LAZY_TYPES:
+        return count + sum(1 for _ in iter_list(lst))
+    if lst is not NIL:
+        raise SchemeEvaluationError("length of a non-list:", lst)
+    return count
+
+def list_ref(lst, index):
+    if not isinstance(index, int) or index < 0:
+        raise SchemeEvaluationError("invalid list index:", index)
+    remaining = index
+    while remaining and type(lst) is Pair:
+        lst = lst.cdr
+        remaining -= 1
+    if type(lst) is Pair:
+        return lst.car
+    if type(lst) in LAZY_TYPES:
+        for value in iter_list(lst):
+            if not remaining:
+                return value
+            remaining -= 1
+    raise SchemeEvaluationError("list index out of range:", index)
+
+def append(*lists):
+    # a new list with the elements of all the lists; shares no cells with them
+    head = Pair(None, NIL)
+    last = head
+    for lst in lists:
+        for value in iter_list(lst):
+            last.cdr = last = Pair(value, NIL)
+    return head.cdr
+
+def scheme_map(function, lst):
+    # always a list, calling function once per element; see stream_map
+    return list_from_iterable(function(value) for value in iter_list(lst))
+
+def scheme_filter(function, lst):
+    return list_from_iterable(
+        value for value in iter_list(lst) if function(value) is not False
+    )
+
+def stream_map(function, lst):
+    # map as a lazy sequence (see Streams)
+    return Lazy_Sequence(lambda: map(function, iter_list(lst)))
+
+def stream_filter(function, lst):
+    return Lazy_Sequence(
+        lambda: (value for value in iter_list(lst) if function(value) is not False)
+    )
+
+def reduce(function, lst, initial):
+    result = initial
+    for value in iter_list(lst):
+        result = function(result, value)
+    return result
+
+###########
+# Streams #
+###########
+# Two kinds of lazy list:
+#   * streams, as in SICP: (cons-stream a b) is a Pair whose cdr is the
+#     Promise (delay b), forced by stream-cdr.  A forced promise keeps its
+#     value, so a stream can be walked any number of times, but every
+#     element forced stays in memory for as long as the stream's head does.
+#   * lazy sequences, made by range, stream-map and stream-filter: a
+#     Lazy_Sequence holds no elements, only a way to produce them, so a
+#     pipeline such as (reduce + (stream-map f (range 1000000)) 0) runs in
+#     constant memory.  Each walk produces the elements again, calling the
+#     functions involved again.  (car seq) and (cdr seq) realize seq once as
+#     a stream instead, so a walk with cdr takes O(1) per step, and keeps
+#     the elements it has realized for as long as seq itself is kept.
+# The list builtins (length, list-ref, append, map, filter, reduce, equal?)
+# accept both, besides ordinary lists.  map and filter always build a list,
+# calling their function once per element, whatever they are given.
+
+class Promise:
+    # the value of an expression, computed by calling thunk the first time
+    # it is forced
+    __slots__ = ("thunk", "value")
+
+    def __init__(self, thunk):
+        self.thunk = thunk
+        self.value = None
+
+    def force(self):
+        if self.thunk is not None:
+            value = self.thunk()
+            if self.thunk is not None: # unless forcing it forced it already
+                self.value = value
+                self.thunk = None
+        return self.value
+
+    def __repr__(self):
+        return "#<promise>"
+
+class Lazy_Sequence:
+    # a list whose elements make_iterator() produces on each walk.  car and
+    # cdr realize it instead as a stream (see cells), which a sequence made
+    # by cdr has in place of make_iterator.
+    __slots__ = ("make_iterator", "cells")
+
+    def __init__(self, make_iterator, cells = None):
+        self.make_iterator = make_iterator
+        self.cells = cells
+
+    def values(self):
+        # an iterator over the elements, not charged to any budget (see
+        # __iter__)
+        if self.make_iterator is None:
+            return walk_list(self.first_cell())
+        return self.make_iterator()
+
+    def __iter__(self):
+        if BUDGET is not None:
+            return charged(self.values())
+        return self.values()
+
+    def first_cell(self):
+        # the sequence as a Pair whose cdr is a Promise of the rest (or NIL
+        # if it is empty), realized from one shared iterator an element at
+        # a time, so that walking it with cdr takes O(1) per step.  The cells
+        # outlive the evaluation that made them, so they are not charged;
+        # whoever walks them is (see __iter__).
+        cells = self.cells
+        if cells is None:
+            cells = self.cells = stream_cells(self.values())
+        elif type(cells) is Promise:
+            cells = self.cells = cells.force()
+        return cells
+
+    def rest(self):
+        # the sequence without its first element
+        cells = self.first_cell()
+        if type(cells) is not Pair:
+            raise SchemeEvaluationError("cdr of an empty sequence")
+        return Lazy_Sequence(None, cells.cdr)
 
+    def __repr__(self):
+        return "#<lazy sequence>"
+
+def stream_cells(values):
+    # the elements of the iterator values as a stream of Pairs (see
+    # Lazy_Sequence.first_cell)
+    value = next(values, MISSING)
+    if value is MISSING:
+        return NIL
+    return Pair(value, Promise(lambda: stream_cells(values)))
+
+LAZY_TYPES = {Promise, Lazy_Sequence}
+
+def is_lazy(lst):
+    # True for a lazy sequence or a stream
+    return type(lst) is Lazy_Sequence or (type(lst) is Pair and type(lst.cdr) is Promise)
+
+def force(value):
+    # the value of a promise; anything else is its own value
+    if type(value) is Promise:
+        return value.force()
+    return value
+
+def stream_cdr(stream):
+    return force(cdr(stream))
+
+def scheme_range(start, stop = MISSING, step = 1):
+    # (range stop), (range start stop) or (range start stop step), as
+    # Python's range but lazy
+    if stop is MISSING:
+        start, stop = 0, start
+    for value in (start, stop, step):
+        if not isinstance(value, int) or isinstance(value, bool):
+            raise SchemeEvaluationError("range needs integers:", value)
+    if step == 0:
+        raise SchemeEvaluationError("range step cannot be 0")
+    return Lazy_Sequence(lambda: iter(range(start, stop, step)))
+
+###########
+# Vectors #
+###########
+# A vector is a fixed-length sequence with O(1) access to any element by
+# index, backed by a Python list.  Vectors are equal? when their elements
+# are, like lists, but a vector is never equal to a list.
+
+class Vector:
+    __slots__ = ("items",)
+
+    def __init__(self, items):
+        self.items = items
+
+    def __repr__(self):
+        return "#(" + " ".join(map(repr, self.items)) + ")"
+
+def vector_index(vector, index):
+    # checks that index is valid for vector
+    if type(vector) is not Vector:
+        raise SchemeEvaluationError("not a vector:", vector)
+    if not isinstance(index, int) or isinstance(index, bool):
+        raise SchemeEvaluationError("invalid vector index:", index)
+    if not 0 <= index < len(vector.items):
+        raise SchemeEvaluationError("vector index out of range:", index)
+    return index
+
+def make_vector(size, fill = 0):
+    if not isinstance(size, int) or isinstance(size, bool) or size < 0:
+        raise SchemeEvaluationError("invalid vector size:", size)
+    return Vector([fill] * size)
+
+def vector(*values):
+    return Vector(list(values))
+
+def vector_ref(vector, index):
+    index = vector_index(vector, index)
+    return vector.items[index]
+
+def vector_set(vector, index, value):
+    # (vector-set! v i x) replaces element i of v by x, returning x
+    index = vector_index(vector, index)
+    vector.items[index] = value
+    return value
+
+def vector_length(vector):
+    if type(vector) is not Vector:
+        raise SchemeEvaluationError("not a vector:", vector)
+    return len(vector.items)
+
+def vector_to_list(vector):
+    if type(vector) is not Vector:
+        raise SchemeEvaluationError("not a vector:", vector)
+    return list_from_iterable(vector.items)
+
+def list_to_vector(lst):
+    return Vector(list(iter_list(lst)))
+
+# values equal? compares by their elements (see values_equal)
+EQUAL_TYPES = {Pair, Lazy_Sequence, Vector}
+
+###############
+# Memoization #
+###############
+# (memoize f) or (memoize f max-size) returns a function that caches f's
+# results by argument value, keeping the max-size most recently used ones.
+# Only numbers, booleans and nil are used as keys, compared together with
+# their types so that 1 and 1.0 stay apart, and 0.0 and -0.0 too.  A call
+# with any other argument (a list, a function, ...) bypasses the cache and
+# simply calls f.
+
+MEMO_KEY_TYPES = {int, float, bool, Nil}
+
+def float_bits(args):
+    # args with each float replaced by the bytes of its IEEE representation
+    return tuple(struct.pack("<d", arg) if type(arg) is float else arg for arg in args)
+
+class Memoized_Function:
+    def __init__(self, function, max_size):
+        self.function = function
+        self.max_size = max_size
+        self.cache = {} # kept in least to most recently used order
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0
+
+    def __call__(self, *args):
+        signed = False
+        for arg in args:
+            if type(arg) not in MEMO_KEY_TYPES:
+                self.bypasses += 1
+                return self.function(*args)
+            if type(arg) is float and (arg == 0 or arg != arg):
+                signed = True
+        if signed:
+            # 0.0 == -0.0, and a NaN is not even equal to itself, so floats
+            # are keyed by their bits when a zero or a NaN is among them
+            key = (float_bits(args), tuple(map(type, args)))
+        else:
+            key = (args, tuple(map(type, args)))
+        cache = self.cache
+        if key in cache:
+            self.hits += 1
+            result = cache[key] = cache.pop(key)
+            return result
+        self.misses += 1
+        result = self.function(*args)
+        cache[key] = result
+        if len(cache) > self.max_size:
+            del cache[next(iter(cache))]
+        return result
+
+    def stats(self):
+        # (hits, misses, bypasses, number of cached results)
+        return self.hits, self.misses, self.bypasses, len(self.cache)
+
+def memoize(function, max_size = 1024):
+    if not callable(function):
+        raise SchemeEvaluationError("memoize needs a function:", function)
+    if not isinstance(max_size, int) or isinstance(max_size, bool) or max_size < 1:
+        raise SchemeEvaluationError("invalid memoize cache size:", max_size)
+    return Memoized_Function(function, max_size)
+
+def memo_stats(function):
+    # the stats of a memoized function, as a Scheme list
+    if not isinstance(function, Memoized_Function):
+        raise SchemeEvaluationError("not a memoized function:", function)
+    return scheme_list(*function.stats())
+
+# every callable (builtin or User_Function) is called with positional args
 scheme_builtins = {
-    "+": sum,
-    "-": lambda args: -args[0] if len(args) == 1 else (args[0] - sum(args[1:])),
+    "+": add,
+    "-": sub,
     "*": mul,
-    "/": div
+    "/": div,
+    "<": less,
+    "<=": less_or_equal,
+    ">": greater,
+    ">=": greater_or_equal,
+    "equal?": equal,
+    "not": negate,
+    "#t": True,
+    "#f": False,
+    "nil": NIL,
+    "cons": cons,
+    "car": car,
+    "cdr": cdr,
+    "list": scheme_list,
+    "length": length,
+    "list-ref": list_ref,
+    "append": append,
+    "map": scheme_map,
+    "filter": scheme_filter,
+    "reduce": reduce,
+    "stream-map": stream_map,
+    "stream-filter": stream_filter,
+    "force": force,
+    "stream-car": car,
+    "stream-cdr": stream_cdr,
+    "range": scheme_range,
+    "make-vector": make_vector,
+    "vector": vector,
+    "vector-ref": vector_ref,
+    "vector-set!": vector_set,
+    "vector-length": vector_length,
+    "vector->list": vector_to_list,
+    "list->vector": list_to_vector,
+    "memoize": memoize,
+    "memo-stats": memo_stats,
 }
 
 
+###########
+# Tracing #
+###########
+# Callbacks registered with add_tracer are called as
+#     callback(event, subject, value)
+# for these events:
+#     "call"        a User_Function is entered: subject is the function and
+#                   value the tuple/list of arguments
+#     "return"      it finishes: value is the result, or the TailCall it
+#                   hands over to when it returns through a tail call
+#     "unwind"      it ends because value, an exception, passes through it
+#     "define"      subject is the name defined and value its new value
+#     "name_error"  subject is a name that is not bound, value the Frame it
+#                   was looked up in
+#     "fold"        optimize replaced the tree subject by the tree value
+# With no tracer registered (and no budget, see Limits below), calls run the
+# untraced User_Function.__call__, so tracing costs nothing unless it is used.
+
+TRACERS = []
+
+def trace(event, subject, value):
+    for tracer in TRACERS:
+        tracer(event, subject, value)
+
+def add_tracer(callback):
+    # registers callback to be told about evaluation events (see above)
+    TRACERS.append(callback)
+    select_call()
+
+def remove_tracer(callback):
+    TRACERS.remove(callback)
+    select_call()
+
+def select_call():
+    # User_Function calls only do the checks that something needs
+    if TRACERS or BUDGET is not None:
+        User_Function.__call__ = User_Function.checked_call
+    else:
+        User_Function.__call__ = User_Function.untraced_call
+
+
+##########
+# Limits #
+##########
+# A Budget limits an evaluation to a number of steps -- calls of Scheme
+# functions, each tail call counting as one -- and/or a number of seconds of
+# wall-clock time, raising SchemeLimitError (SchemeTimeoutError for time)
+# when it runs out.  Every loop or recursion in a Scheme program goes
+# through calls, and builtins walking a list (see iter_list) are charged a
+# step for every CLOCK_INTERVAL elements, so runaway programs are caught
+# unless a single builtin call is stuck.  The clock is only read every
+# CLOCK_INTERVAL steps.  As with tracing, calls only pay for the
+# check while a budget is installed.
+
+CLOCK_INTERVAL = 256
+
+BUDGET = None # the Budget of the evaluation that is running, if any
+
+class Budget:
+    __slots__ = ("steps_left", "deadline", "until_clock")
+
+    def __init__(self, steps = None, seconds = None):
+        self.steps_left = sys.maxsize if steps is None else steps
+        self.deadline = None if seconds is None else time.monotonic() + seconds
+        self.until_clock = CLOCK_INTERVAL
+
+    def charge(self):
+        # called once per step
+        self.steps_left -= 1
+        if self.steps_left < 0:
+            raise SchemeLimitError("step limit exceeded")
+        if self.deadline is not None:
+            self.until_clock -= 1
+            if not self.until_clock:
+                self.until_clock = CLOCK_INTERVAL
+                if time.monotonic() > self.deadline:
+                    raise SchemeTimeoutError("time limit exceeded")
+
+def charged(values):
+    # yields values, charging BUDGET one step for every CLOCK_INTERVAL of
+    # them, so that builtins looping over long lists stay within the limits.
+    # BUDGET is looked up at each charge, since a lazy sequence may keep this
+    # iterator and resume it in a later evaluation with other limits.
+    until_charge = CLOCK_INTERVAL
+    for value in values:
+        until_charge -= 1
+        if not until_charge:
+            until_charge = CLOCK_INTERVAL
+            if BUDGET is not None:
+                BUDGET.charge()
+        yield value
+
+def set_budget(budget):
+    # installs budget (None for no limits) for the evaluations that follow,
+    # returning the one it replaces so it can be restored
+    global BUDGET
+    previous = BUDGET
+    BUDGET = budget
+    select_call()
+    return previous
+
+
+#############
+# Profiling #
+#############
+# A Profiler is a tracer (see Tracing) that counts the calls of each Scheme
+# function and measures its inclusive time (including the functions it
+# calls) and exclusive time (its own).  Functions are keyed by the name of
+# their Scope (see lambda_name).  Every call from one function to another
+# is an edge of the call graph, with TOP as the caller of calls made at top
+# level.  A function returning through a tail call has finished when the
+# tail call starts, so the tail-called function counts as called by its
+# caller's caller.
+#
+#     with Profiler() as profiler:
+#         evaluate_file("test_files/sudoku.scm", frame)
+#     print(profiler.report())
+#     profiler.write_folded("sudoku.folded") # for flamegraph.pl, speedscope, ...
+
+TOP = "<top>"
+
+class Profiler:
+    def __init__(self, clock = time.perf_counter):
+        self.clock = clock
+        self.calls = {} # name -> number of calls
+        self.inclusive = {} # name -> seconds
+        self.exclusive = {} # name -> seconds
+        self.edges = {} # (caller name, callee name) -> number of calls
+        self.paths = {} # (parent path, name) -> path, numbering call stacks
+        self.path_time = {} # path -> exclusive seconds
+        self.stack = [] # [name, path, start, seconds in callees] per call
+        self.active = {} # name -> number of its calls on the stack
+
+    def __enter__(self):
+        add_tracer(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        remove_tracer(self)
+        self.finish()
+
+    def __call__(self, event, subject, value):
+        if event == "call":
+            self.enter(subject.scope.name)
+        elif event == "return" or event == "unwind":
+            self.leave(self.clock())
+
+    def enter(self, name):
+        stack = self.stack
+        if stack:
+            caller, parent = stack[-1][0], stack[-1][1]
+        else:
+            caller, parent = TOP, None
+        path = self.paths.get((parent, name))
+        if path is None:
+            path = self.paths[parent, name] = len(self.paths)
+        self.edges[caller, name] = self.edges.get((caller, name), 0) + 1
+        self.calls[name] = self.calls.get(name, 0) + 1
+        self.active[name] = self.active.get(name, 0) + 1
+        stack.append([name, path, self.clock(), 0.0])
+
+    def leave(self, now):
+        name, path, start, in_callees = self.stack.pop()
+        elapsed = now - start
+        self.exclusive[name] = self.exclusive.get(name, 0.0) + elapsed - in_callees
+        self.path_time[path] = self.path_time.get(path, 0.0) + elapsed - in_callees
+        self.active[name] -= 1
+        if not self.active[name]:
+            # time in recursive calls is already part of the outermost call
+            self.inclusive[name] = self.inclusive.get(name, 0.0) + elapsed
+        if self.stack:
+            self.stack[-1][3] += elapsed
+
+    def finish(self):
+        # ends the calls still running when profiling stops
+        now = self.clock()
+        while self.stack:
+            self.leave(now)
+
+    def report(self, limit = None):
+        # flat profile (most exclusive time first), then the call graph
+        names = sorted(self.calls, key = lambda name: -self.exclusive.get(name, 0.0))
+        lines = [f"{'calls':>9} {'inclusive':>10} {'exclusive':>10}  function"]
+        for name in names[:limit]:
+            lines.append(
+                f"{self.calls[name]:>9} {self.inclusive.get(name, 0.0):>9.4f}s"
+                f" {self.exclusive.get(name, 0.0):>9.4f}s  {name}"
+            )
+        lines.append("")
+        lines.append(f"{'calls':>9}  caller -> callee")
+        edges = sorted(self.edges.items(), key = lambda edge: -edge[1])
+        for (caller, callee), count in edges[:limit]:
+            lines.append(f"{count:>9}  {caller} -> {callee}")
+        return "\n".join(lines)
+
+    def folded(self):
+        """
+        the profile as "outer;...;inner microseconds" lines of exclusive
+        time per call stack: the folded format read by flamegraph.pl and
+        most flame graph viewers
+        """
+        stacks = {}
+        # a path is always numbered after its parent
+        for (parent, name), path in self.paths.items():
+            stacks[path] = name if parent is None else stacks[parent] + ";" + name
+        lines = []
+        for path, seconds in self.path_time.items():
+            microseconds = round(seconds * 1e6)
+            if microseconds > 0:
+                lines.append(f"{stacks[path]} {microseconds}")
+        return lines
+
+    def write_folded(self, file_name):
+        with open(file_name, "w") as output:
+            for line in self.folded():
+                output.write(line + "\n")
+
+
 ##############
 # Evaluation #
 ##############
+class Unbound:
+    # marks a slot whose define has not run yet
+    def __repr__(self):
+        return "UNBOUND"
+
+UNBOUND = Unbound()
+
 class Frame:
-    # Creates a Frame to hold bindings for a function to access
-    def __init__(self, parent = "global", bindings = None):
+    # Creates a Frame to hold bindings for a function to access.
+    # Frames made by calling a User_Function keep their variables in a list
+    # of slots addressed at compile time (layout maps names to slot indices);
+    # every other binding (the global frame, builtins) lives in a dict.
+    __slots__ = ("parent", "bindings", "slots", "layout", "__weakref__")
+
+    def __init__(self, parent = "global", bindings = None, slots = None, layout = None):
         if parent == "global":
             self.parent = BUILT_IN_FRAME
         else:
             self.parent = parent
-        if bindings is None:
+        if bindings is None and slots is None:
             self.bindings = {}
         else:
             self.bindings = bindings
-        
+            if bindings and parent is not None and not (
+                FOLDABLE_BUILTINS.isdisjoint(bindings) and bindings.keys().isdisjoint(CONSTANT_NAMES)
+            ):
+                rebind_foldable() # as by __setitem__
+        self.slots = slots
+        self.layout = layout
+
+    def get_frame(self, arg):
+        # returns the nearest frame in the chain that binds arg
+        frame = self
+        while frame is not None:
+            if frame.layout is not None and arg in frame.layout:
+                if frame.slots[frame.layout[arg]] is not UNBOUND:
+                    return frame
+            if frame.bindings and arg in frame.bindings:
+                return frame
+            frame = frame.parent
+        if TRACERS:
+            trace("name_error", arg, self)
+        raise SchemeNameError("variable not bound:", arg)
+
     def __getitem__ (self, arg):
-        if arg in self.bindings:
-            return self.bindings[arg]
-        elif self.parent is None:
-            print("variable not bound:", arg)
-            raise SchemeNameError("variable not bound:", arg)
-        #recursive case
-        return self.parent[arg]
+        frame = self.get_frame(arg)
+        if frame.layout is not None and arg in frame.layout:
+            return frame.slots[frame.layout[arg]]
+        return frame.bindings[arg]
     
     def __contains__ (self, arg):
         try:
-            self[arg]
+            self.get_frame(arg)
             return True
-        except:
+        except SchemeNameError:
             return False
-        
-    def get_frame(self, arg):
-        if arg in self.bindings:
-            return self
-        elif self.parent is None:
-            print("variable not bound:", arg)
-            raise SchemeNameError("variable not bound:", arg)
-        #recursive case
-        return self.parent.get_frame(arg)
     
     def __setitem__ (self, var, value):
-        print("setitem is run")
-        print(self)
-        self.bindings[var] = value
+        if self.layout is not None and var in self.layout:
+            self.slots[self.layout[var]] = value
+            return
+        if var in FOLDABLE_BUILTINS or var in CONSTANT_NAMES:
+            # folded code must check again whether var is the builtin
+            rebind_foldable()
+        if var in BINDING_VERSIONS:
+            # call sites that cached var's old value must look it up again
+            BINDING_VERSIONS[var] += 1
+        if self.bindings is None:
+            self.bindings = {var: value}
+        else:
+            self.bindings[var] = value
+
+    def assign(self, var, value):
+        """
+        rebinds var (as set! does) in the nearest frame that binds it; a name
+        only bound by the builtins gets a binding in the outermost frame
+        instead, so the builtins stay the same for every other frame.  A
+        binding that lives above a fork (see fork) is not changed either: the
+        fork gets a binding of its own, so siblings never see the change.
+        Raises SchemeNameError if var is not bound.
+
+        >>> frame = Frame()
+        >>> frame["x"] = 1
+        >>> request = frame.fork()
+        >>> request.assign("x", 2)
+        >>> request["x"], frame["x"]
+        (2, 1)
+        """
+        target = self.get_frame(var)
+        frame = self
+        while frame is not target:
+            if type(frame) is Forked_Frame:
+                frame[var] = value
+                return
+            if frame.parent is BUILT_IN_FRAME or frame.parent is None:
+                break # target is BUILT_IN_FRAME, and frame the outermost
+            frame = frame.parent
+        frame[var] = value
+
+    def delete(self, var):
+        """
+        removes var's binding from this frame (not from its parents), as del
+        does, and returns the value it had; raises SchemeNameError if this
+        frame does not bind var
+        """
+        if self.layout is not None and var in self.layout:
+            slot = self.layout[var]
+            value = self.slots[slot]
+            if value is not UNBOUND:
+                self.slots[slot] = UNBOUND
+                return value
+        if self.bindings and var in self.bindings:
+            if var in BINDING_VERSIONS:
+                BINDING_VERSIONS[var] += 1
+            if var in FOLDABLE_BUILTINS or var in CONSTANT_NAMES:
+                rebind_foldable()
+            return self.bindings.pop(var)
+        raise SchemeNameError("variable not bound:", var)
 
-BUILT_IN_FRAME = Frame(None, scheme_builtins)
+    def fork(self):
+        """
+        returns a copy-on-write view of this frame in O(1): lookups fall
+        through to this frame's bindings, which are shared by reference,
+        while defines and set!s in the fork go to the fork's own, initially
+        empty, bindings.  Forks only stay isolated from each other if this
+        frame is no longer defined into once it has been forked (including
+        by set! inside functions defined in it, whose frames lie above the
+        fork).
+
+        >>> library = Frame()
+        >>> library["x"] = 1
+        >>> request = library.fork()
+        >>> request["x"] = 2
+        >>> request["x"], library["x"]
+        (2, 1)
+        """
+        return Forked_Frame(self, {})
+
+class Forked_Frame(Frame):
+    # a Frame made by Frame.fork, which set! does not write through
+    __slots__ = ()
+
+BUILT_IN_FRAME = Frame(None, {symbol(name): value for name, value in scheme_builtins.items()})
 
 class User_Function:
-    def __init__(self, parameters, exp, frame):
+    # body is the compiled lambda body (see compile_expression), so calling
+    # the function never re-analyzes the syntax tree.  scope gives the slot
+    # layout of the frame each call creates: parameters first, then the
+    # names defined inside the body.  vm_code() gives the body compiled for
+    # the VM instead, which evaluate_async runs it on so that it can yield.
+    def __init__(self, parameters, body, frame, scope, vm_code):
         self.parameters = parameters
-        self.exp = exp
+        self.body = body
+        self.scope = scope
+        self.vm_code = vm_code
         if frame == None:
             self.frame = BUILT_IN_FRAME
         else:
             self.frame = frame
-    def __call__(self, *args):
-        num_parameters = len(self.parameters)
-        num_args = len(args)
-        print(f'{args=}')
-        print(f'{num_parameters=}')
-        print(f'{num_args=}')
-        if num_args != num_parameters:
-            raise SchemeEvaluationError("Incorrect Num of Arguments")
-        bindings = {}
-        for i, arg in enumerate(args):
-            bindings[self.parameters[i]] = arg
-        new_frame = Frame(self.frame, bindings)
-        return evaluate(self.exp, new_frame)
-        
-def chars_in_string(chars, string):
-    """
-    given a list of chars and a string
-    return a list of bool values True: if char in string
-    """
-    result = []
-    for char in chars:
-        result.append(char in string)
-    return result
+    def untraced_call(self, *args):
+        # runs the body, then keeps running the bodies of tail calls it
+        # returns, so tail-recursive loops use constant stack space
+        function = self
+        while True:
+            if len(args) != len(function.parameters):
+                raise SchemeEvaluationError("Incorrect Num of Arguments")
+            slots = [*args, *function.scope.unbound_locals]
+            new_frame = Frame(function.frame, None, slots, function.scope.layout)
+            result = function.body(new_frame)
+            if type(result) is not TailCall:
+                return result
+            function, args = result.function, result.args
+
+    def checked_call(self, *args):
+        # untraced_call, charging each call to BUDGET and reporting "call",
+        # "return" and "unwind" events to TRACERS
+        function = self
+        while True:
+            if BUDGET is not None:
+                BUDGET.charge()
+            if TRACERS:
+                trace("call", function, args)
+            try:
+                if len(args) != len(function.parameters):
+                    raise SchemeEvaluationError("Incorrect Num of Arguments")
+                slots = [*args, *function.scope.unbound_locals]
+                new_frame = Frame(function.frame, None, slots, function.scope.layout)
+                result = function.body(new_frame)
+            except BaseException as error:
+                if TRACERS:
+                    trace("unwind", function, error)
+                raise
+            if TRACERS:
+                trace("return", function, result)
+            if type(result) is not TailCall:
+                return result
+            function, args = result.function, result.args
+
+    __call__ = untraced_call
 
+class TailCall:
+    # a call in tail position, returned to the enclosing User_Function call
+    __slots__ = ("function", "args")
+
+    def __init__(self, function, args):
+        self.function = function
+        self.args = args
+        
 def valid_var_name(var_name):
     """
     given a variable name check that it is not a num/float
     and does not cotain "(" or ")"
     """
-    forbidden = ("(", ")")
-    if isinstance(var_name, (int, float)):
-        return False
-    elif any(chars_in_string(forbidden, var_name)):
-        return False
-    return True
+    return isinstance(var_name, str) and "(" not in var_name and ")" not in var_name
 
-def result_and_frame(tree, frame = None):
+def result_and_frame(tree, frame = None, engine = None, steps = None, seconds = None):
     """
     returns a tuple with two elements: 
     the result of the evaluation
@@ -272,90 +1415,1988 @@ def result_and_frame(tree, frame = None):
     """
     if frame is None: 
         new_frame = Frame()
-        return(evaluate(tree, new_frame), new_frame) # Lab says if no frame is given must be brand new frame
-    return (evaluate(tree, frame), frame)
-
-def op_call(rest, frame):
-    # evaluates each sub_expression for a unknown operator
-    evaluated_arguments = []
-    for sub_exp in rest:
-        evaluated_arguments.append(evaluate(sub_exp, frame))
-    return evaluated_arguments
-
-def define(exp, frame):
-    # handles define keyword to define a variable and it's value
-    if len(exp) == 1:
-        raise SchemeSyntaxError("var to define not given")
-    elif not valid_var_name(exp[1]):
-        raise SchemeSyntaxError("var name not valid")
-    else:
-        frame[exp[1]] = evaluate(exp[2], frame)
-        return frame[exp[1]]
+        return(evaluate(tree, new_frame, engine, steps, seconds), new_frame) # Lab says if no frame is given must be brand new frame
+    return (evaluate(tree, frame, engine, steps, seconds), frame)
 
-def evaluate(tree, frame = None):
+async def result_and_frame_async(tree, frame = None, yield_every = 1000, steps = None, seconds = None):
     """
-    Evaluate the given syntax tree according to the rules of the Scheme
-    language.
+    like result_and_frame, evaluating the tree with evaluate_async
+    """
+    if frame is None:
+        frame = Frame()
+    return (await evaluate_async(tree, frame, yield_every, steps, seconds), frame)
 
-    Arguments:
-        tree (type varies): a fully parsed expression, as the output from the
-                            parse function
+SOURCE_ENCODING = "utf-8" # of Scheme files, whether read directly or cached
+
+def evaluate_file(file_name, frame = None, engine = None, use_cache = False):
     """
-    if frame is None: 
+    Evaluates every expression in the given Scheme file, in order, in frame
+    (a brand new frame if none is given) and returns the value of the last
+    one.  Each expression is evaluated as soon as it has been read, so only
+    one expression of the file is held in memory at a time.
+
+    With use_cache, the parsed file is loaded from (or saved to) its
+    __scmcache__ entry instead (see cached_forms); the whole file is then
+    parsed before anything is evaluated.
+    """
+    if frame is None:
         frame = Frame()
-    # Base cases
-    if isinstance(tree, (int,float)):
-        return tree
-    elif isinstance(tree, str):
-        return frame[tree] #look at built-in
-    # else:   
-    #     return frame[tree] # check if expression is in frame or parent frames
-    # Tree is a list/ recursion
-    elif isinstance(tree, list): 
-        func = tree[0]
-        rest = tree[1:] 
-        if func == "define":   #defining a var or function
-            return define(tree, frame)
-        elif func == "lambda":
-            param = rest[0]
-            to_express = rest[1]
-            return User_Function(param, to_express, frame)
-        elif func in frame: #func is defined somewhere in the frame or parent frames
-            function_return = op_call(rest, frame)
-            return frame[func](function_return)
-        try:
-            print('got here2')
-            inline_func = evaluate(tree[0],frame)
-            args = op_call(rest, frame)
-            print(f'{inline_func=}')
-            print(args)
-            inline = inline_func(*args)
-            print(f'{inline=}')
-            print('got here3')
-            return inline
-        except:
-            print("Function not Found:",func)
-            raise SchemeEvaluationError ("Function not Found")
-    raise SchemeEvaluationError ("Function not Found")
-        
-########
-# REPL #
-########
+    result = None
+    if use_cache:
+        for tree in cached_forms(file_name):
+            result = evaluate(tree, frame, engine)
+        return result
+    def rescan():
+        # only tokens of syntax errors need their positions
+        with open(file_name, encoding = SOURCE_ENCODING) as source:
+            yield from iter_tokens(source)
+    reader = Reader(rescan)
+    with open(file_name, encoding = SOURCE_ENCODING) as source:
+        for tree in reader.feed(iter_file_tokens(source)):
+            result = evaluate(tree, frame, engine)
+    reader.close()
+    return result
 
-import os
-import re
-import sys
-import traceback
-from cmd import Cmd
+###############
+# Call caches #
+###############
+# A call whose function is a name looked up by name (not by lexical address,
+# see Compilation) goes through a Call_Cache of its own, which remembers the
+# function the last lookup found and the frame it started from.  Lookups are
+# only cached when every frame searched keeps its bindings in a dict, as
+# those are only ever rebound through Frame.__setitem__, which bumps the
+# name's entry in BINDING_VERSIONS; a cached function is used for as long as
+# the lookup starts from the same frame and the version of its name is the
+# one it was found under, so define and set! invalidate it.
 
-try:
-    import readline
-except:
-    readline = None
+# binding version of each name some call site has cached
+BINDING_VERSIONS = {}
 
+# every live call site, for call_cache_stats
+CALL_CACHES = weakref.WeakSet()
 
-def supports_color():
-    """
+CACHE_CALLS = True # whether call sites are compiled with a Call_Cache
+
+class Call_Cache:
+    # the function lookup of one call site.  Compiled code can outlive the
+    # frames it runs in (see Parse_Cache), so the frame and function found
+    # are only held weakly: while the frame is alive and the name's version
+    # is unchanged, the binding that holds the function keeps it alive.
+    __slots__ = ("name", "frame", "value", "version", "hits", "misses", "__weakref__")
+
+    def __init__(self, name):
+        self.name = name
+        self.frame = self.value = no_reference
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        CALL_CACHES.add(self)
+
+    def lookup(self, frame):
+        # looks name up from frame after a miss, caching what it finds
+        self.misses += 1
+        name = self.name
+        scope_frame = frame
+        while scope_frame is not None:
+            if scope_frame.layout is not None:
+                # slots are assigned directly, so they cannot be cached
+                return frame[name]
+            if scope_frame.bindings and name in scope_frame.bindings:
+                value = scope_frame.bindings[name]
+                self.version = BINDING_VERSIONS.setdefault(name, 0)
+                self.frame = weakref.ref(frame)
+                try:
+                    self.value = weakref.ref(value)
+                except TypeError:
+                    # not weakly referable (a C function, say), and such
+                    # values do not keep frames alive anyway
+                    self.value = lambda: value
+                return value
+            scope_frame = scope_frame.parent
+        return frame[name] # raises SchemeNameError
+
+def no_reference():
+    # stands in for a dead weak reference before a Call_Cache's first lookup
+    return None
+
+def call_cache_stats():
+    """
+    returns a dict with the number of live call-site caches and their total
+    hits, misses and hit rate
+    """
+    sites = list(CALL_CACHES)
+    hits = sum(site.hits for site in sites)
+    misses = sum(site.misses for site in sites)
+    return {
+        "sites": len(sites),
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+    }
+
+###############
+# Compilation #
+###############
+# compile_expression analyzes a parsed tree once and returns a closure that
+# takes a frame and returns the value of the expression in that frame.  Errors
+# that the tree-walking evaluator only noticed while running (bad defines,
+# malformed lambdas, ...) are compiled into closures that raise when run, so
+# they still surface at evaluation time rather than at definition time.
+#
+# Variables are resolved while compiling: a name bound by an enclosing lambda
+# becomes a (depth, slot) address that is loaded by index from the frame
+# `depth` levels up; any other name is looked up by name in the frames that
+# existed before compilation (the global frame and the builtins).
+
+class Scope:
+    # compile-time description of the frame created by a User_Function call;
+    # name is what the function is reported as (see lambda_name)
+    def __init__(self, parameters, local_names, parent, name = None):
+        self.parent = parent
+        self.name = name
+        self.layout = {}
+        for i, name in enumerate(parameters):
+            self.layout[name] = i
+        num_locals = 0
+        for name in local_names:
+            if name not in self.layout:
+                self.layout[name] = len(parameters) + num_locals
+                num_locals += 1
+        self.unbound_locals = (UNBOUND,) * num_locals
+
+    def resolve(self, name):
+        """
+        returns (depth, slot) for a name bound by this scope or an enclosing
+        one, or (depth, None) where depth is the number of frames between the
+        current one and the frame where dynamic lookup should start
+        """
+        depth = 0
+        scope = self
+        while scope is not None:
+            if name in scope.layout:
+                return depth, scope.layout[name]
+            depth += 1
+            scope = scope.parent
+        return depth, None
+
+def defined_names(tree):
+    """
+    given a lambda body, return the names it defines in its own frame
+    (nested lambdas get frames of their own, so they are not searched)
+    """
+    names = []
+    def collect(exp):
+        if type(exp) is Guarded:
+            # the defines of the tree it stands for are those of the original
+            collect(exp.original)
+            return
+        if not isinstance(exp, list) or not exp:
+            return
+        if exp[0] == "lambda":
+            return
+        form = SPECIAL_FORMS.get(exp[0]) if isinstance(exp[0], str) else None
+        if form is not None and form.expand is not None:
+            # the defines are those of the tree it stands for (for let, only
+            # the values are evaluated in this frame)
+            try:
+                collect(form.expand(exp))
+            except SchemeSyntaxError:
+                pass
+            return
+        if exp[0] == "define" and len(exp) == 3:
+            target = exp[1]
+            if isinstance(target, list):
+                if target and valid_var_name(target[0]):
+                    names.append(target[0])
+                return
+            if valid_var_name(target):
+                names.append(target)
+        for sub_exp in exp:
+            collect(sub_exp)
+    collect(tree)
+    return names
+
+def define_parts(tree):
+    """
+    given a define form, returns the name it defines and the expression for
+    its value (the equivalent lambda for the (define (name params...) body)
+    shorthand); raises SchemeSyntaxError if the form is malformed
+    """
+    if len(tree) != 3:
+        raise SchemeSyntaxError("define takes a name and a value")
+    target = tree[1]
+    value = tree[2]
+    if isinstance(target, list):
+        if not target:
+            raise SchemeSyntaxError("function name not given")
+        target, value = target[0], ["lambda", target[1:], tree[2]]
+    if not valid_var_name(target):
+        raise SchemeSyntaxError("var name not valid")
+    return target, value
+
+def lambda_parts(tree):
+    """
+    given a lambda form, returns its parameters and body; raises
+    SchemeSyntaxError if the form is malformed
+    """
+    if len(tree) != 3 or not isinstance(tree[1], list):
+        raise SchemeSyntaxError("malformed lambda")
+    if not all(valid_var_name(param) for param in tree[1]):
+        raise SchemeSyntaxError("parameter name not valid")
+    return tree[1], tree[2]
+
+def let_call(tree):
+    """
+    given a let form, returns the equivalent call of a lambda:
+    (let ((var exp)...) body) is ((lambda (var...) body) exp...); raises
+    SchemeSyntaxError if the form is malformed
+
+    >>> let_call(['let', [['x', 1], ['y', 2]], ['+', 'x', 'y']])
+    [['lambda', ['x', 'y'], ['+', 'x', 'y']], 1, 2]
+    """
+    if len(tree) != 3 or not isinstance(tree[1], list):
+        raise SchemeSyntaxError("malformed let")
+    names = []
+    values = []
+    for binding in tree[1]:
+        if not isinstance(binding, list) or len(binding) != 2:
+            raise SchemeSyntaxError("malformed let binding:", binding)
+        names.append(binding[0])
+        values.append(binding[1])
+    return [["lambda", names, tree[2]], *values]
+
+def is_lambda(tree):
+    return isinstance(tree, list) and bool(tree) and tree[0] == "lambda"
+
+def lambda_name(tree, scope, name):
+    """
+    the name functions made by a lambda form are reported under: name, the
+    name it is defined as (if any), or else its source position when it was
+    read with positions (see iter_tokens) or its parameter list, followed by
+    the name of the enclosing function
+
+    >>> lambda_name(['lambda', ['x'], 'x'], Scope([], [], None, 'f'), None)
+    'lambda (x) in f'
+    """
+    if name is not None:
+        return name
+    keyword = tree[0]
+    if isinstance(keyword, Token):
+        name = f"lambda@{keyword.line}:{keyword.column}"
+    else:
+        name = "lambda (" + " ".join(map(str, tree[1])) + ")"
+    if scope is not None and scope.name is not None:
+        name += " in " + scope.name
+    return name
+
+def compile_error(error):
+    # closure that raises (a fresh copy of) the given SchemeError when run
+    def raise_error(frame):
+        raise type(error)(*error.args)
+    return raise_error
+
+def compile_constant(value):
+    def constant(frame):
+        return value
+    return constant
+
+def compile_lookup(name, scope):
+    depth, slot = (0, None) if scope is None else scope.resolve(name)
+    if slot is None:
+        if depth == 0:
+            def lookup(frame):
+                return frame[name]
+            return lookup
+        def global_lookup(frame):
+            for _ in range(depth):
+                frame = frame.parent
+            return frame[name]
+        return global_lookup
+    # a slot still holding UNBOUND belongs to a define that has not run yet,
+    # so the name is looked up further out, as if the slot did not exist
+    if depth == 0:
+        def local_lookup(frame):
+            value = frame.slots[slot]
+            if value is UNBOUND:
+                return frame.parent[name]
+            return value
+        return local_lookup
+    if depth == 1:
+        def parent_lookup(frame):
+            frame = frame.parent
+            value = frame.slots[slot]
+            if value is UNBOUND:
+                return frame.parent[name]
+            return value
+        return parent_lookup
+    def addressed_lookup(frame):
+        for _ in range(depth):
+            frame = frame.parent
+        value = frame.slots[slot]
+        if value is UNBOUND:
+            return frame.parent[name]
+        return value
+    return addressed_lookup
+
+def compile_callee(name, scope):
+    # compile_lookup for the function of a call, through a Call_Cache when
+    # the name is looked up by name
+    depth, slot = (0, None) if scope is None else scope.resolve(name)
+    if slot is not None or not CACHE_CALLS:
+        return compile_lookup(name, scope)
+    site = Call_Cache(name)
+    versions = BINDING_VERSIONS
+    if depth == 0:
+        def cached_lookup(frame):
+            if site.frame() is frame and site.version == versions[name]:
+                site.hits += 1
+                return site.value()
+            return site.lookup(frame)
+        return cached_lookup
+    if depth == 1:
+        def cached_parent_lookup(frame):
+            frame = frame.parent
+            if site.frame() is frame and site.version == versions[name]:
+                site.hits += 1
+                return site.value()
+            return site.lookup(frame)
+        return cached_parent_lookup
+    def cached_global_lookup(frame):
+        for _ in range(depth):
+            frame = frame.parent
+        if site.frame() is frame and site.version == versions[name]:
+            site.hits += 1
+            return site.value()
+        return site.lookup(frame)
+    return cached_global_lookup
+
+def compile_define(tree, scope, tail = False):
+    # (define name exp) or the shorthand (define (name params...) body)
+    try:
+        target, value_exp = define_parts(tree)
+    except SchemeSyntaxError as error:
+        return compile_error(error)
+    if is_lambda(value_exp):
+        value = compile_lambda(value_exp, scope, name = target)
+    else:
+        value = compile_expression(value_exp, scope)
+    if scope is not None and target in scope.layout:
+        slot = scope.layout[target]
+        def define_local(frame):
+            result = value(frame)
+            frame.slots[slot] = result
+            if TRACERS:
+                trace("define", target, result)
+            return result
+        return define_local
+    def define(frame):
+        result = value(frame)
+        frame[target] = result
+        if TRACERS:
+            trace("define", target, result)
+        return result
+    return define
+
+def set_parts(tree):
+    """
+    given a set! form, returns the name it rebinds and the expression for its
+    new value; raises SchemeSyntaxError if the form is malformed
+    """
+    if len(tree) != 3:
+        raise SchemeSyntaxError("set! takes a name and a value")
+    if not valid_var_name(tree[1]):
+        raise SchemeSyntaxError("var name not valid")
+    return tree[1], tree[2]
+
+def compile_set(tree, scope, tail = False):
+    # (set! name exp) rebinds name where it is bound (see Frame.assign)
+    try:
+        target, value_exp = set_parts(tree)
+    except SchemeSyntaxError as error:
+        return compile_error(error)
+    value = compile_expression(value_exp, scope)
+    depth, slot = (0, None) if scope is None else scope.resolve(target)
+    if slot is None:
+        def set_name(frame):
+            result = value(frame)
+            scope_frame = frame
+            for _ in range(depth):
+                scope_frame = scope_frame.parent
+            scope_frame.assign(target, result)
+            return result
+        return set_name
+    def set_slot(frame):
+        result = value(frame)
+        for _ in range(depth):
+            frame = frame.parent
+        if frame.slots[slot] is UNBOUND:
+            # as in compile_lookup, the name is bound further out for now
+            frame.parent.assign(target, result)
+        else:
+            frame.slots[slot] = result
+        return result
+    return set_slot
+
+def compile_lambda(tree, scope, tail = False, name = None):
+    # (lambda (params...) body), where name is the name it is defined as
+    try:
+        parameters, body_exp = lambda_parts(tree)
+    except SchemeSyntaxError as error:
+        return compile_error(error)
+    name = lambda_name(tree, scope, name)
+    body_scope = Scope(parameters, defined_names(body_exp), scope, name)
+    body = compile_expression(body_exp, body_scope, tail=True)
+    code = None
+    def vm_code():
+        # the body compiled for the VM, the first time evaluate_async needs
+        # it.  Both engines lay out frames by the same Scope, so the VM can
+        # run it in the frames of this function's calls.
+        nonlocal code
+        if code is None:
+            builder = Code_Builder()
+            emit_expression(builder, body_exp, body_scope, True)
+            code = builder.build(parameters, body_scope)
+        return code
+    def make_function(frame):
+        return User_Function(parameters, body, frame, body_scope, vm_code)
+    return make_function
+
+def arguments_error(callee, error):
+    # a builtin called with the wrong number or types of arguments raises a
+    # Python TypeError, reported as a SchemeEvaluationError instead
+    return SchemeEvaluationError(f"bad arguments to {callee}: {error}")
+
+def compile_call(tree, scope, tail):
+    # (func args...) where func is a name or any expression evaluating to a
+    # function.  Calls with up to three arguments get closures of their own
+    # that pass the arguments straight through, without building a list.
+    if isinstance(tree[0], str):
+        func = compile_callee(tree[0], scope)
+    else:
+        func = compile_expression(tree[0], scope)
+    args = [compile_expression(sub_exp, scope) for sub_exp in tree[1:]]
+    if tail:
+        return compile_tail_call(tree, func, args)
+    def not_a_function():
+        raise SchemeEvaluationError("not a function:", tree[0])
+    def bad_arguments(error):
+        raise arguments_error(tree[0], error) from error
+    if len(args) == 0:
+        def call0(frame):
+            function = func(frame)
+            if not callable(function):
+                not_a_function()
+            try:
+                return function()
+            except TypeError as error:
+                bad_arguments(error)
+        return call0
+    if len(args) == 1:
+        arg0, = args
+        def call1(frame):
+            function = func(frame)
+            if not callable(function):
+                not_a_function()
+            try:
+                return function(arg0(frame))
+            except TypeError as error:
+                bad_arguments(error)
+        return call1
+    if len(args) == 2:
+        arg0, arg1 = args
+        def call2(frame):
+            function = func(frame)
+            if not callable(function):
+                not_a_function()
+            try:
+                return function(arg0(frame), arg1(frame))
+            except TypeError as error:
+                bad_arguments(error)
+        return call2
+    if len(args) == 3:
+        arg0, arg1, arg2 = args
+        def call3(frame):
+            function = func(frame)
+            if not callable(function):
+                not_a_function()
+            try:
+                return function(arg0(frame), arg1(frame), arg2(frame))
+            except TypeError as error:
+                bad_arguments(error)
+        return call3
+    def call(frame):
+        function = func(frame)
+        if not callable(function):
+            not_a_function()
+        try:
+            return function(*[arg(frame) for arg in args])
+        except TypeError as error:
+            bad_arguments(error)
+    return call
+
+def compile_tail_call(tree, func, args):
+    # calls in tail position hand User_Functions back to the caller's loop in
+    # User_Function.__call__ instead of growing the stack
+    def not_a_function():
+        raise SchemeEvaluationError("not a function:", tree[0])
+    def bad_arguments(error):
+        raise arguments_error(tree[0], error) from error
+    if len(args) == 1:
+        arg0, = args
+        def tail_call1(frame):
+            function = func(frame)
+            if not callable(function):
+                not_a_function()
+            value0 = arg0(frame)
+            if type(function) is User_Function:
+                return TailCall(function, (value0,))
+            try:
+                return function(value0)
+            except TypeError as error:
+                bad_arguments(error)
+        return tail_call1
+    if len(args) == 2:
+        arg0, arg1 = args
+        def tail_call2(frame):
+            function = func(frame)
+            if not callable(function):
+                not_a_function()
+            value0 = arg0(frame)
+            value1 = arg1(frame)
+            if type(function) is User_Function:
+                return TailCall(function, (value0, value1))
+            try:
+                return function(value0, value1)
+            except TypeError as error:
+                bad_arguments(error)
+        return tail_call2
+    def tail_call(frame):
+        function = func(frame)
+        if not callable(function):
+            not_a_function()
+        evaluated = [arg(frame) for arg in args]
+        if type(function) is User_Function:
+            return TailCall(function, evaluated)
+        try:
+            return function(*evaluated)
+        except TypeError as error:
+            bad_arguments(error)
+    return tail_call
+
+def compile_del(tree, scope, tail = False):
+    # (del name) removes name's binding from the current frame (see
+    # Frame.delete) and returns its value
+    if len(tree) != 2 or not valid_var_name(tree[1]):
+        return compile_error(SchemeSyntaxError("del takes a name"))
+    target = tree[1]
+    def delete(frame):
+        return frame.delete(target)
+    return delete
+
+def compile_delay(tree, scope, tail = False):
+    # (delay exp) makes a Promise to evaluate exp in the current frame
+    if len(tree) != 2:
+        return compile_error(SchemeSyntaxError("delay takes an expression"))
+    make_thunk = compile_lambda(["lambda", [], tree[1]], scope)
+    def delay(frame):
+        return Promise(make_thunk(frame))
+    return delay
+
+def compile_cons_stream(tree, scope, tail = False):
+    # (cons-stream first rest) is (cons first (delay rest))
+    if len(tree) != 3:
+        return compile_error(SchemeSyntaxError("cons-stream takes a first element and the rest"))
+    first = compile_expression(tree[1], scope)
+    rest = compile_delay(["delay", tree[2]], scope)
+    def cons_stream(frame):
+        return Pair(first(frame), rest(frame))
+    return cons_stream
+
+def compile_if(tree, scope, tail):
+    # (if cond true_exp false_exp), where only #f counts as false
+    if len(tree) != 4:
+        return compile_error(SchemeSyntaxError("if takes a condition and two branches"))
+    condition = compile_expression(tree[1], scope)
+    true_exp = compile_expression(tree[2], scope, tail)
+    false_exp = compile_expression(tree[3], scope, tail)
+    def conditional(frame):
+        if condition(frame) is False:
+            return false_exp(frame)
+        return true_exp(frame)
+    return conditional
+
+def compile_begin(tree, scope, tail):
+    # (begin exps...) evaluates each expression and returns the last
+    if len(tree) == 1:
+        return compile_error(SchemeSyntaxError("begin needs an expression"))
+    body = [compile_expression(sub_exp, scope) for sub_exp in tree[1:-1]]
+    last = compile_expression(tree[-1], scope, tail)
+    def sequence(frame):
+        for exp in body:
+            exp(frame)
+        return last(frame)
+    return sequence
+
+def compile_expression(tree, scope = None, tail = False):
+    """
+    Compiles a fully parsed expression into a Python closure.  Calling the
+    closure with a Frame evaluates the expression in that frame.  scope is
+    the Scope of the enclosing lambda body, or None at top level; tail is
+    True when the expression is in tail position of a lambda body, where a
+    call to a User_Function returns a TailCall instead of making the call.
+
+    >>> compile_expression(['+', 2, ['*', 3, 4]])(Frame())
+    14
+    """
+    if isinstance(tree, (int, float)):
+        return compile_constant(tree)
+    elif isinstance(tree, str):
+        return compile_lookup(tree, scope)
+    elif type(tree) is Guarded:
+        return compile_guarded(tree, scope, tail)
+    elif isinstance(tree, list) and tree:
+        if isinstance(tree[0], str):
+            form = SPECIAL_FORMS.get(tree[0])
+            if form is not None:
+                return form.compile(tree, scope, tail)
+        return compile_call(tree, scope, tail)
+    return compile_error(SchemeEvaluationError("Function not Found"))
+
+def evaluate(tree, frame = None, engine = None, steps = None, seconds = None):
+    """
+    Evaluate the given syntax tree according to the rules of the Scheme
+    language.
+
+    Arguments:
+        tree (type varies): a fully parsed expression, as the output from the
+                            parse function
+        engine (str): "closures" or "vm" (see ENGINES), DEFAULT_ENGINE if
+                      not given
+        steps (int), seconds (float): if given, the evaluation raises
+                      SchemeLimitError after that many function calls, or
+                      SchemeTimeoutError after that much time (see Budget)
+    """
+    if frame is None: 
+        frame = Frame()
+    compile_tree, run = get_engine(engine)
+    compiled = compile_tree(optimize(tree) if OPTIMIZE else tree)
+    if steps is None and seconds is None:
+        return run(compiled, frame)
+    previous = set_budget(Budget(steps, seconds))
+    try:
+        return run(compiled, frame)
+    finally:
+        set_budget(previous)
+
+async def evaluate_async(tree, frame = None, yield_every = 1000, steps = None, seconds = None):
+    """
+    Coroutine version of evaluate, for use in an asyncio event loop.  The
+    tree is run on the VM (see Bytecode), which hands control back to the
+    loop every yield_every calls of Scheme functions, so other tasks keep
+    running during a long evaluation.  Functions made by the closure engine
+    (see ENGINES) are run on the VM too, and map, filter and reduce run
+    their callbacks there (see ASYNC_STEPS); other builtins that call back
+    into Scheme, such as memoized functions, run without yielding.  Builtins
+    that are coroutine functions (async def) are awaited when Scheme code
+    calls them directly.  steps and seconds limit the evaluation as for
+    evaluate.
+
+    Cancelling the task raises CancelledError inside the Scheme program, at
+    the call or await it has reached, and it propagates out from there;
+    likewise an awaited builtin's exception is raised where it was called.
+    """
+    if frame is None:
+        frame = Frame()
+    code = compile_bytecode(optimize(tree) if OPTIMIZE else tree)
+    budget = None if steps is None and seconds is None else Budget(steps, seconds)
+    program = vm_steps(code, frame, None, yield_every)
+    value = error = None
+    while True:
+        # other tasks may evaluate with budgets of their own in between
+        previous = set_budget(budget)
+        try:
+            if error is None:
+                awaitable = program.send(value)
+            else:
+                awaitable = program.throw(error)
+        except StopIteration as done:
+            return done.value
+        finally:
+            set_budget(previous)
+        value = error = None
+        try:
+            if awaitable is None:
+                await asyncio.sleep(0)
+            else:
+                value = await awaitable
+        except BaseException as raised: # including CancelledError
+            error = raised
+        
+################
+# Optimization #
+################
+# optimize runs between parse and compilation.  It folds calls of pure
+# builtins whose arguments are all constants, such as (* 3 (+ 2 4)), into
+# their value, and replaces an if whose condition is constant by the branch
+# it takes.  Names that are not bound by an enclosing lambda are taken to
+# be the builtins, but the frame the code runs in (or a program, later) may
+# bind one, so every folded region becomes a Guarded node holding both the
+# result and the original tree.  The compiled node has a Fold_Guard, which
+# checks whether any name it depends on is bound in the frames between the
+# one it runs in and the builtins: if not, the result is used, otherwise
+# the original is evaluated.  The answer is cached for the last frame
+# checked until a foldable name is next bound or deleted anywhere
+# (FOLD_REBINDINGS), so rebinding + in one frame leaves folded code fast
+# in every other.  Until the first such binding, no guard looks at frames
+# at all, so in a process that never rebinds a builtin a folded region
+# costs one global lookup.  Each change is reported to TRACERS as a "fold"
+# event.
+
+FOLDABLE_BUILTINS = {"+", "-", "*", "/", "<", "<=", ">", ">=", "equal?", "not"}
+CONSTANT_NAMES = {"#t": True, "#f": False}
+
+# times a foldable name has been bound or deleted (see Frame.__setitem__)
+FOLD_REBINDINGS = 0
+
+def rebind_foldable():
+    global FOLD_REBINDINGS
+    FOLD_REBINDINGS += 1
+
+class Fold_Guard:
+    # whether any of names is bound between a frame and the builtins, for
+    # the last frame checked (held weakly, like a Call_Cache's)
+    __slots__ = ("names", "frame", "version", "rebound")
+
+    def __init__(self, names):
+        self.names = names
+        self.frame = no_reference
+        self.version = None
+        self.rebound = False
+
+    def check(self, frame):
+        names = self.names
+        rebound = False
+        scope_frame = frame
+        while scope_frame is not None and scope_frame is not BUILT_IN_FRAME:
+            if scope_frame.layout is not None and not names.isdisjoint(scope_frame.layout):
+                rebound = True
+                break
+            if scope_frame.bindings and not names.isdisjoint(scope_frame.bindings):
+                rebound = True
+                break
+            scope_frame = scope_frame.parent
+        self.frame = weakref.ref(frame)
+        self.version = FOLD_REBINDINGS
+        self.rebound = rebound
+        return rebound
+
+OPTIMIZE = True # whether evaluate optimizes trees before compiling them
+
+class Guarded:
+    # tree stands for original as long as none of names has been rebound
+    __slots__ = ("tree", "original", "names")
+
+    def __init__(self, tree, original, names):
+        self.tree = tree
+        self.original = original
+        self.names = names
+
+    def __repr__(self):
+        return f"Guarded({self.tree!r}, {self.original!r})"
+
+def is_builtin(name, shadowed):
+    # True if name refers to its builtin value unless a frame rebinds it
+    return name not in shadowed
+
+def settle(original, tree, names):
+    # the node to compile for original, which fold turned into tree
+    if names is None or tree is original:
+        return tree
+    if TRACERS:
+        trace("fold", original, tree)
+    if names:
+        return Guarded(tree, original, names)
+    return tree
+
+def fold(tree, shadowed):
+    """
+    given a tree and the names bound by its enclosing lambdas, returns
+    (new tree, names), where names is None unless new tree is a constant, in
+    which case it is the set of builtin names the constant depends on; the
+    tree itself is returned when nothing in it changed
+    """
+    if isinstance(tree, (int, float)):
+        return tree, frozenset()
+    if isinstance(tree, str):
+        if tree in CONSTANT_NAMES and is_builtin(tree, shadowed):
+            return CONSTANT_NAMES[tree], frozenset((tree,))
+        return tree, None
+    if not isinstance(tree, list) or not tree:
+        return tree, None
+    head = tree[0]
+    if head == "lambda":
+        try:
+            parameters, body = lambda_parts(tree)
+        except SchemeSyntaxError:
+            return tree, None
+        inner = shadowed | set(parameters) | set(defined_names(body))
+        return rebuild(tree, [head, parameters, optimize_in(body, inner)]), None
+    if head == "define":
+        if len(tree) != 3:
+            return tree, None
+        target = tree[1]
+        if isinstance(target, list) and target and all(map(valid_var_name, target)):
+            inner = shadowed | set(target[1:]) | set(defined_names(tree[2]))
+            return rebuild(tree, [head, target, optimize_in(tree[2], inner)]), None
+        return rebuild(tree, [head, target, optimize_in(tree[2], shadowed)]), None
+    if head == "set!":
+        if len(tree) != 3:
+            return tree, None
+        return rebuild(tree, [head, tree[1], optimize_in(tree[2], shadowed)]), None
+    form = SPECIAL_FORMS.get(head) if isinstance(head, str) else None
+    if form is not None and form.expand is not None:
+        try:
+            expanded = form.expand(tree)
+        except SchemeSyntaxError:
+            return tree, None
+        new_tree, names = fold(expanded, shadowed)
+        return (tree, None) if new_tree is expanded else (new_tree, names)
+    if head == "if" and len(tree) == 4:
+        condition, names = fold(tree[1], shadowed)
+        if names is None:
+            parts = [head] + [optimize_in(sub_exp, shadowed) for sub_exp in tree[1:]]
+            return rebuild(tree, parts), None
+        # only #f is false
+        branch = tree[3] if condition is False else tree[2]
+        new_branch, branch_names = fold(branch, shadowed)
+        if branch_names is not None:
+            return new_branch, names | branch_names
+        if TRACERS:
+            trace("fold", tree, new_branch)
+        if names:
+            return Guarded(new_branch, tree, names), None
+        return new_branch, None
+    if form is not None and head != "begin":
+        # the operands of other forms need not be expressions
+        return tree, None
+    parts = [fold(sub_exp, shadowed) for sub_exp in tree]
+    if isinstance(head, str) and head in FOLDABLE_BUILTINS and is_builtin(head, shadowed):
+        arguments = parts[1:]
+        if all(names is not None for _, names in arguments):
+            try:
+                value = BUILT_IN_FRAME.bindings[head](*[value for value, _ in arguments])
+            except Exception:
+                value = None # left for evaluation, to raise its error then
+            if type(value) in (int, float, bool):
+                names = frozenset((head,)).union(*[names for _, names in arguments])
+                return value, names
+    return rebuild(tree, [settle(sub_exp, *part) for sub_exp, part in zip(tree, parts)]), None
+
+def rebuild(tree, parts):
+    # tree itself if none of its parts changed, else a new list of parts
+    if all(new is old for new, old in zip(parts, tree)):
+        return tree
+    return parts
+
+def optimize_in(tree, shadowed):
+    return settle(tree, *fold(tree, shadowed))
+
+def optimize(tree):
+    """
+    returns tree with constant expressions folded (see above); the tree
+    given is never modified
+
+    >>> optimize(['lambda', ['x'], ['+', 'x', ['*', 3, ['+', 2, 4]]]])
+    ['lambda', ['x'], ['+', 'x', Guarded(18, ['*', 3, ['+', 2, 4]])]]
+    """
+    return optimize_in(tree, frozenset())
+
+def guard_depth(node, scope):
+    # the number of frames between the one a Guarded node runs in and the
+    # frame its names are looked up from
+    if scope is None:
+        return 0
+    return scope.resolve(next(iter(node.names)))[0]
+
+def compile_guarded(node, scope, tail):
+    fast = compile_expression(node.tree, scope, tail)
+    slow = compile_expression(node.original, scope, tail)
+    guard = Fold_Guard(node.names)
+    depth = guard_depth(node, scope)
+    if isinstance(node.tree, (int, float)):
+        value = node.tree
+        def guarded_constant(frame):
+            if FOLD_REBINDINGS:
+                scope_frame = frame
+                if depth:
+                    for _ in range(depth):
+                        scope_frame = scope_frame.parent
+                if guard.frame() is not scope_frame or guard.version != FOLD_REBINDINGS:
+                    guard.check(scope_frame)
+                if guard.rebound:
+                    return slow(frame)
+            return value
+        return guarded_constant
+    def guarded(frame):
+        if FOLD_REBINDINGS:
+            scope_frame = frame
+            if depth:
+                for _ in range(depth):
+                    scope_frame = scope_frame.parent
+            if guard.frame() is not scope_frame or guard.version != FOLD_REBINDINGS:
+                guard.check(scope_frame)
+            if guard.rebound:
+                return slow(frame)
+        return fast(frame)
+    return guarded
+
+############
+# Bytecode #
+############
+# The "vm" engine compiles a parsed tree into a Code object: a flat array of
+# integers (each opcode followed by its operands) and a tuple of constants
+# that the operands index into.  run_vm executes it with a loop over the
+# array, keeping its own value stack and its own stack of suspended calls,
+# so calling a Scheme function never recurses in Python.  Scoping, errors
+# and tracer events are the same as for the closure engine above.
+
+LOAD_CONST = 0      # k              push consts[k]
+LOAD_SLOT = 1       # slot k         push slot of this frame (consts[k] names it)
+LOAD_ADDRESS = 2    # depth slot k   push slot of the frame depth levels up
+LOAD_NAME = 3       # depth k        look up consts[k] from depth levels up
+DEFINE_SLOT = 4     # slot k         bind the top of the stack to a slot
+DEFINE_NAME = 5     # k              bind the top of the stack to consts[k]
+MAKE_FUNCTION = 6   # k              push a VM_Function for the Code consts[k]
+CALL = 7            # n k            call with n args (consts[k] is the callee expression)
+TAIL_CALL = 8       # n k            CALL that reuses the current call's place
+RETURN = 9          #                return the top of the stack
+JUMP = 10           # target
+JUMP_IF_FALSE = 11  # target         pop, jump if it is #f
+POP = 12            #
+RAISE = 13          # k              raise a copy of the exception consts[k]
+GUARD = 14          # depth k target jump if the Fold_Guard consts[k] finds a name
+                    #                rebound from depth levels up (see Guarded)
+SET_NAME = 15       # depth k        rebind consts[k] from depth levels up to the top of the stack
+SET_ADDRESS = 16    # depth slot k   rebind the slot of the frame depth levels up
+LOAD_CALLEE = 17    # depth k        LOAD_NAME through the Call_Cache consts[k]
+DELETE = 18         # k              unbind consts[k] from this frame, pushing its value
+
+VM_STATS = {"instructions": 0}
+
+class Code:
+    # compiled bytecode for a top-level expression or a lambda body
+    __slots__ = ("ops", "consts", "parameters", "scope")
+
+    def __init__(self, ops, consts, parameters = (), scope = None):
+        self.ops = ops
+        self.consts = consts
+        self.parameters = parameters
+        self.scope = scope
+
+class Code_Builder:
+    # collects the instructions and constants of one Code object
+    def __init__(self):
+        self.ops = []
+        self.consts = []
+        self.const_index = {}
+
+    def const(self, value):
+        # index of value in the constants pool, adding it if needed (keyed
+        # by repr so that 1, 1.0 and -0.0 stay distinct constants)
+        key = (type(value), repr(value))
+        try:
+            return self.const_index[key]
+        except KeyError:
+            self.consts.append(value)
+            self.const_index[key] = len(self.consts) - 1
+            return len(self.consts) - 1
+
+    def emit(self, *words):
+        # appends an instruction, returning its position
+        self.ops.extend(words)
+        return len(self.ops) - len(words)
+
+    def build(self, parameters = (), scope = None):
+        return Code(array("l", self.ops), tuple(self.consts), parameters, scope)
+
+def emit_expression(builder, tree, scope, tail):
+    """
+    appends the bytecode for tree to builder.  In tail position (the body of
+    a lambda) every path through the code ends in RETURN or TAIL_CALL.
+    """
+    if isinstance(tree, (int, float)):
+        builder.emit(LOAD_CONST, builder.const(tree))
+    elif isinstance(tree, str):
+        emit_lookup(builder, tree, scope)
+    elif type(tree) is Guarded:
+        return emit_guarded(builder, tree, scope, tail)
+    elif isinstance(tree, list) and tree:
+        if isinstance(tree[0], str):
+            form = SPECIAL_FORMS.get(tree[0])
+            if form is not None:
+                return form.emit(builder, tree, scope, tail)
+        return emit_call(builder, tree, scope, tail)
+    else:
+        emit_error(builder, SchemeEvaluationError("Function not Found"))
+    if tail:
+        builder.emit(RETURN)
+
+def emit_error(builder, error):
+    builder.emit(RAISE, builder.const(error))
+
+def emit_lookup(builder, name, scope):
+    depth, slot = (0, None) if scope is None else scope.resolve(name)
+    if slot is None:
+        builder.emit(LOAD_NAME, depth, builder.const(name))
+    elif depth == 0:
+        builder.emit(LOAD_SLOT, slot, builder.const(name))
+    else:
+        builder.emit(LOAD_ADDRESS, depth, slot, builder.const(name))
+
+def emit_define(builder, tree, scope, tail = False):
+    try:
+        target, value_exp = define_parts(tree)
+    except SchemeSyntaxError as error:
+        return emit_error(builder, error)
+    if is_lambda(value_exp):
+        emit_lambda(builder, value_exp, scope, name = target)
+    else:
+        emit_expression(builder, value_exp, scope, False)
+    if scope is not None and target in scope.layout:
+        builder.emit(DEFINE_SLOT, scope.layout[target], builder.const(target))
+    else:
+        builder.emit(DEFINE_NAME, builder.const(target))
+    if tail:
+        builder.emit(RETURN)
+
+def emit_set(builder, tree, scope, tail = False):
+    try:
+        target, value_exp = set_parts(tree)
+    except SchemeSyntaxError as error:
+        return emit_error(builder, error)
+    emit_expression(builder, value_exp, scope, False)
+    depth, slot = (0, None) if scope is None else scope.resolve(target)
+    if slot is None:
+        builder.emit(SET_NAME, depth, builder.const(target))
+    else:
+        builder.emit(SET_ADDRESS, depth, slot, builder.const(target))
+    if tail:
+        builder.emit(RETURN)
+
+def emit_del(builder, tree, scope, tail = False):
+    if len(tree) != 2 or not valid_var_name(tree[1]):
+        return emit_error(builder, SchemeSyntaxError("del takes a name"))
+    builder.emit(DELETE, builder.const(tree[1]))
+    if tail:
+        builder.emit(RETURN)
+
+def emit_delay(builder, tree, scope, tail = False):
+    if len(tree) != 2:
+        return emit_error(builder, SchemeSyntaxError("delay takes an expression"))
+    builder.emit(LOAD_CONST, builder.const(Promise))
+    emit_lambda(builder, ["lambda", [], tree[1]], scope)
+    builder.emit(CALL, 1, builder.const("delay"))
+    if tail:
+        builder.emit(RETURN)
+
+def emit_cons_stream(builder, tree, scope, tail = False):
+    if len(tree) != 3:
+        return emit_error(builder, SchemeSyntaxError("cons-stream takes a first element and the rest"))
+    builder.emit(LOAD_CONST, builder.const(Pair))
+    emit_expression(builder, tree[1], scope, False)
+    emit_delay(builder, ["delay", tree[2]], scope)
+    builder.emit(CALL, 2, builder.const("cons-stream"))
+    if tail:
+        builder.emit(RETURN)
+
+def emit_lambda(builder, tree, scope, tail = False, name = None):
+    try:
+        parameters, body_exp = lambda_parts(tree)
+    except SchemeSyntaxError as error:
+        return emit_error(builder, error)
+    name = lambda_name(tree, scope, name)
+    body_scope = Scope(parameters, defined_names(body_exp), scope, name)
+    body = Code_Builder()
+    emit_expression(body, body_exp, body_scope, True)
+    code = body.build(parameters, body_scope)
+    builder.emit(MAKE_FUNCTION, builder.const(code))
+    if tail:
+        builder.emit(RETURN)
+
+def emit_if(builder, tree, scope, tail):
+    if len(tree) != 4:
+        emit_error(builder, SchemeSyntaxError("if takes a condition and two branches"))
+        return
+    emit_expression(builder, tree[1], scope, False)
+    to_false = builder.emit(JUMP_IF_FALSE, 0)
+    emit_expression(builder, tree[2], scope, tail)
+    if not tail:
+        # in tail position the true branch has already returned
+        to_end = builder.emit(JUMP, 0)
+    builder.ops[to_false + 1] = len(builder.ops)
+    emit_expression(builder, tree[3], scope, tail)
+    if not tail:
+        builder.ops[to_end + 1] = len(builder.ops)
+
+def emit_guarded(builder, node, scope, tail):
+    guard = Fold_Guard(node.names)
+    to_original = builder.emit(GUARD, guard_depth(node, scope), builder.const(guard), 0)
+    emit_expression(builder, node.tree, scope, tail)
+    if not tail:
+        to_end = builder.emit(JUMP, 0)
+    builder.ops[to_original + 3] = len(builder.ops)
+    emit_expression(builder, node.original, scope, tail)
+    if not tail:
+        builder.ops[to_end + 1] = len(builder.ops)
+
+def emit_begin(builder, tree, scope, tail):
+    if len(tree) == 1:
+        emit_error(builder, SchemeSyntaxError("begin needs an expression"))
+        return
+    for sub_exp in tree[1:-1]:
+        emit_expression(builder, sub_exp, scope, False)
+        builder.emit(POP)
+    emit_expression(builder, tree[-1], scope, tail)
+
+def emit_call(builder, tree, scope, tail):
+    func = tree[0]
+    depth, slot = 0, None
+    if isinstance(func, str) and scope is not None:
+        depth, slot = scope.resolve(func)
+    if isinstance(func, str) and slot is None and CACHE_CALLS:
+        builder.emit(LOAD_CALLEE, depth, builder.const(Call_Cache(func)))
+    else:
+        emit_expression(builder, func, scope, False)
+    for sub_exp in tree[1:]:
+        emit_expression(builder, sub_exp, scope, False)
+    # a TAIL_CALL to a builtin pushes its result like CALL, hence the RETURN
+    callee = builder.const(tree[0])
+    if tail:
+        builder.emit(TAIL_CALL, len(tree) - 1, callee, RETURN)
+    else:
+        builder.emit(CALL, len(tree) - 1, callee)
+
+def compile_bytecode(tree):
+    """
+    Compiles a fully parsed top-level expression into a Code object that
+    run_vm can execute.
+
+    >>> run_vm(compile_bytecode(['+', 2, ['*', 3, 4]]), Frame())
+    14
+    """
+    builder = Code_Builder()
+    emit_expression(builder, tree, None, False)
+    builder.emit(RETURN)
+    return builder.build()
+
+class VM_Function:
+    # a lambda compiled to bytecode, closing over the frame it was made in
+    def __init__(self, code, frame):
+        self.code = code
+        self.parameters = code.parameters
+        self.scope = code.scope
+        self.frame = frame
+
+    def __call__(self, *args):
+        # called from Python (builtins such as map); calls made from
+        # bytecode never come through here
+        if len(args) != len(self.parameters):
+            raise SchemeEvaluationError("Incorrect Num of Arguments")
+        if BUDGET is not None:
+            BUDGET.charge()
+        if TRACERS:
+            trace("call", self, args)
+        scope = self.code.scope
+        frame = Frame(self.frame, None, [*args, *scope.unbound_locals], scope.layout)
+        return run_vm(self.code, frame, self)
+
+    def __reduce__(self):
+        # pickling would drag the whole frame chain along; like the closure
+        # engine's functions, VM functions stay in the process that made them
+        raise TypeError("cannot pickle a Scheme function")
+
+def run_vm(code, frame, function = None):
+    """
+    Runs code in frame and returns the value it computes.  function is the
+    VM_Function whose body code is, if any (it is reported to TRACERS when
+    the code returns).
+    """
+    try:
+        next(vm_steps(code, frame, function))
+    except StopIteration as done:
+        return done.value
+    # without yield_every, vm_steps only returns
+
+def vm_steps(code, frame, function = None, yield_every = None):
+    """
+    Generator that runs code in frame as run_vm does, returning the value
+    it computes.  With yield_every, it suspends itself (yielding None) every
+    yield_every calls of VM functions, and a coroutine returned by a builtin
+    is yielded to be awaited by the caller, which sends back its result (see
+    evaluate_async).  Without, it never yields.
+    """
+    ops = code.ops
+    consts = code.consts
+    pc = 0
+    stack = []
+    # (ops, consts, pc, frame, function) of each suspended caller
+    calls = []
+    count = 0
+    calls_left = yield_every
+    try:
+        while True:
+            op = ops[pc]
+            count += 1
+            if op == LOAD_SLOT:
+                value = frame.slots[ops[pc + 1]]
+                if value is UNBOUND:
+                    value = frame.parent[consts[ops[pc + 2]]]
+                stack.append(value)
+                pc += 3
+            elif op == LOAD_CONST:
+                stack.append(consts[ops[pc + 1]])
+                pc += 2
+            elif op == LOAD_CALLEE:
+                scope_frame = frame
+                for _ in range(ops[pc + 1]):
+                    scope_frame = scope_frame.parent
+                site = consts[ops[pc + 2]]
+                if site.frame() is scope_frame and site.version == BINDING_VERSIONS[site.name]:
+                    site.hits += 1
+                    stack.append(site.value())
+                else:
+                    stack.append(site.lookup(scope_frame))
+                pc += 3
+            elif op == LOAD_NAME:
+                scope_frame = frame
+                for _ in range(ops[pc + 1]):
+                    scope_frame = scope_frame.parent
+                stack.append(scope_frame[consts[ops[pc + 2]]])
+                pc += 3
+            elif op == CALL or op == TAIL_CALL:
+                num_args = ops[pc + 1]
+                if num_args:
+                    args = stack[-num_args:]
+                    del stack[-num_args:]
+                else:
+                    args = []
+                callee = stack.pop()
+                callee_type = type(callee)
+                if callee_type is VM_Function or (
+                    callee_type is User_Function and yield_every is not None
+                ):
+                    if callee_type is VM_Function:
+                        callee_code = callee.code
+                    else:
+                        callee_code = callee.vm_code()
+                    if num_args != len(callee_code.parameters):
+                        raise SchemeEvaluationError("Incorrect Num of Arguments")
+                    if BUDGET is not None:
+                        BUDGET.charge()
+                    if op == CALL:
+                        calls.append((ops, consts, pc + 3, frame, function))
+                    elif TRACERS:
+                        trace("return", function, TailCall(callee, args))
+                    if TRACERS:
+                        trace("call", callee, tuple(args))
+                    scope = callee_code.scope
+                    args.extend(scope.unbound_locals)
+                    frame = Frame(callee.frame, None, args, scope.layout)
+                    ops = callee_code.ops
+                    consts = callee_code.consts
+                    function = callee
+                    pc = 0
+                    if calls_left is not None:
+                        calls_left -= 1
+                        if not calls_left:
+                            calls_left = yield_every
+                            yield None
+                elif yield_every is not None and callee in ASYNC_STEPS:
+                    try:
+                        value = yield from ASYNC_STEPS[callee](yield_every, *args)
+                    except TypeError as error:
+                        raise arguments_error(consts[ops[pc + 2]], error) from error
+                    stack.append(value)
+                    pc += 3
+                elif callable(callee):
+                    try:
+                        value = callee(*args)
+                    except TypeError as error:
+                        raise arguments_error(consts[ops[pc + 2]], error) from error
+                    if type(value) is CoroutineType:
+                        if yield_every is None:
+                            value.close()
+                            raise SchemeEvaluationError(
+                                "coroutine builtins need evaluate_async:", consts[ops[pc + 2]]
+                            )
+                        value = yield value
+                    stack.append(value)
+                    pc += 3
+                else:
+                    raise SchemeEvaluationError("not a function:", consts[ops[pc + 2]])
+            elif op == RETURN:
+                value = stack.pop()
+                if TRACERS and function is not None:
+                    trace("return", function, value)
+                if not calls:
+                    return value
+                ops, consts, pc, frame, function = calls.pop()
+                stack.append(value)
+            elif op == JUMP_IF_FALSE:
+                if stack.pop() is False:
+                    pc = ops[pc + 1]
+                else:
+                    pc += 2
+            elif op == JUMP:
+                pc = ops[pc + 1]
+            elif op == LOAD_ADDRESS:
+                scope_frame = frame
+                for _ in range(ops[pc + 1]):
+                    scope_frame = scope_frame.parent
+                value = scope_frame.slots[ops[pc + 2]]
+                if value is UNBOUND:
+                    value = scope_frame.parent[consts[ops[pc + 3]]]
+                stack.append(value)
+                pc += 4
+            elif op == POP:
+                stack.pop()
+                pc += 1
+            elif op == MAKE_FUNCTION:
+                stack.append(VM_Function(consts[ops[pc + 1]], frame))
+                pc += 2
+            elif op == DEFINE_SLOT:
+                frame.slots[ops[pc + 1]] = stack[-1]
+                if TRACERS:
+                    trace("define", consts[ops[pc + 2]], stack[-1])
+                pc += 3
+            elif op == DEFINE_NAME:
+                frame[consts[ops[pc + 1]]] = stack[-1]
+                if TRACERS:
+                    trace("define", consts[ops[pc + 1]], stack[-1])
+                pc += 2
+            elif op == SET_NAME:
+                scope_frame = frame
+                for _ in range(ops[pc + 1]):
+                    scope_frame = scope_frame.parent
+                scope_frame.assign(consts[ops[pc + 2]], stack[-1])
+                pc += 3
+            elif op == SET_ADDRESS:
+                scope_frame = frame
+                for _ in range(ops[pc + 1]):
+                    scope_frame = scope_frame.parent
+                if scope_frame.slots[ops[pc + 2]] is UNBOUND:
+                    scope_frame.parent.assign(consts[ops[pc + 3]], stack[-1])
+                else:
+                    scope_frame.slots[ops[pc + 2]] = stack[-1]
+                pc += 4
+            elif op == DELETE:
+                stack.append(frame.delete(consts[ops[pc + 1]]))
+                pc += 2
+            elif op == GUARD:
+                rebound = False
+                if FOLD_REBINDINGS:
+                    scope_frame = frame
+                    for _ in range(ops[pc + 1]):
+                        scope_frame = scope_frame.parent
+                    guard = consts[ops[pc + 2]]
+                    if guard.frame() is scope_frame and guard.version == FOLD_REBINDINGS:
+                        rebound = guard.rebound
+                    else:
+                        rebound = guard.check(scope_frame)
+                if rebound:
+                    pc = ops[pc + 3]
+                else:
+                    pc += 4
+            else:
+                error = consts[ops[pc + 1]]
+                raise type(error)(*error.args)
+    except BaseException as error:
+        if TRACERS:
+            # every function call still running ends with the error
+            if function is not None:
+                trace("unwind", function, error)
+            for *_, caller in reversed(calls):
+                if caller is not None:
+                    trace("unwind", caller, error)
+        raise
+    finally:
+        VM_STATS["instructions"] += count
+
+# Builtins that call back into Scheme cannot yield from inside a Python loop,
+# so under evaluate_async the VM runs these versions of them instead: each
+# is a generator in the manner of vm_steps, taking yield_every before the
+# builtin's arguments, which runs every callback with call_steps and
+# suspends itself every yield_every callbacks.
+
+def call_steps(function, args, yield_every):
+    # generator calling function on args as a callback from a builtin would
+    if type(function) in (VM_Function, User_Function):
+        if len(args) != len(function.parameters):
+            raise SchemeEvaluationError("Incorrect Num of Arguments")
+        if BUDGET is not None:
+            BUDGET.charge()
+        if TRACERS:
+            trace("call", function, args)
+        scope = function.scope
+        frame = Frame(function.frame, None, [*args, *scope.unbound_locals], scope.layout)
+        if type(function) is VM_Function:
+            code = function.code
+        else:
+            code = function.vm_code()
+        return (yield from vm_steps(code, frame, function, yield_every))
+    value = function(*args)
+    if type(value) is CoroutineType:
+        value = yield value
+    return value
+
+def map_steps(yield_every, function, lst):
+    values = []
+    for i, value in enumerate(iter_list(lst), 1):
+        values.append((yield from call_steps(function, (value,), yield_every)))
+        if not i % yield_every:
+            yield None
+    return list_from_iterable(values)
+
+def filter_steps(yield_every, function, lst):
+    values = []
+    for i, value in enumerate(iter_list(lst), 1):
+        if (yield from call_steps(function, (value,), yield_every)) is not False:
+            values.append(value)
+        if not i % yield_every:
+            yield None
+    return list_from_iterable(values)
+
+def reduce_steps(yield_every, function, lst, initial):
+    result = initial
+    for i, value in enumerate(iter_list(lst), 1):
+        result = yield from call_steps(function, (result, value), yield_every)
+        if not i % yield_every:
+            yield None
+    return result
+
+ASYNC_STEPS = {scheme_map: map_steps, scheme_filter: filter_steps, reduce: reduce_steps}
+
+#################
+# Special forms #
+#################
+# A form whose head is a name in SPECIAL_FORMS is compiled by that form's
+# handlers instead of as a call: compile(tree, scope, tail) returns its
+# closure for the closure engine, and emit(builder, tree, scope, tail)
+# appends its bytecode for the VM (ending every path in RETURN or TAIL_CALL
+# when tail is True).  A form that is shorthand for another tree, such as
+# let, only needs expand(tree), which returns that tree; both engines then
+# compile the expansion, and optimize and defined_names look through it.
+# Telling a special form from a call takes one dict lookup however many
+# forms there are.
+
+class Special_Form:
+    __slots__ = ("compile", "emit", "expand")
+
+    def __init__(self, compile_form, emit_form, expand = None):
+        self.compile = compile_form
+        self.emit = emit_form
+        self.expand = expand
+
+SPECIAL_FORMS = {}
+
+def register_special_form(name, compile_form = None, emit_form = None, expand = None):
+    """
+    makes (name ...) a special form, compiled by compile_form and emit_form
+    or, if expand is given, as the tree expand returns for it (see above);
+    expand and the handlers report malformed forms by raising
+    SchemeSyntaxError.  Registering a name again replaces its form, but not
+    in code that has already been compiled.
+
+    >>> register_special_form("unless", expand=lambda tree: ["if", tree[1], tree[3], tree[2]])
+    >>> evaluate(["unless", ["<", 1, 2], 3, 4])
+    4
+    >>> del SPECIAL_FORMS["unless"]
+    """
+    if expand is not None:
+        compile_form, emit_form = compile_expanded(expand), emit_expanded(expand)
+    elif compile_form is None or emit_form is None:
+        raise ValueError("a special form needs compile_form and emit_form, or expand")
+    SPECIAL_FORMS[symbol(name)] = Special_Form(compile_form, emit_form, expand)
+
+def compile_expanded(expand):
+    def compile_form(tree, scope, tail):
+        try:
+            expanded = expand(tree)
+        except SchemeSyntaxError as error:
+            return compile_error(error)
+        return compile_expression(expanded, scope, tail)
+    return compile_form
+
+def emit_expanded(expand):
+    def emit_form(builder, tree, scope, tail):
+        try:
+            expanded = expand(tree)
+        except SchemeSyntaxError as error:
+            return emit_error(builder, error)
+        return emit_expression(builder, expanded, scope, tail)
+    return emit_form
+
+def and_tree(tree):
+    """
+    (and exps...) is #t unless an exp is #f; the exps after it are not
+    evaluated
+
+    >>> and_tree(['and', 'a', 'b'])
+    ['if', 'a', ['if', 'b', True, False], False]
+    """
+    result = True
+    for exp in reversed(tree[1:]):
+        result = ["if", exp, result, False]
+    return result
+
+def or_tree(tree):
+    """
+    (or exps...) is #f unless an exp is not #f; the exps after it are not
+    evaluated
+
+    >>> or_tree(['or', 'a', 'b'])
+    ['if', 'a', True, ['if', 'b', True, False]]
+    """
+    result = False
+    for exp in reversed(tree[1:]):
+        result = ["if", exp, True, result]
+    return result
+
+register_special_form("define", compile_define, emit_define)
+register_special_form("lambda", compile_lambda, emit_lambda)
+register_special_form("if", compile_if, emit_if)
+register_special_form("begin", compile_begin, emit_begin)
+register_special_form("set!", compile_set, emit_set)
+register_special_form("del", compile_del, emit_del)
+register_special_form("delay", compile_delay, emit_delay)
+register_special_form("cons-stream", compile_cons_stream, emit_cons_stream)
+register_special_form("let", expand=let_call)
+register_special_form("and", expand=and_tree)
+register_special_form("or", expand=or_tree)
+
+def run_closure(closure, frame):
+    return closure(frame)
+
+# evaluation engines, by the name passed as evaluate(..., engine=name): each
+# is a pair of compile(tree) and run(compiled, frame) functions
+ENGINES = {
+    "closures": (compile_expression, run_closure),
+    "vm": (compile_bytecode, run_vm),
+}
+DEFAULT_ENGINE = "closures"
+
+def get_engine(engine):
+    # the (compile, run) pair for an engine name, or for DEFAULT_ENGINE
+    try:
+        return ENGINES[engine or DEFAULT_ENGINE]
+    except KeyError:
+        raise ValueError(f"unknown engine: {engine!r}") from None
+
+
+###############
+# Parse cache #
+###############
+# evaluate_source evaluates Scheme source text through PARSE_CACHE, which
+# keeps the parsed forms of the most recently used sources, keyed by a hash
+# of their text, together with the forms compiled for each engine they were
+# run with.  Submitting the same program again skips tokenizing, parsing
+# and compiling.  The cached trees are never handed out: parse_source gives
+# callers their own copies, so mutating a result cannot corrupt the cache.
+
+def copy_tree(tree, atom = None):
+    """
+    returns a copy of a parsed tree in which every list is new (atoms are
+    immutable and shared, or replaced by atom(value) if atom is given);
+    iterative, so deeply nested trees are fine
+
+    >>> copy_tree(['define', 'x', ['+', 1, 2]])
+    ['define', 'x', ['+', 1, 2]]
+    """
+    if not isinstance(tree, list):
+        return tree if atom is None else atom(tree)
+    root = []
+    stack = [(tree, root)]
+    while stack:
+        original, copy = stack.pop()
+        for item in original:
+            if isinstance(item, list):
+                item_copy = []
+                copy.append(item_copy)
+                stack.append((item, item_copy))
+            elif atom is None:
+                copy.append(item)
+            else:
+                copy.append(atom(item))
+    return root
+
+class Cached_Source:
+    # the parsed forms of one source text and their compiled versions
+    __slots__ = ("forms", "compiled")
+
+    def __init__(self, forms):
+        self.forms = forms
+        self.compiled = {} # engine name -> list of compiled forms
+
+class Parse_Cache:
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = {} # kept in least to most recently used order
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, source):
+        # the Cached_Source for source, parsing it on a miss; sources that
+        # fail to parse raise SchemeSyntaxError and are not cached
+        key = hashlib.blake2b(source.encode(), digest_size = 16).digest()
+        entries = self.entries
+        if key in entries:
+            self.hits += 1
+            entry = entries[key] = entries.pop(key)
+            return entry
+        self.misses += 1
+        entry = Cached_Source(list(read_forms(tokenize(source))))
+        entries[key] = entry
+        if len(entries) > self.max_size:
+            del entries[next(iter(entries))]
+        return entry
+
+    def compiled(self, source, engine):
+        # the forms of source compiled for engine (a name from ENGINES)
+        entry = self.lookup(source)
+        if engine not in entry.compiled:
+            compile_tree = ENGINES[engine][0]
+            entry.compiled[engine] = [
+                compile_tree(optimize(tree) if OPTIMIZE else tree) for tree in entry.forms
+            ]
+        return entry.compiled[engine]
+
+    def stats(self):
+        # hits, misses, hit rate and number of cached sources
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self.entries),
+        }
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = self.misses = 0
+
+PARSE_CACHE = Parse_Cache(256)
+
+def parse_source(source):
+    """
+    returns a list of the parsed forms in source, going through PARSE_CACHE;
+    the lists are the caller's own copies
+
+    >>> parse_source("(define x 2) (* x x)")
+    [['define', 'x', 2], ['*', 'x', 'x']]
+    """
+    return [copy_tree(tree) for tree in PARSE_CACHE.lookup(source).forms]
+
+def evaluate_source(source, frame = None, engine = None):
+    """
+    Evaluates every expression in the given Scheme source text, in order, in
+    frame (a brand new frame if none is given) and returns the value of the
+    last one.  Parsing and compiling are cached in PARSE_CACHE.
+    """
+    if frame is None:
+        frame = Frame()
+    engine = engine or DEFAULT_ENGINE
+    run = get_engine(engine)[1]
+    result = None
+    for compiled in PARSE_CACHE.compiled(source, engine):
+        result = run(compiled, frame)
+    return result
+
+def parse_cache_stats():
+    return PARSE_CACHE.stats()
+
+
+##############
+# File cache #
+##############
+# Like __pycache__, cached_forms keeps the parsed forms of a Scheme file in
+# __scmcache__/<file name>.scmc next to it (foo.scm.scmc for foo.scm, so
+# foo.ss gets a cache of its own), so that loading the file again only
+# takes one bulk read, a marshal.loads and interning the symbols read (as
+# marshal only stores plain strings).  A cache file is a header
+#     magic, format version, source mtime (ns), source size, source hash
+# followed by the marshalled list of forms, in which each lambda keyword
+# read as a Token (see iter_file_tokens) is a (text, line, column) tuple.  The cache is used as-is while
+# the source's mtime and size match the header; otherwise the source is
+# hashed, and only a changed hash means it has to be parsed again.
+
+CACHE_DIRECTORY = "__scmcache__"
+CACHE_MAGIC = b"SCMC"
+CACHE_VERSION = 2
+CACHE_HEADER = struct.Struct("<4sHqq16s")
+
+def cache_file_name(file_name):
+    directory, base = os.path.split(os.path.abspath(file_name))
+    return os.path.join(directory, CACHE_DIRECTORY, base + ".scmc")
+
+def source_hash(data):
+    return hashlib.blake2b(data, digest_size = 16).digest()
+
+def read_cache(cache_name):
+    # (mtime, size, hash, payload) from a cache file, or None if it is
+    # missing or not a cache file of this version
+    try:
+        with open(cache_name, "rb") as cache:
+            data = cache.read()
+    except OSError:
+        return None
+    if len(data) < CACHE_HEADER.size:
+        return None
+    magic, version, mtime, size, digest = CACHE_HEADER.unpack_from(data)
+    if magic != CACHE_MAGIC or version != CACHE_VERSION:
+        return None
+    return mtime, size, digest, memoryview(data)[CACHE_HEADER.size:]
+
+def write_cache(cache_name, stat, digest, payload):
+    # writes to a temporary file first so readers never see a partial cache;
+    # failing to write (read-only directory, ...) only loses the cache
+    header = CACHE_HEADER.pack(CACHE_MAGIC, CACHE_VERSION, stat.st_mtime_ns, stat.st_size, digest)
+    temporary = f"{cache_name}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(cache_name), exist_ok = True)
+        with open(temporary, "wb") as cache:
+            cache.write(header)
+            cache.write(payload)
+        os.replace(temporary, cache_name)
+    except OSError:
+        try:
+            os.remove(temporary)
+        except OSError:
+            pass
+
+def plain_atom(value):
+    # symbols are marshalled as plain strings, and Tokens as tuples...
+    if type(value) is Token:
+        return (str(value), value.line, value.column)
+    return str(value) if isinstance(value, str) else value
+
+def symbol_atom(value):
+    # ...which are made into symbols and Tokens again when loaded
+    if type(value) is tuple:
+        return Token(*value)
+    return symbol(value) if isinstance(value, str) else value
+
+def load_forms(payload):
+    return [copy_tree(form, symbol_atom) for form in marshal.loads(payload)]
+
+def cached_forms(file_name):
+    """
+    returns the list of parsed forms in a Scheme file, loading them from the
+    file's __scmcache__ entry when it is up to date, and (re)writing that
+    entry otherwise.  Syntax errors are raised as by parse, and nothing is
+    cached for a file that has one.
+    """
+    stat = os.stat(file_name)
+    cache_name = cache_file_name(file_name)
+    cached = read_cache(cache_name)
+    if cached is not None:
+        mtime, size, digest, payload = cached
+        try:
+            if mtime == stat.st_mtime_ns and size == stat.st_size:
+                return load_forms(payload)
+            with open(file_name, "rb") as source:
+                data = source.read()
+            if source_hash(data) == digest:
+                # touched but unchanged: keep the forms, refresh the header
+                forms = load_forms(payload)
+                write_cache(cache_name, os.stat(file_name), digest, payload)
+                return forms
+        except (EOFError, ValueError, TypeError):
+            pass # a corrupt payload is rebuilt below
+    with open(file_name, "rb") as source:
+        data = source.read()
+    text = data.decode(SOURCE_ENCODING)
+    reader = Reader(lambda: iter_tokens(text))
+    forms = list(reader.feed(iter_file_tokens(text)))
+    reader.close()
+    try:
+        payload = marshal.dumps([copy_tree(form, plain_atom) for form in forms])
+    except ValueError:
+        return forms # nested too deeply for marshal, so not cached
+    write_cache(cache_name, stat, source_hash(data), payload)
+    return forms
+
+
+####################
+# Batch evaluation #
+####################
+# evaluate_batch runs independent programs in a pool of worker processes, so
+# CPU-bound Scheme code is not limited by the GIL.  Every program runs in a
+# brand new frame, in which the shared prelude is evaluated first: a fork of
+# one prelude frame (see Frame.fork) would still let programs see each
+# other's set! of a prelude variable, made from inside a prelude function,
+# and changes to the prelude's vectors.  Each worker reads the prelude once,
+# when it starts, and PARSE_CACHE keeps it compiled between programs.
+
+BATCH_PRELUDE = None # the prelude's source text, in a worker process
+BATCH_PRELUDE_ERROR = None # the SchemeError reading the prelude raised, if any
+
+# seconds a program may overrun its timeout (a builtin can keep it from
+# noticing that its budget is spent) before the host presumes its worker
+# stuck and stops it
+BATCH_GRACE = 1.0
+
+def evaluate_program(program, frame, engine, use_cache):
+    # a program is Scheme source text, or the path of a Scheme file
+    if isinstance(program, str):
+        return evaluate_source(program, frame, engine)
+    return evaluate_file(program, frame, engine, use_cache)
+
+def portable_error(error):
+    # a copy of a SchemeError that can be pickled back from a worker; any
+    # other exception (a RecursionError, say) becomes a SchemeEvaluationError
+    if not isinstance(error, SchemeError):
+        return SchemeEvaluationError(f"{type(error).__name__}: {error}")
+    args = [arg if isinstance(arg, (str, int, float)) else repr(arg) for arg in error.args]
+    return type(error)(*args)
+
+def batch_worker_init(prelude, workers):
+    # workers is a queue on which each worker reports its process id, so
+    # that the host can stop it (see run_batch_pool)
+    global BATCH_PRELUDE, BATCH_PRELUDE_ERROR
+    workers.put(os.getpid())
+    if prelude is None or isinstance(prelude, str):
+        BATCH_PRELUDE = prelude
+        return
+    try:
+        with open(prelude, encoding = SOURCE_ENCODING) as source:
+            BATCH_PRELUDE = source.read()
+    except Exception as error:
+        BATCH_PRELUDE_ERROR = portable_error(error)
+
+def batch_worker_run(program, engine, timeout, use_cache):
+    # the value of program, or the error it or the prelude raised as a
+    # SchemeError
+    if BATCH_PRELUDE_ERROR is not None:
+        return BATCH_PRELUDE_ERROR
+    frame = Frame()
+    if BATCH_PRELUDE is not None:
+        try:
+            evaluate_source(BATCH_PRELUDE, frame, engine)
+        except Exception as error:
+            return portable_error(error)
+    previous = set_budget(None if timeout is None else Budget(seconds = timeout))
+    try:
+        result = evaluate_program(program, frame, engine, use_cache)
+    except Exception as error:
+        return portable_error(error)
+    finally:
+        set_budget(previous)
+    try:
+        pickle.dumps(result)
+    except (pickle.PicklingError, TypeError, AttributeError):
+        return SchemeEvaluationError("result cannot leave the worker:", repr(result))
+    return result
+
+def run_batch_pool(programs, results, prelude, timeout, max_workers, engine, use_cache):
+    # runs the (index, program) pairs in programs in a new pool, storing each
+    # result at its index in results.  If a program overruns its timeout by
+    # BATCH_GRACE, the pool's workers are stopped and the pairs that did not
+    # finish are returned, to be run again in a new pool.
+    workers = multiprocessing.Queue()
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers, initializer = batch_worker_init, initargs = (prelude, workers)
+    ) as pool:
+        futures = {
+            pool.submit(batch_worker_run, program, engine, timeout, use_cache): (index, program)
+            for index, program in programs
+        }
+        # a future is running once it is handed to a worker's queue, which
+        # can hold one program more than there are workers, so a program
+        # may wait for one other before it really starts
+        limit = None if timeout is None else 2 * timeout + BATCH_GRACE
+        poll = None if timeout is None else BATCH_GRACE / 4
+        started = {}
+        pending = set(futures)
+        while pending:
+            done, pending = concurrent.futures.wait(
+                pending, poll, concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                try:
+                    results[futures[future][0]] = future.result()
+                except concurrent.futures.process.BrokenProcessPool as error:
+                    results[futures[future][0]] = SchemeEvaluationError("worker died:", str(error))
+            if limit is None:
+                continue
+            now = time.monotonic()
+            stuck = []
+            for future in pending:
+                if future.running() and now - started.setdefault(future, now) > limit:
+                    stuck.append(future)
+            if stuck:
+                for future in stuck:
+                    results[futures[future][0]] = SchemeTimeoutError(
+                        "program overran its timeout and was stopped:", timeout
+                    )
+                    pending.remove(future)
+                # ProcessPoolExecutor has no public way to stop its workers,
+                # so they are stopped by the process ids they reported.  A
+                # stuck worker has been running for a while, so its id has
+                # long been delivered.
+                while True:
+                    try:
+                        os.kill(workers.get_nowait(), signal.SIGTERM)
+                    except queue.Empty:
+                        break
+                    except OSError:
+                        pass # exited already
+                return [futures[future] for future in pending]
+    return []
+
+def evaluate_batch(
+    programs, prelude = None, timeout = None, max_workers = None, engine = None, use_cache = False
+):
+    """
+    Evaluates each program (Scheme source text, or an os.PathLike naming a
+    Scheme file) in a brand new frame of its own, after evaluating prelude
+    (also source text or a path) there, using a pool of max_workers processes
+    (one per CPU by default).  Returns a list holding, in the order of
+    programs, the value of each program or the SchemeError it raised (any
+    other exception becomes a SchemeEvaluationError).  A program running
+    longer than timeout seconds raises SchemeTimeoutError (see Budget); one
+    stuck where its budget is not checked, such as inside a builtin, has its
+    worker stopped by the host instead.  Values must be picklable: a
+    program returning a function gets a SchemeEvaluationError instead.
+    With use_cache, program files are loaded through their __scmcache__
+    entries, as by evaluate_file.
+    """
+    engine = engine or DEFAULT_ENGINE
+    get_engine(engine)
+    programs = list(programs)
+    results = [None] * len(programs)
+    remaining = list(enumerate(programs))
+    while remaining:
+        remaining = run_batch_pool(
+            remaining, results, prelude, timeout, max_workers, engine, use_cache
+        )
+    return results
+
+
+########
+# REPL #
+########
+
+import traceback
+from cmd import Cmd
+
+try:
+    import readline
+except:
+    readline = None
+
+
+def supports_color():
+    """
     Returns True if the running system's terminal supports color, and False
     otherwise.  Not guaranteed to work in all cases, but maybe in most?
     """
@@ -383,10 +3424,12 @@ class SchemeREPL(Cmd):
 
     if supports_color():
         prompt = "\033[96min>\033[0m "
+        continuation_prompt = "\033[96m...\033[0m "
         value_msg = "  out> \033[92m\033[1m%r\033[0m"
         error_msg = "  \033[91mEXCEPTION!! %s\033[0m"
     else:
         prompt = "in> "
+        continuation_prompt = "... "
         value_msg = "  out> %r"
         error_msg = "  EXCEPTION!! %s"
 
@@ -394,19 +3437,49 @@ class SchemeREPL(Cmd):
         "define", "lambda", "if", "equal?", "<", "<=", ">", ">=", "and", "or",
         "del", "let", "set!", "+", "-", "*", "/", "#t", "#f", "not", "nil",
         "cons", "list", "cat", "cdr", "list-ref", "length", "append", "begin",
+        "delay", "force", "cons-stream", "stream-car", "stream-cdr", "range",
+        "make-vector", "vector", "vector-ref", "vector-set!", "vector-length",
+        "vector->list", "list->vector",
     }
 
-    def __init__(self, use_frames=False, verbose=False):
+    def __init__(self, use_frames=False, verbose=False, engine=None):
         self.verbose = verbose
+        self.engine = engine
         self.use_frames = use_frames
         self.global_frame = None
+        # expressions may span several input lines; the reader keeps the
+        # unfinished one until its closing paren is entered, and line_number
+        # counts the lines it has taken so far
+        self.reader = Reader()
+        self.line_number = 0
         Cmd.__init__(self)
 
+    def print_trace(self, event, subject, value):
+        # tracer used in verbose mode
+        if event == "call":
+            print(f"  call> {subject!r} with {list(value)!r}")
+        elif event == "return":
+            print(f"  return> {subject!r} gives {value!r}")
+        elif event == "define":
+            print(f"  define> {subject} = {value!r}")
+        elif event == "fold":
+            print(f"  fold> {subject!r} => {value!r}")
+        elif event == "unwind":
+            print(f"  unwind> {subject!r} by {value!r}")
+        else:
+            print(f"  unbound> {subject}")
+
     def preloop(self):
+        # the tracer is only registered while the loop runs, as any tracer
+        # makes every call of a Scheme function take the checked path
+        if self.verbose:
+            add_tracer(self.print_trace)
         if readline and os.path.isfile(self.history_file):
             readline.read_history_file(self.history_file)
 
     def postloop(self):
+        if self.verbose:
+            remove_tracer(self.print_trace)
         if readline:
             readline.set_history_length(10_000)
             readline.write_history_file(self.history_file)
@@ -418,6 +3491,25 @@ class SchemeREPL(Cmd):
             bound_vars = set()
         return sorted(i for i in (self.keywords | bound_vars) if i.startswith(text))
 
+    def evaluate(self, expression):
+        if self.use_frames:
+            output, self.global_frame = result_and_frame(
+                expression, self.global_frame, self.engine
+            )
+            return output
+        return evaluate(expression, engine=self.engine)
+
+    def profile(self, source):
+        # ":profile <expressions>" evaluates them under a Profiler, then
+        # prints its report
+        with Profiler() as profiler:
+            try:
+                for expression in read_forms(tokenize(source)):
+                    print(self.value_msg % self.evaluate(expression))
+            except SchemeError as e:
+                print(self.error_msg % e)
+        print(profiler.report(limit=20))
+
     def onecmd(self, line):
         if line in {"EOF", "quit", "QUIT"}:
             print()
@@ -427,31 +3519,34 @@ class SchemeREPL(Cmd):
         elif not line.strip():
             return False
 
+        elif line.startswith(":profile") and not self.reader.incomplete:
+            self.profile(line[len(":profile"):])
+            return False
+
+        if not self.reader.incomplete:
+            self.line_number = 0
+        self.line_number += 1
         try:
-            token_list = tokenize(line)
+            # positioned, for syntax errors, by the line of the expression
+            token_list = list(iter_tokens(line, self.line_number))
             if self.verbose:
                 print("tokens>", token_list)
-            expression = parse(token_list)
-            if self.verbose:
-                print("expression>", expression)
-            if self.use_frames:
-                output, self.global_frame = result_and_frame(
-                    *(
-                        (expression, self.global_frame)
-                        if self.global_frame is not None
-                        else (expression,)
-                    )
-                )
-            else:
-                output = evaluate(expression)
-            print(self.value_msg % output)
+            for expression in self.reader.feed(token_list):
+                if self.verbose:
+                    print("expression>", expression)
+                print(self.value_msg % self.evaluate(expression))
         except SchemeError as e:
+            self.reader = Reader()
             if self.verbose:
                 traceback.print_tb(e.__traceback__)
                 print(self.error_msg.replace("%s", "%r") % e)
             else:
                 print(self.error_msg % e)
 
+        if self.reader.incomplete:
+            self.prompt = self.continuation_prompt
+        else:
+            self.prompt = type(self).prompt
         return False
 
     completenames = completedefault
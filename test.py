@@ -6,13 +6,28 @@ LISP Interpreter Part 1
 import os
 import lab
 import sys
+import time
+import gc
+import io
 import json
+import math
+import asyncio
+import copy
+import pickle
 
 import pytest
+import weakref
 
 TEST_DIRECTORY = os.path.dirname(__file__)
 
 
+@pytest.fixture(autouse=True, params=sorted(lab.ENGINES))
+def engine(request, monkeypatch):
+    # every test runs once per evaluation engine
+    monkeypatch.setattr(lab, "DEFAULT_ENGINE", request.param)
+    return request.param
+
+
 class NotImplemented:
     def __eq__(self, other):
         return False
@@ -263,6 +278,29 @@ def test_tokenize_comments():
     run_test_number(32, lab.tokenize)
 
 
+def test_tokenize_files_and_positions():
+    fname = os.path.join(TEST_DIRECTORY, "test_files", "sudoku.scm")
+    with open(fname) as f:
+        source = f.read()
+    with open(fname) as f:
+        from_file = lab.tokenize(f)
+    with open(fname) as f:
+        streamed = list(lab.iter_tokens(f))
+    assert from_file == streamed == lab.tokenize(source)
+    assert streamed == list(lab.iter_tokens(source))
+    lines = source.splitlines()
+    for token in streamed:
+        line = lines[token.line - 1]
+        assert line[token.column - 1:].startswith(token)
+        assert ";" not in line[:token.column - 1]
+    with open(fname) as f:
+        loaded = list(lab.iter_file_tokens(f))
+    assert loaded == streamed == list(lab.iter_file_tokens(source))
+    positioned = [(t.line, t.column) for t in streamed if t == "lambda"]
+    assert positioned
+    assert [(t.line, t.column) for t in loaded if type(t) is lab.Token] == positioned
+
+
 def test_parse():
     run_test_number(1, lab.parse)
 
@@ -275,6 +313,42 @@ def test_parse_invalid():
     run_test_number(2, lab.parse)
 
 
+def test_parse_deep_nesting_and_error_positions():
+    depth = 10 * sys.getrecursionlimit()
+    tree = lab.parse(["("] * depth + ["x"] + [")"] * depth)
+    for _ in range(depth):
+        tree = tree[0] if isinstance(tree, list) and len(tree) == 1 else None
+    assert tree == "x"
+    for source, where in (
+        ("(define x\n  (+ 1 2)", "line 1, column 1"),
+        ("(+ 1 2))", "line 1, column 8"),
+        ("(+ 1\n (* 2 3)", "line 1, column 1"),
+        ("(f) (g)", "line 1, column 5"),
+    ):
+        with pytest.raises(lab.SchemeSyntaxError) as error:
+            lab.parse(lab.iter_tokens(source))
+        assert where in str(error.value), source
+    with pytest.raises(lab.SchemeSyntaxError):
+        lab.parse([])
+
+
+def test_symbols_are_interned():
+    tree = lab.parse(lab.tokenize("(define (f x) (+ x (g x)))"))
+    _, (f, x1), (_, x2, (_, x3)) = tree
+    assert type(x1) is lab.Symbol and x1 is x2 is x3 is lab.symbol("x")
+    assert x1 == "x" and tree == ["define", ["f", "x"], ["+", "x", ["g", "x"]]]
+    assert pickle.loads(pickle.dumps(tree)) == tree
+    assert pickle.loads(pickle.dumps(f)) is f
+    # only a lambda keyword keeps its position
+    tree = lab.parse(lab.iter_tokens("(lambda (y) y)"))
+    assert type(tree[0]) is lab.Token and tree[1][0] is tree[2] is lab.symbol("y")
+    for copied in (pickle.loads(pickle.dumps(tree)), copy.deepcopy(tree)):
+        assert copied == tree and type(copied[0]) is lab.Token
+        assert (copied[0].line, copied[0].column) == (1, 2)
+    # hand-built trees of plain strings work the same
+    assert lab.evaluate(["begin", ["define", "y", 3], ["+", "y", 1]]) == 4
+
+
 def test_tokenize_and_parse():
     run_test_number(3, lambda i: lab.parse(lab.tokenize(i)), "parse(tokenize(line))")
 
@@ -298,6 +372,32 @@ def test_calc_nested():
     run_test_number(35, lab.evaluate)
 
 
+def test_builtin_arities_and_comparisons():
+    for source, expected in (
+        ("(+)", 0), ("(+ 4)", 4), ("(+ 1 2 3.5)", 6.5),
+        ("(- 4)", -4), ("(- 10 1 2 3)", 4),
+        ("(*)", 1), ("(* 4)", 4), ("(* 2 3 4)", 24),
+        ("(/ 8)", 8), ("(/ 8 2)", 4.0), ("(/ 8 2 2)", 2.0),
+        ("(< 1 2)", True), ("(< 1 3 2)", False), ("(< 1 2 3)", True),
+        ("(<= 1 1 2)", True), ("(> 3 2 2)", False), ("(>= 3 2 2)", True),
+        ("(equal? 2 2)", True), ("(equal? 2 2 3)", False), ("(equal? 1 1.0)", True),
+    ):
+        result = lab.evaluate(lab.parse(lab.tokenize(source)))
+        assert result == expected and type(result) == type(expected), source
+
+
+def test_builtin_argument_errors_are_scheme_errors():
+    env = lab.Frame()
+    lab.evaluate(lab.parse(lab.tokenize("(define v (vector 1 2))")), env)
+    lab.evaluate(lab.parse(lab.tokenize("(define (f x) (- x))")), env)
+    for source in (
+        "(-)", "(< 1)", "(+ 1 nil)", "(car)", "(length 5 6)", "(vector-ref v)",
+        "(f nil)", "(map f (list 1 nil))", "((lambda (x) (< x)) 1)",
+    ):
+        with pytest.raises(lab.SchemeEvaluationError):
+            lab.evaluate(lab.parse(lab.tokenize(source)), env)
+
+
 ## TESTS FOR VARIABLE ASSIGNMENT AND LOOKUP
 
 def test_result_and_frame():
@@ -412,6 +512,910 @@ def test_nested_defines():
     do_raw_continued_evaluations(28)
 
 
+## TESTS FOR LISTS
+
+
+def test_list_builtins():
+    env = lab.Frame()
+    for source, expected in (
+        ("(define xs (list 1 2 3 4))", None),
+        ("(car (cdr xs))", 2),
+        ("(length xs)", 4),
+        ("(list-ref xs 3)", 4),
+        ("(map (lambda (x) (* x x)) xs)", [1, 4, 9, 16]),
+        ("(filter (lambda (x) (> x 2)) xs)", [3, 4]),
+        ("(reduce + xs 10)", 20),
+        ("(append xs (list) (list 5))", [1, 2, 3, 4, 5]),
+        ("(equal? (append xs) xs)", True),
+        ("(equal? (list 1 (list 2)) (list 1 (list 2)))", True),
+        ("(equal? (list 1 (list 2)) (list 1 (list 3)))", False),
+        ("(length nil)", 0),
+    ):
+        result = lab.evaluate(lab.parse(lab.tokenize(source)), env)
+        if expected is not None:
+            assert list_from_ll(result) == expected, source
+    for source in ("(car nil)", "(cdr 1)", "(list-ref xs 4)", "(length (cons 1 2))"):
+        with pytest.raises(lab.SchemeEvaluationError):
+            lab.evaluate(lab.parse(lab.tokenize(source)), env)
+
+
+def test_long_lists_use_constant_stack():
+    size = 5 * sys.getrecursionlimit()
+    env = lab.Frame()
+    env["xs"] = lab.list_from_iterable(range(size))
+    for source, expected in (
+        ("(length (map (lambda (x) (+ x 1)) xs))", size),
+        ("(list-ref (append xs xs) (- (* 2 (length xs)) 1))", size - 1),
+        ("(reduce + (filter (lambda (x) (< x 10)) xs) 0)", 45),
+        ("(equal? xs (append xs))", True),
+    ):
+        assert lab.evaluate(lab.parse(lab.tokenize(source)), env) == expected, source
+
+
+def test_streams_and_lazy_sequences():
+    env = lab.Frame()
+    for source, expected in (
+        ("(define calls 0)", 0),
+        ("(define (ints n) (cons-stream n (begin (set! calls (+ calls 1)) (ints (+ n 1)))))", None),
+        ("(define (take s k) (if (equal? k 0) (list) (cons (stream-car s) (take (stream-cdr s) (- k 1)))))", None),
+        ("(define nat (ints 0))", None),
+        ("(take nat 5)", [0, 1, 2, 3, 4]),
+        ("(take nat 5)", [0, 1, 2, 3, 4]),
+        ("calls", 5),  # the second walk forces nothing again
+        ("(force (delay (+ 1 2)))", 3),
+        ("(reduce + (stream-map (lambda (x) (* x x)) (stream-filter (lambda (x) (< x 5)) (range 10))) 0)", 30),
+        ("(list (length (range 2 20 3)) (list-ref (range 5) 3) (car (cdr (range 1 4))))", [6, 3, 2]),
+        ("(append (list 1) (range 2 4) (cons 4 (range 5 6)))", [1, 2, 3, 4, 5]),
+        ("(equal? (range 3) (list 0 1 2))", True),
+        ("(length (cons-stream 1 (list 2 3)))", 3),
+        # car and cdr walk a lazy sequence in O(1) per step
+        ("(define (sum s acc) (if (equal? s nil) acc (sum (cdr s) (+ acc (car s)))))", None),
+        ("(sum (range 5000) 0)", 12497500),
+        ("(sum (stream-map (lambda (x) (* x 2)) (range 3000)) 0)", 8997000),
+        # map and filter call their function once per element, even over a
+        # lazy sequence; stream-map calls it again on every walk
+        ("(define (counted x) (begin (set! calls (+ calls 1)) x))", None),
+        ("(define calls 0)", 0),
+        ("(define xs (map counted (range 100)))", None),
+        ("(list (list-ref xs 99) (length xs) (reduce + (filter counted xs) 0) calls)", [99, 100, 4950, 200]),
+        ("(define ys (stream-map counted (range 100)))", None),
+        ("(list (length ys) (length ys) calls)", [100, 100, 400]),
+        ("(define rest (cdr (cdr (range 5))))", None),
+        ("(list (car rest) (length rest) (reduce + rest 0) (equal? rest (list 2 3 4)))", [2, 3, 9, True]),
+        ("(list (equal? (cdr (range 1)) nil) (equal? nil (range 1)))", [True, False]),
+    ):
+        result = lab.evaluate(lab.parse(lab.tokenize(source)), env)
+        if isinstance(expected, list):
+            assert list_from_ll(result) == expected, source
+        elif expected is not None:
+            assert result == expected, source
+    lazy = lab.evaluate(lab.parse(lab.tokenize("(stream-map (lambda (x) (car nil)) (range 3))")), env)
+    assert isinstance(lazy, lab.Lazy_Sequence)  # nothing evaluated yet
+    for source in ("(length lazy)", "(range 1.5)", "(car (range 0))", "(cons-stream 1)"):
+        env["lazy"] = lazy
+        with pytest.raises(lab.SchemeError):
+            lab.evaluate(lab.parse(lab.tokenize(source)), env)
+
+
+def test_vectors():
+    env = lab.Frame()
+    for source, expected in (
+        ("(define v (make-vector 3 0))", None),
+        ("(vector-set! v 1 (list 1 2))", None),
+        ("(list (vector-length v) (vector-ref v 0) (length (vector-ref v 1)))", [3, 0, 2]),
+        ("(vector->list (list->vector (range 4)))", [0, 1, 2, 3]),
+        ("(equal? v (vector 0 (list 1 2) 0))", True),
+        ("(equal? v (vector 0 (list 1 3) 0))", False),
+        ("(equal? (vector 1 2) (list 1 2))", False),
+        ("(equal? (list (vector)) (list (make-vector 0)))", True),
+    ):
+        result = lab.evaluate(lab.parse(lab.tokenize(source)), env)
+        if isinstance(expected, list):
+            assert list_from_ll(result) == expected, source
+        elif expected is not None:
+            assert result == expected, source
+    assert repr(env["v"]) == "#(0 (1 2) 0)"
+    for source in ("(vector-ref v 3)", "(vector-ref v -1)", "(vector-set! (list 1) 0 1)", "(make-vector 1.5)"):
+        with pytest.raises(lab.SchemeEvaluationError):
+            lab.evaluate(lab.parse(lab.tokenize(source)), env)
+
+
+## TESTS FOR MEMOIZATION
+
+
+def test_memoize_caches_by_value():
+    env = lab.Frame()
+    for source in (
+        "(define (slow-fib n) (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2)))))",
+        "(define fib (memoize slow-fib 3))",
+    ):
+        lab.evaluate(lab.parse(lab.tokenize(source)), env)
+    assert lab.evaluate(["fib", 60], env) == 1548008755920
+    hits, misses, bypasses, size = env["fib"].stats()
+    assert (misses, bypasses, size) == (61, 0, 3)
+    assert list_from_ll(lab.evaluate(["memo-stats", "fib"], env)) == [hits, misses, 0, 3]
+    # 1 and 1.0 are different keys
+    assert type(lab.evaluate(["fib", 1.0], env)) == float
+    assert type(lab.evaluate(["fib", 1], env)) == int
+
+
+def test_memoize_bypasses_unhashable_and_evicts():
+    env = lab.Frame()
+    lab.evaluate(lab.parse(lab.tokenize("(define len (memoize length 2))")), env)
+    for source, expected in (
+        ("(len (list 1 2))", 2),
+        ("(len (list 1 2 3))", 3),
+        ("(memo-stats len)", [0, 0, 2, 0]),
+    ):
+        result = lab.evaluate(lab.parse(lab.tokenize(source)), env)
+        assert list_from_ll(result) == expected, source
+    square = lab.memoize(lambda x: x * x, 2)
+    for x in (1, 2, 1, 3, 2):
+        square(x)
+    # 2 was least recently used when 3 came in
+    assert square.stats() == (1, 4, 0, 2)
+    # signed zeros are different arguments, and a NaN is cached by its bits
+    sign = lab.memoize(lambda x: math.copysign(math.inf, x))
+    assert (sign(0.0), sign(-0.0), sign(0.0), sign(-0.0)) == (math.inf, -math.inf) * 2
+    assert sign.stats() == (2, 2, 0, 2)
+    sign(math.nan), sign(-math.nan), sign(float("nan"))
+    assert sign.stats() == (3, 4, 0, 4)
+    with pytest.raises(lab.SchemeEvaluationError):
+        lab.evaluate(lab.parse(lab.tokenize("(memoize 5)")), env)
+
+
+## TESTS FOR FRAMES
+
+
+def test_forked_frames_share_library_but_not_defines():
+    library = lab.Frame()
+    for source in (
+        "(define rate 3)",
+        "(define (cost n) (* n rate))",
+        "(define (count-down n) (if (equal? n 0) 0 (count-down (- n 1))))",
+    ):
+        lab.evaluate(lab.parse(lab.tokenize(source)), library)
+    first, second = library.fork(), library.fork()
+    # nothing is copied: the fork is an empty overlay on the library
+    assert first.bindings == {} and first.parent is library
+    lab.evaluate(lab.parse(lab.tokenize("(define rate 10)")), first)
+    lab.evaluate(lab.parse(lab.tokenize("(define (cost n) (+ n rate))")), first)
+    lab.evaluate(lab.parse(lab.tokenize("(define extra 1)")), second)
+    assert lab.evaluate(["cost", 2], first) == 12
+    assert lab.evaluate(["cost", 2], second) == 6
+    assert lab.evaluate(["count-down", 5], second) == 0
+    assert lab.evaluate("rate", library) == 3
+    with pytest.raises(lab.SchemeNameError):
+        lab.evaluate("extra", first)
+    with pytest.raises(lab.SchemeNameError):
+        lab.evaluate("extra", library)
+
+
+def test_set_in_a_fork_does_not_write_through():
+    library = lab.Frame()
+    lab.evaluate(lab.parse(lab.tokenize("(define rate 3)")), library)
+    lab.evaluate(lab.parse(lab.tokenize("(define (cost n) (* n rate))")), library)
+    first, second = library.fork(), library.fork()
+    nested = first.fork()
+    assert lab.evaluate(lab.parse(lab.tokenize("(set! rate 100)")), first) == 100
+    lab.evaluate(lab.parse(lab.tokenize("(set! + -)")), second)
+    assert lab.evaluate("rate", first) == 100
+    # as with define, the library's own functions still see its binding
+    assert lab.evaluate(["cost", 2], first) == lab.evaluate(["cost", 2], second) == 6
+    assert lab.evaluate(["+", 5, 1], second) == 4
+    assert lab.evaluate(["+", 5, 1], library) == 6
+    lab.evaluate(lab.parse(lab.tokenize("(set! rate 7)")), nested)
+    assert lab.evaluate("rate", nested) == 7
+    assert lab.evaluate("rate", first) == 100
+    assert "rate" not in library.fork().bindings and lab.evaluate("rate", library) == 3
+    results = lab.evaluate_batch(
+        ["(set! rate 0)", "rate", "rate"], prelude="(define rate 3)", max_workers=1
+    )
+    assert results == [0, 3, 3]
+
+
+## TESTS FOR FILES
+
+
+def test_evaluate_file_small():
+    fname = os.path.join(TEST_DIRECTORY, "test_files", "small_test1.scm")
+    assert lab.evaluate_file(fname) == 5
+
+
+def test_evaluate_file_forms_run_as_read(tmp_path):
+    fname = tmp_path / "forms.scm"
+    fname.write_text(
+        "; several top-level forms\n"
+        "(define (square x)\n  (* x x))\n"
+        "(define y (square 4)) (square y)\n"
+        "(undefined-function y)\n"
+        "(this form is never closed\n"
+    )
+    env = lab.Frame()
+    with pytest.raises(lab.SchemeNameError):
+        lab.evaluate_file(str(fname), env)
+    # everything before the failing form was evaluated into env
+    assert lab.evaluate(["square", "y"], env) == 256
+    fname.write_text("(define z 3)\n(* z z)\n(+ z")
+    with pytest.raises(lab.SchemeSyntaxError, match="line 3, column 1"):
+        lab.evaluate_file(str(fname), env)
+    assert lab.evaluate("z", env) == 3
+    fname.write_text("(define z 4)\n  z)\n")
+    for use_cache in (False, True):
+        with pytest.raises(lab.SchemeSyntaxError, match="line 2, column 4"):
+            lab.evaluate_file(str(fname), env, use_cache=use_cache)
+
+
+def test_evaluate_file_with_disk_cache(tmp_path, monkeypatch):
+    fname = tmp_path / "lib.scm"
+    fname.write_text("(define (square x) (* x x))\n(square 7)\n")
+    cache_name = tmp_path / "__scmcache__" / "lib.scm.scmc"
+    assert lab.evaluate_file(str(fname), use_cache=True) == 49
+    assert cache_name.exists()
+
+    def no_parsing(source):
+        raise AssertionError("file was parsed again")
+
+    with monkeypatch.context() as patched:
+        patched.setattr(lab, "iter_file_tokens", no_parsing)
+        assert lab.evaluate_file(str(fname), use_cache=True) == 49
+        forms = lab.cached_forms(str(fname))
+        assert forms[0][1][0] is lab.symbol("square")
+        # touched without changing: the hash still matches
+        os.utime(fname, ns=(0, 0))
+        assert lab.evaluate_file(str(fname), use_cache=True) == 49
+        fname.write_text("(define (square x) (* x x))\n(square 8)\n")
+        with pytest.raises(AssertionError):
+            lab.evaluate_file(str(fname), use_cache=True)
+    assert lab.evaluate_file(str(fname), use_cache=True) == 64
+    cache_name.write_bytes(cache_name.read_bytes()[:30])
+    assert lab.evaluate_file(str(fname), use_cache=True) == 64
+    fname.write_text("(define y 2) (+ y")
+    with pytest.raises(lab.SchemeSyntaxError):
+        lab.evaluate_file(str(fname), use_cache=True)
+
+
+def test_disk_cache_keys_encoding_and_lambda_positions(tmp_path):
+    # files differing only in extension get caches of their own
+    (tmp_path / "lib.scm").write_text("(define λ 1) λ", encoding="utf-8")
+    (tmp_path / "lib.ss").write_text("(define λ 2) λ", encoding="utf-8")
+    for _ in range(2):
+        for name, expected in (("lib.scm", 1), ("lib.ss", 2)):
+            assert lab.evaluate_file(str(tmp_path / name)) == expected
+            assert lab.evaluate_file(str(tmp_path / name), use_cache=True) == expected
+    assert sorted(os.listdir(tmp_path / "__scmcache__")) == ["lib.scm.scmc", "lib.ss.scmc"]
+    # lambda keywords keep their positions through the cache
+    fname = tmp_path / "named.scm"
+    fname.write_text("(define f\n  (lambda (x) x))\n")
+    for _ in range(2):
+        keyword = lab.cached_forms(str(fname))[0][2][0]
+        assert type(keyword) is lab.Token and (keyword.line, keyword.column) == (2, 4)
+
+
+## TESTS FOR BATCH EVALUATION
+
+
+def test_evaluate_batch_in_order_with_errors_and_timeouts(tmp_path):
+    program_file = tmp_path / "program.scm"
+    program_file.write_text("(define (twice x) (* 2 x))\n(twice (square 5))\n")
+    prelude = "(define (square x) (* x x)) (define (spin n) (spin (+ n 1)))"
+    results = lab.evaluate_batch(
+        [
+            "(square 3)",
+            "(define square 0) square",
+            "(square 4)",
+            "(undefined 1)",
+            "(spin 0)",
+            program_file,
+            "(list 1 (cons 2 3))",
+            "(lambda (x) x)",
+        ],
+        prelude=prelude,
+        timeout=0.5,
+        max_workers=2,
+    )
+    assert results[:3] == [9, 0, 16]
+    assert type(results[3]) is lab.SchemeNameError
+    assert type(results[4]) is lab.SchemeTimeoutError
+    assert results[5] == 50
+    pair = results[6]
+    assert pair.car == 1 and pair.cdr.cdr is lab.NIL
+    assert (pair.cdr.car.car, pair.cdr.car.cdr) == (2, 3)
+    assert type(results[7]) is lab.SchemeEvaluationError
+    # program files are only cached on request
+    assert not (tmp_path / "__scmcache__").exists()
+    assert lab.evaluate_batch([program_file], prelude=prelude, max_workers=1, use_cache=True) == [50]
+    assert (tmp_path / "__scmcache__" / "program.scm.scmc").exists()
+    prelude_errors = lab.evaluate_batch(["1", "2"], prelude="(+ 1", max_workers=1)
+    assert [type(error) for error in prelude_errors] == [lab.SchemeSyntaxError] * 2
+
+
+def test_evaluate_batch_programs_do_not_share_prelude_state(tmp_path):
+    prelude = tmp_path / "prelude.scm"
+    prelude.write_text(
+        "(define n 0) (define (bump) (begin (set! n (+ n 1)) n))\n"
+        "(define v (make-vector 1 0))\n"
+    )
+    programs = ["(bump)"] * 3 + ["(begin (vector-set! v 0 (+ (vector-ref v 0) 1)) (vector-ref v 0))"] * 2
+    for source in (prelude, prelude.read_text()):
+        assert lab.evaluate_batch(programs, prelude=source, max_workers=1) == [1, 1, 1, 1, 1]
+
+
+def test_evaluate_batch_survives_python_errors_and_stuck_builtins(monkeypatch):
+    # workers are forked, so they see the patched builtins and grace
+    monkeypatch.setitem(lab.BUILT_IN_FRAME.bindings, lab.symbol("sleep"), time.sleep)
+    monkeypatch.setattr(lab, "BATCH_GRACE", 0.2)
+    deep = "(define (deep n) (if (equal? n 0) 0 (+ 1 (deep (- n 1))))) (deep 100000)"
+    # only the closure engine runs out of Python stack on deep recursion
+    results = lab.evaluate_batch(
+        ["(+ 1 2)", "(-)", deep, "(sleep 60)", "(* 2 3)"],
+        timeout=0.2, max_workers=2, engine="closures",
+    )
+    assert results[0] == 3 and results[4] == 6
+    assert type(results[1]) is lab.SchemeEvaluationError
+    assert type(results[2]) is lab.SchemeEvaluationError and "RecursionError" in str(results[2])
+    assert type(results[3]) is lab.SchemeTimeoutError
+
+
+## TESTS FOR THE PARSE CACHE
+
+
+def test_parse_cache_hits_and_evicts(monkeypatch):
+    monkeypatch.setattr(lab, "PARSE_CACHE", lab.Parse_Cache(2))
+    env = lab.Frame()
+    assert lab.evaluate_source("(define (sq x) (* x x)) (sq 4)", env) == 16
+    assert lab.evaluate_source("(sq 5)", env) == 25
+    assert lab.evaluate_source("(sq 5)", env) == 25
+    assert lab.evaluate_source("(sq 6)", env) == 36  # evicts the define
+    assert lab.evaluate_source("(define (sq x) (* x x)) (sq 4)", env) == 16
+    stats = lab.parse_cache_stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (1, 4, 2)
+    assert stats["hit_rate"] == 0.2
+    with pytest.raises(lab.SchemeSyntaxError):
+        lab.evaluate_source("(sq 4", env)
+    assert lab.parse_cache_stats()["size"] == 2
+
+
+def test_parse_cache_safe_against_mutation(monkeypatch):
+    monkeypatch.setattr(lab, "PARSE_CACHE", lab.Parse_Cache(8))
+    source = "(define (f x) (+ x 1)) (f 1)"
+    forms = lab.parse_source(source)
+    forms[0][2][0] = "-"
+    forms[1].append(99)
+    assert lab.parse_source(source) == [["define", ["f", "x"], ["+", "x", 1]], ["f", 1]]
+    assert lab.evaluate_source(source) == 2
+    assert lab.parse_cache_stats()["hits"] == 2
+
+
+## TESTS FOR COMPILATION
+
+
+def test_compiled_expression_reused_across_frames():
+    compiled = lab.compile_expression(lab.parse(lab.tokenize("(+ x (* 2 x))")))
+    frames = [lab.Frame(), lab.Frame()]
+    for value, frame in zip((3, 10), frames):
+        lab.evaluate(["define", "x", value], frame)
+    assert [compiled(frame) for frame in frames] == [9, 30]
+
+
+def test_compile_errors_raised_at_evaluation():
+    # a malformed body only fails once the function is actually called
+    env = lab.result_and_frame(lab.parse(lab.tokenize("(define (f) (define))")))[1]
+    with pytest.raises(lab.SchemeSyntaxError):
+        lab.evaluate(["f"], env)
+    with pytest.raises(lab.SchemeNameError):
+        lab.compile_expression("undefined-name")(env)
+
+
+def test_lexical_addresses_and_internal_defines():
+    env = lab.result_and_frame(lab.parse(lab.tokenize("(define x 1)")))[1]
+    for source, expected in (
+        ("(define (f y) (+ (define z (* y 2)) z))", None),
+        ("(f 5)", 20),
+        # x is not bound in g's frame until its define runs
+        ("(define (g) (+ x (define x 5) x))", None),
+        ("(g)", 11),
+        ("x", 1),
+        ("(define (adder n) (lambda (i) (lambda (j) (+ i j n))))", None),
+        ("(((adder 1) 10) 100)", 111),
+    ):
+        result = lab.evaluate(lab.parse(lab.tokenize(source)), env)
+        if expected is not None:
+            assert result == expected, source
+
+
+def test_tail_calls_run_in_constant_stack():
+    env = lab.Frame()
+    env["zero?"] = lambda n: n == 0
+    for source in (
+        "(define (count-down n acc) (if (zero? n) acc (count-down (- n 1) (+ acc 1))))",
+        "(define (even? n) (if (zero? n) #t (odd? (- n 1))))",
+        "(define (odd? n) (begin (define m (- n 1)) (if (zero? n) #f (even? m))))",
+    ):
+        lab.evaluate(lab.parse(lab.tokenize(source)), env)
+    depth = 3 * sys.getrecursionlimit()
+    assert lab.evaluate(["count-down", depth, 0], env) == depth
+    assert lab.evaluate(["even?", depth], env) is True
+    assert lab.evaluate(["odd?", depth], env) is False
+
+
+def test_engines_agree_and_vm_needs_no_python_stack(engine):
+    env = lab.Frame()
+    source = "(define (sum-to n) (if (equal? n 0) 0 (+ n (sum-to (- n 1)))))"
+    lab.evaluate(lab.parse(lab.tokenize(source)), env, engine="closures")
+    lab.evaluate(lab.parse(lab.tokenize(source.replace("sum-to", "vm-sum"))), env, engine="vm")
+    # functions made by either engine can be called from the other
+    assert lab.evaluate(["sum-to", 100], env, engine="vm") == 5050
+    assert lab.evaluate(["vm-sum", 100], env, engine="closures") == 5050
+    # the vm keeps Scheme calls off the Python stack, even when not in tail position
+    depth = 3 * sys.getrecursionlimit()
+    assert lab.evaluate(["vm-sum", depth], env, engine="vm") == depth * (depth + 1) // 2
+    with pytest.raises(ValueError):
+        lab.evaluate(["vm-sum", 1], env, engine="walker")
+
+
+def test_bytecode_is_compact():
+    code = lab.compile_bytecode(lab.parse(lab.tokenize("(if (< x 1) (f x 1.0) 1)")))
+    assert code.ops.typecode == "l"
+    # the two uses of 1 share a constant, but 1.0 gets its own
+    assert [type(c) for c in code.consts if isinstance(c, (int, float))] == [int, float]
+    before = lab.VM_STATS["instructions"]
+    env = lab.Frame()
+    lab.evaluate(["define", "x", 5], env, engine="vm")
+    assert lab.run_vm(code, env) == 1
+    # LOAD_CALLEE <, LOAD_NAME x, LOAD_CONST 1, CALL, JUMP_IF_FALSE, LOAD_CONST 1, RETURN
+    assert lab.VM_STATS["instructions"] - before == 3 + 7
+
+
+def test_let_and_not():
+    env = lab.Frame()
+    for source, expected in (
+        ("(define x 1)", 1),
+        ("(let ((x 2) (y x)) (+ x y))", 3),
+        ("(define (f a) (let ((b (* a 2))) (begin (define c 1) (+ a b c))))", None),
+        ("(f 5)", 16),
+        ("(list (not #f) (not 0) (not (list)))", None),
+    ):
+        result = lab.evaluate(lab.parse(lab.tokenize(source)), env)
+        if expected is not None:
+            assert result == expected, source
+    assert list(result) == [True, False, False]
+    with pytest.raises(lab.SchemeNameError):
+        lab.evaluate("c", env)
+    with pytest.raises(lab.SchemeSyntaxError):
+        lab.evaluate(lab.parse(lab.tokenize("(let (x 1) x)")), env)
+
+
+def test_set_rebinds_where_bound():
+    env = lab.Frame()
+    for source, expected in (
+        ("(define n 0)", 0),
+        ("(define (make-counter) (begin (define k 0) (lambda () (set! k (+ k 1)))))", None),
+        ("(define tick (make-counter))", None),
+        ("(begin (tick) (tick))", 2),
+        ("(define (bump) (set! n (+ n 10)))", None),
+        ("(begin (bump) n)", 10),
+        ("(set! + -)", None),
+        ("(+ 5 1)", 4),
+    ):
+        result = lab.evaluate(lab.parse(lab.tokenize(source)), env)
+        if expected is not None:
+            assert result == expected, source
+    # builtins are shadowed, not changed for everyone
+    assert lab.evaluate(["+", 5, 1], lab.Frame()) == 6
+    with pytest.raises(lab.SchemeNameError):
+        lab.evaluate(["set!", "undefined", 1], env)
+    with pytest.raises(lab.SchemeSyntaxError):
+        lab.evaluate(["set!", 1, 1], env)
+
+
+## TESTS FOR SPECIAL FORMS
+
+
+def test_and_or_del():
+    env = lab.Frame()
+    for source, expected in (
+        ("(define (boom) (car nil))", None),
+        ("(list (and) (and 1 2) (and 1 #f (boom)) (or) (or #f 0) (or 1 (boom)))", None),
+        ("(define x 1)", 1),
+        ("(define (f x) (begin (del x) x))", None),
+        ("(f 5)", 1),
+        ("(del x)", 1),
+    ):
+        result = lab.evaluate(lab.parse(lab.tokenize(source)), env)
+        if expected is not None:
+            assert result == expected, source
+        if source.startswith("(list"):
+            assert list(result) == [True, True, False, False, True, True]
+    for source in ("x", "(del x)"):
+        with pytest.raises(lab.SchemeNameError):
+            lab.evaluate(lab.parse(lab.tokenize(source)), env)
+
+
+def test_host_registered_special_forms(monkeypatch):
+    monkeypatch.setattr(lab, "SPECIAL_FORMS", dict(lab.SPECIAL_FORMS))
+
+    def expand_when(tree):
+        if len(tree) < 3:
+            raise lab.SchemeSyntaxError("when takes a condition and a body")
+        return ["if", tree[1], ["begin", *tree[2:]], False]
+
+    def emit_answer(builder, tree, scope, tail):
+        builder.emit(lab.LOAD_CONST, builder.const(42))
+        if tail:
+            builder.emit(lab.RETURN)
+
+    lab.register_special_form("when", expand=expand_when)
+    lab.register_special_form("answer", lambda tree, scope, tail: lab.compile_constant(42), emit_answer)
+    env = lab.Frame()
+    lab.evaluate_source("(define (f n) (when (> n 0) (define m (* n 2)) (+ m (answer))))", env)
+    assert lab.evaluate(["f", 1], env) == 44
+    assert lab.evaluate(["f", 0], env) is False
+    with pytest.raises(lab.SchemeSyntaxError):
+        lab.evaluate(["when", 1], env)
+    with pytest.raises(ValueError):
+        lab.register_special_form("broken", expand=None)
+
+
+## TESTS FOR CALL CACHES
+
+
+def test_call_caches_hit_and_see_redefinitions():
+    # the stats cover live call sites, so collect earlier tests' garbage now
+    gc.collect()
+    env = lab.Frame()
+    lab.evaluate_source("(define (f x) x) (define (g x) (f x))", env)
+    call = lab.parse(lab.tokenize("(g 1)"))
+    compiled = lab.get_engine(None)[0](call)
+    run = lab.get_engine(None)[1]
+    before = lab.call_cache_stats()
+    assert [run(compiled, env) for _ in range(10)] == [1] * 10
+    after = lab.call_cache_stats()
+    # g's call site and f's call site in g each miss once
+    assert after["misses"] - before["misses"] == 2
+    assert after["hits"] - before["hits"] == 18
+    lab.evaluate_source("(define (f x) (* x 2))", env)
+    assert run(compiled, env) == 2
+    lab.evaluate_source("(set! f (lambda (x) (* x 3)))", env)
+    assert run(compiled, env) == 3
+    # the same code run in another frame looks its functions up there
+    other = env.fork()
+    lab.evaluate_source("(define (g x) 0)", other)
+    assert run(compiled, other) == 0 and run(compiled, env) == 3
+    # f's site misses after each rebinding of f, g's after the fork and
+    # back, and the * site in each new f on its first call
+    assert lab.call_cache_stats()["misses"] - after["misses"] == 6
+
+
+def test_call_caches_do_not_keep_frames_alive():
+    library = lab.Frame()
+    request = library.fork()
+    lab.evaluate_source("(define (handler x) (list x x))", request)
+    assert list_from_ll(lab.evaluate_source("(handler 4)", request)) == [4, 4]
+    # the compiled (handler 4) stays in PARSE_CACHE, but not the request
+    dead = weakref.ref(request)
+    del request
+    gc.collect()
+    assert dead() is None
+    with pytest.raises(lab.SchemeNameError):
+        lab.evaluate_source("(handler 4)", library.fork())
+
+
+## TESTS FOR OPTIMIZATION
+
+
+def test_constant_folding_and_dead_branches():
+    events = []
+    tracer = lambda event, subject, value: event == "fold" and events.append((subject, value))
+    source = "(define (f x) (if (< 1 2) (+ x (* 3 (+ 2 4))) (undefined)))"
+    tree = lab.parse(lab.tokenize(source))
+    env = lab.Frame()
+    lab.add_tracer(tracer)
+    try:
+        lab.evaluate(tree, env)
+    finally:
+        lab.remove_tracer(tracer)
+    assert tree == lab.parse(lab.tokenize(source))  # not modified
+    # the if is replaced by its first branch, in which (* 3 (+ 2 4)) is 18
+    assert [subject for subject, _ in events] == [["*", 3, ["+", 2, 4]], tree[2]]
+    assert events[0][1] == 18 and events[1][1][:2] == ["+", "x"]
+    assert lab.evaluate(["f", 1], env) == 19
+    # errors are left for evaluation, and lambda parameters shadow builtins
+    optimized = lab.optimize(lab.parse(lab.tokenize("(lambda (+) (list (+ 1 2) (/ 1 0)))")))
+    assert optimized == ["lambda", ["+"], ["list", ["+", 1, 2], ["/", 1, 0]]]
+
+
+def test_folded_code_sees_rebound_builtins(monkeypatch):
+    env = lab.Frame()
+    for source, expected in (
+        ("(define (f) (+ 1 (* 2 3)))", None),
+        ("(f)", 7),
+        ("(begin (define * +) (* 2 3))", 5),
+        ("(f)", 6),
+        ("(define (g) (if #t 1 2))", None),
+        ("(define #t #f)", False),
+        ("(g)", 2),
+    ):
+        result = lab.evaluate(lab.parse(lab.tokenize(source)), env)
+        if expected is not None:
+            assert result == expected, source
+    # rebinding is tracked per frame: other frames keep the folded results,
+    # including forks of a frame that rebinds nothing
+    code = lab.parse(lab.tokenize("(list (* 2 3) (if #t 1 2))"))
+    other = lab.Frame()
+    assert list_from_ll(lab.evaluate(code, other)) == [6, 1]
+    assert list_from_ll(lab.evaluate(code, other.fork())) == [6, 1]
+    assert list_from_ll(lab.evaluate(code, env)) == [5, 2]
+    assert list_from_ll(lab.evaluate(code, env.fork())) == [5, 2]
+    lab.evaluate(lab.parse(lab.tokenize("(begin (del *) (del #t))")), env)
+    assert list_from_ll(lab.evaluate(code, env)) == [6, 1]
+    check, calls = lab.Fold_Guard.check, []
+    monkeypatch.setattr(
+        lab.Fold_Guard, "check", lambda guard, frame: calls.append(frame) or check(guard, frame)
+    )
+    compiled = lab.get_engine(None)[0](lab.optimize(code))
+    run = lab.get_engine(None)[1]
+    for _ in range(3):
+        run(compiled, other)
+    # each guard checks other's frames once, then answers from its cache
+    assert calls == [other, other]
+    # until a foldable name is first rebound, no guard looks at frames
+    monkeypatch.setattr(lab, "FOLD_REBINDINGS", 0)
+    calls.clear()
+    compiled = lab.get_engine(None)[0](lab.optimize(code))
+    assert list_from_ll(run(compiled, other)) == [6, 1] and calls == []
+    # a frame made with a builtin's name already bound counts as a rebinding
+    shadowing = lab.Frame(lab.BUILT_IN_FRAME, {lab.symbol("*"): lab.BUILT_IN_FRAME["+"]})
+    assert list_from_ll(run(compiled, shadowing)) == [5, 1] and calls == [shadowing, shadowing]
+
+
+## TESTS FOR PROFILING
+
+
+def test_profiler_counts_calls_times_and_edges(tmp_path):
+    ticks = iter(range(10**6))
+    env = lab.Frame()
+    with lab.Profiler(clock=lambda: next(ticks)) as profiler:
+        for source in (
+            "(define (fact n) (if (equal? n 0) 1 (* n (fact (- n 1)))))",
+            "(define (apply-twice f x) (f (f x)))",
+            "(apply-twice (lambda (n) (fact n)) 3)",
+            "(fact 2)",
+        ):
+            lab.evaluate(lab.parse(lab.tokenize(source)), env)
+        with pytest.raises(lab.SchemeLimitError):
+            lab.evaluate(["fact", -1], env, steps=5)
+    # fact runs 4 times for (fact 3), 7 for (fact 6), 3 for (fact 2), and 5
+    # times before running out of steps
+    assert profiler.calls == {"apply-twice": 1, "lambda (n)": 2, "fact": 19}
+    # a function called in tail position counts as called by its caller's
+    # caller: lambda (n) calls fact, and apply-twice the second lambda (n),
+    # in tail position
+    assert profiler.edges == {
+        ("<top>", "apply-twice"): 1,
+        ("apply-twice", "lambda (n)"): 1,
+        ("apply-twice", "fact"): 1,
+        ("<top>", "lambda (n)"): 1,
+        ("<top>", "fact"): 3,
+        ("fact", "fact"): 15,
+    }
+    # the clock ticks once per reading: each call reads it when it starts
+    # and when it returns, so every call takes at least one tick of its own
+    assert all(profiler.exclusive[name] >= count for name, count in profiler.calls.items())
+    assert profiler.inclusive["fact"] < sum(profiler.exclusive.values())
+    assert not profiler.stack and lab.TRACERS == []
+    folded = dict(line.rsplit(" ", 1) for line in profiler.folded())
+    # one call, of 2 ticks (1 before and 1 after its own callee), in microseconds
+    assert int(folded["apply-twice;fact;fact"]) == 2 * 10**6
+    assert "fact -> fact" in profiler.report()
+    profiler.write_folded(tmp_path / "profile.folded")
+    assert (tmp_path / "profile.folded").read_text().count("\n") == len(folded)
+
+
+def test_profiler_names_lambdas_by_position(tmp_path):
+    fname = tmp_path / "anonymous.scm"
+    fname.write_text("(define (f xs)\n  (map (lambda (x) (* x 2)) xs))\n(f (list 1 2))\n")
+    with lab.Profiler() as profiler:
+        lab.evaluate_file(str(fname))
+    assert profiler.calls == {"f": 1, "lambda@2:9 in f": 2}
+
+
+def test_profiler_ends_calls_an_error_unwinds():
+    env = lab.Frame()
+    lab.evaluate_source("(define (bad n) (if (equal? n 0) (car nil) (+ 1 (bad (- n 1))))) (define (ok) 1)", env)
+    with lab.Profiler() as profiler:
+        with pytest.raises(lab.SchemeEvaluationError):
+            lab.evaluate(["bad", 3], env)
+        assert profiler.stack == [] and not any(profiler.active.values())
+        inclusive = profiler.inclusive["bad"]
+        assert lab.evaluate(["ok"], env) == 1
+        assert profiler.inclusive["bad"] == inclusive
+    assert profiler.edges == {("<top>", "bad"): 1, ("bad", "bad"): 3, ("<top>", "ok"): 1}
+
+
+## TESTS FOR LIMITS
+
+
+def test_step_and_time_limits():
+    env = lab.Frame()
+    for source in (
+        "(define (spin n) (spin (+ n 1)))",
+        "(define (deep n) (+ 1 (deep n)))",
+        "(define (count n) (if (equal? n 0) 0 (count (- n 1))))",
+    ):
+        lab.evaluate(lab.parse(lab.tokenize(source)), env)
+    # (count 9) takes ten calls
+    assert lab.evaluate(["count", 9], env, steps=10) == 0
+    with pytest.raises(lab.SchemeLimitError):
+        lab.evaluate(["count", 10], env, steps=10)
+    with pytest.raises(lab.SchemeLimitError):
+        lab.evaluate(["deep", 1], env, steps=1000)
+    with pytest.raises(lab.SchemeTimeoutError):
+        lab.evaluate(["spin", 0], env, seconds=0.2)
+    # nothing is left installed afterwards
+    assert lab.BUDGET is None
+    assert lab.User_Function.__call__ is lab.User_Function.untraced_call
+    assert lab.result_and_frame(["count", 100], env)[0] == 0
+
+
+def test_limits_reach_into_builtin_list_walks():
+    env = lab.Frame()
+    for source in ("(length (range 100000000))", "(reduce + (range 100000000) 0)"):
+        start = time.monotonic()
+        with pytest.raises(lab.SchemeTimeoutError):
+            lab.evaluate(lab.parse(lab.tokenize(source)), env, seconds=0.1)
+        assert time.monotonic() - start < 2
+    with pytest.raises(lab.SchemeLimitError):
+        lab.evaluate(lab.parse(lab.tokenize("(length (range 100000))")), env, steps=100)
+    # a walk of n elements is charged n // CLOCK_INTERVAL steps
+    assert lab.evaluate(lab.parse(lab.tokenize("(length (range 2560))")), env, steps=10) == 2560
+
+
+def test_lazy_sequences_are_charged_to_the_budget_that_walks_them():
+    env = lab.Frame()
+    run = lambda source, **limits: lab.evaluate(lab.parse(lab.tokenize(source)), env, **limits)
+    run("(define s (cdr (range 100000)))", steps=5)
+    run("(define t (cdr (range 100000)))", seconds=0.2)
+    time.sleep(0.3)
+    # the limits s and t were made under are over; walking them later is not
+    assert run("(length s)") == run("(length t)") == 99999
+    with pytest.raises(lab.SchemeLimitError):
+        run("(length (cdr s))", steps=100)
+
+
+## TESTS FOR ASYNC EVALUATION
+
+
+def test_evaluate_async_yields_to_other_tasks(engine):
+    env = lab.Frame()
+    # functions made by either engine yield
+    lab.evaluate_source("(define (count n) (if (equal? n 0) 0 (count (- n 1))))", env, engine)
+    ticks = []
+
+    async def ticker():
+        while True:
+            ticks.append(len(ticks))
+            await asyncio.sleep(0)
+
+    async def main():
+        task = asyncio.create_task(ticker())
+        await asyncio.sleep(0)
+        result, frame = await lab.result_and_frame_async(["count", 5000], env, yield_every=100)
+        task.cancel()
+        return result, frame
+
+    assert asyncio.run(main()) == (0, env)
+    assert len(ticks) > 40
+    # and so do callbacks from map, filter and reduce
+    lab.evaluate_source(
+        "(define (twice x) (* 2 x)) (define (add a b) (+ a b)) (define xs (list 1 2 3 4 5 6))",
+        env, engine,
+    )
+    for source, expected in (
+        ("(map twice xs)", [2, 4, 6, 8, 10, 12]),
+        ("(filter (lambda (x) (> x 3)) xs)", [4, 5, 6]),
+        ("(reduce add (map twice xs) 0)", 42),
+    ):
+        ticks.clear()
+
+        async def callbacks():
+            task = asyncio.create_task(ticker())
+            await asyncio.sleep(0)
+            value = await lab.evaluate_async(lab.parse(lab.tokenize(source)), env, yield_every=1)
+            task.cancel()
+            return value
+
+        assert list_from_ll(asyncio.run(callbacks())) == expected
+        assert len(ticks) >= 6
+    with pytest.raises(lab.SchemeLimitError):
+        asyncio.run(lab.evaluate_async(["count", 5000], env, steps=100))
+    assert lab.BUDGET is None
+
+
+def test_evaluate_async_awaits_coroutine_builtins_and_cancels(engine):
+    env = lab.Frame()
+
+    async def fetch(x):
+        await asyncio.sleep(0)
+        if x < 0:
+            raise lab.SchemeEvaluationError("bad fetch:", x)
+        return x * 2
+
+    env["fetch"] = fetch
+    lab.evaluate_source("(define (spin n) (spin (+ n 1)))", env, engine)
+    assert asyncio.run(lab.evaluate_async(["+", 1, ["fetch", 20]], env)) == 41
+    with pytest.raises(lab.SchemeEvaluationError, match="bad fetch"):
+        asyncio.run(lab.evaluate_async(["fetch", -1], env))
+    with pytest.raises(lab.SchemeEvaluationError, match="evaluate_async"):
+        lab.evaluate(["fetch", 1], env, engine="vm")
+
+    async def cancel_spin():
+        task = asyncio.create_task(lab.evaluate_async(["spin", 0], env, steps=10**9))
+        for _ in range(10):
+            await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # the frame is still usable afterwards
+        return await lab.evaluate_async(["fetch", 4], env)
+
+    assert asyncio.run(cancel_spin()) == 8
+    assert lab.BUDGET is None
+
+
+## TESTS FOR TRACING
+
+
+def test_tracer_events(capsys):
+    events = []
+    tracer = lambda event, subject, value: events.append(
+        (event, subject if isinstance(subject, str) else "function", value)
+    )
+    env = lab.result_and_frame(lab.parse(lab.tokenize("(define (f x) (* x x))")))[1]
+    lab.add_tracer(tracer)
+    try:
+        lab.evaluate(lab.parse(lab.tokenize("(define y (f 3))")), env)
+        with pytest.raises(lab.SchemeNameError):
+            lab.evaluate("nope", env)
+    finally:
+        lab.remove_tracer(tracer)
+    assert events[0] == ("call", "function", (3,))
+    assert events[1:] == [
+        ("return", "function", 9),
+        ("define", "y", 9),
+        ("name_error", "nope", env),
+    ]
+    lab.evaluate(["f", 2], env)
+    assert len(events) == 4
+    assert capsys.readouterr().out == ""
+
+
+def test_verbose_repl_traces_only_while_looping(tmp_path, capsys):
+    repl = lab.SchemeREPL(use_frames=True, verbose=True)
+    repl.history_file = str(tmp_path / "history")
+    assert lab.TRACERS == []
+    assert lab.User_Function.__call__ is lab.User_Function.untraced_call
+    repl.stdin = io.StringIO("(define (f x) x)\n(f 7)\n")
+    repl.use_rawinput = False
+    repl.cmdloop()
+    assert "return> " in capsys.readouterr().out
+    assert lab.TRACERS == []
+    assert lab.User_Function.__call__ is lab.User_Function.untraced_call
+
+
+def test_repl_syntax_errors_give_line_and_column(tmp_path, capsys):
+    repl = lab.SchemeREPL(use_frames=True)
+    repl.history_file = str(tmp_path / "history")
+    # lines count from the start of the expression they belong to
+    repl.stdin = io.StringIO("(+ 1 2)\n(define x\n  3))\n(list 1\n  (+ 2\n")
+    repl.use_rawinput = False
+    repl.cmdloop()
+    out = capsys.readouterr().out
+    assert "unmatched ')' at line 2, column 5" in out
+    with pytest.raises(lab.SchemeSyntaxError, match="unclosed '\\(' at line 2, column 3"):
+        repl.reader.close()
+
+
 if __name__ == "__main__":
     import sys
 